@@ -0,0 +1,312 @@
+"""Headless HTTP API for the TrendSpotter pipeline.
+
+Exposes the same pipeline as the Streamlit app to schedulers and other
+tools, backed by one PipelineService (worker pool, dataset store, report
+cache, Gemini client, SQL engine pool) shared by every request:
+
+    python api.py --port 8000 --workers 8
+
+    POST   /datasets                        raw CSV/Excel/Feather body (?filename=...) or JSON {"path"} / {"sample"} / {"sql", "query"}
+                                            ("path" under TRENDSPOTTER_DATA_DIR, "sql" URLs listed in TRENDSPOTTER_SQL_URLS)
+    GET    /datasets                        registered datasets
+    GET    /datasets/{id}                   shape, columns, dtypes, missing values
+    POST   /datasets/{id}/clean             register the cleaned dataset
+    GET    /datasets/{id}/kpis              totals, rates and per-column metrics
+    GET    /datasets/{id}/charts            Plotly figures as JSON
+    GET    /datasets/{id}/comparison        period-over-period deltas (?period=wow|mom|custom&days=&segment=&start=&end=)
+    GET    /datasets/{id}/funnel            bootstrap-scored funnel winners/losers (?segment=col[,col...] for all segments)
+    GET    /datasets/{id}/budget            best spend reallocation (?budget=&max_increase=&max_decrease=)
+    POST   /datasets/{id}/insights          queue AI analysis (?wait=1 to block until done)
+    POST   /datasets/{id}/reports/{format}  queue a pdf/pptx render, JSON {"insights", "charts"} optional
+    GET    /jobs/{job_id}                   job status, progress and result
+    GET    /jobs/{job_id}/download          rendered report bytes
+    DELETE /jobs/{job_id}                   cancel a job
+    GET    /health                          pool, store and cache statistics
+
+Handlers are async: short pipeline steps (reads, cleaning, KPIs, summaries)
+run on a small thread pool of their own, while AI analysis and report
+renders queue fairly on the shared job pool, so the event loop never blocks
+on pandas, ReportLab or the LLM and long jobs never stall the other
+endpoints. Fairness is per connection address; set
+TRENDSPOTTER_TRUST_CLIENT_ID=1 only behind a proxy that sets X-Client-Id.
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from module import tracing
+from module.jobs import DONE
+from module.pipeline_service import DatasetNotFound, InsightsNotReady, PipelineService, job_payload
+
+# Copy-on-write: derived frames and dataset versions share every column they don't change
+pd.set_option("mode.copy_on_write", True)
+
+# X-Client-Id is unauthenticated: only honour it when a trusted proxy sets it
+TRUST_CLIENT_ID = os.getenv("TRENDSPOTTER_TRUST_CLIENT_ID", "").lower() in ("1", "true", "yes")
+
+
+def _json_safe(value):
+    """Replace NaN/inf (not valid JSON) with None, recursively"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    return value
+
+
+def _json(content, status_code=200):
+    return JSONResponse(_json_safe(content), status_code=status_code)
+
+
+def _error(status_code, message):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+
+def _owner(request):
+    """Fairness key for the job pool: the caller's address (or its X-Client-Id when trusted)"""
+    if TRUST_CLIENT_ID and request.headers.get('x-client-id'):
+        return request.headers['x-client-id']
+    return request.client.host if request.client else 'anonymous'
+
+
+def _flag(request, name):
+    return request.query_params.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+async def _wait(service, job_id):
+    """Await a job without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    finished = loop.create_future()
+
+    def done(job):
+        loop.call_soon_threadsafe(lambda: finished.done() or finished.set_result(job))
+    service.job(job_id).add_done_callback(done)
+    return await finished
+
+
+async def _run(request, name, fn, *args):
+    """Run a short pipeline step on the request-step threads and return its result"""
+    def step():
+        with tracing.span(f"api.{name}"):
+            return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(request.app.state.steps, step)
+
+
+def _handle_errors(handler):
+    async def wrapper(request):
+        try:
+            return await handler(request)
+        except DatasetNotFound as e:
+            return _error(404, f"Unknown dataset: {e.args[0]}")
+        except InsightsNotReady as e:
+            return _error(409, str(e))
+        except PermissionError as e:
+            return _error(403, str(e))
+        except ValueError as e:
+            return _error(400, str(e))
+        except Exception as e:
+            return _error(500, str(e))
+    return wrapper
+
+
+@_handle_errors
+async def health(request):
+    return _json({'status': 'ok', **request.app.state.service.stats()})
+
+
+@_handle_errors
+async def create_dataset(request):
+    service = request.app.state.service
+    content_type = request.headers.get('content-type', '')
+    if content_type.startswith('application/json'):
+        body = await request.json()
+        if 'path' in body:
+            info = await _run(request, 'register', service.register_path, body['path'])
+        elif 'sample' in body:
+            info = await _run(request, 'register', service.register_sample, body['sample'])
+        elif 'sql' in body and 'query' in body:
+            info = await _run(request, 'register', service.register_sql, body['sql'], body['query'])
+        else:
+            raise ValueError("Expected {'path': ...}, {'sample': ...} or {'sql': ..., 'query': ...}")
+    else:
+        data = await request.body()
+        if not data:
+            raise ValueError("Empty upload")
+        filename = request.query_params.get('filename') or (
+            'upload.xlsx' if 'spreadsheetml' in content_type or 'excel' in content_type else 'upload.csv')
+        info = await _run(request, 'register', service.register_upload, data, filename)
+    return _json(info, status_code=201)
+
+
+@_handle_errors
+async def list_datasets(request):
+    return _json(await _run(request, 'list', request.app.state.service.list_datasets))
+
+
+@_handle_errors
+async def get_dataset(request):
+    return _json(await _run(request, 'describe', request.app.state.service.describe, request.path_params['dataset_id']))
+
+
+@_handle_errors
+async def clean_dataset(request):
+    return _json(await _run(request, 'clean', request.app.state.service.clean, request.path_params['dataset_id']),
+                 status_code=201)
+
+
+@_handle_errors
+async def kpis(request):
+    return _json(await _run(request, 'kpis', request.app.state.service.kpis, request.path_params['dataset_id']))
+
+
+@_handle_errors
+async def charts(request):
+    body = await _run(request, 'charts', request.app.state.service.charts_json, request.path_params['dataset_id'])
+    return Response(body, media_type='application/json')
+
+
+@_handle_errors
+async def comparison(request):
+    params = request.query_params
+    days = int(params['days']) if params.get('days') else None
+    return _json(await _run(request, 'comparison', lambda: request.app.state.service.comparison(
+        request.path_params['dataset_id'], period=params.get('period', 'wow'), segment=params.get('segment'),
+        days=days, start=params.get('start'), end=params.get('end'))))
+
+
+@_handle_errors
+async def funnel(request):
+    return _json(await _run(request, 'funnel', request.app.state.service.funnel, request.path_params['dataset_id'],
+                            request.query_params.get('segment')))
+
+
+@_handle_errors
+async def budget(request):
+    params = request.query_params
+    options = {name: float(params[name]) for name in ('budget', 'max_decrease', 'max_increase') if params.get(name)}
+    return _json(await _run(request, 'budget', lambda: request.app.state.service.budget(
+        request.path_params['dataset_id'], **options)))
+
+
+@_handle_errors
+async def insights(request):
+    service = request.app.state.service
+    job_id = await _run(request, 'submit', service.submit_insights, _owner(request), request.path_params['dataset_id'])
+    if not _flag(request, 'wait'):
+        return _json(job_payload(service.job(job_id)), status_code=202)
+    return _json(job_payload(await _wait(service, job_id)))
+
+
+@_handle_errors
+async def report(request):
+    service = request.app.state.service
+    options = {}
+    if request.headers.get('content-type', '').startswith('application/json'):
+        options = await request.json()
+    job_id = await _run(request, 'submit', lambda: service.submit_report(
+        _owner(request), request.path_params['dataset_id'], request.path_params['fmt'],
+        insights=options.get('insights'), with_charts=bool(options.get('charts'))))
+    if not _flag(request, 'wait'):
+        return _json(job_payload(service.job(job_id)), status_code=202)
+    job = await _wait(service, job_id)
+    if job.status != DONE:
+        return _json(job_payload(job), status_code=500)
+    return _download_response(job)
+
+
+def _download_response(job):
+    result = job.result
+    filename = f"trendspotter_report.{result['format']}"
+    return Response(result['bytes'], media_type=result['mime'],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Report-Key': result['key'] or ''})
+
+
+async def get_job(request):
+    job = request.app.state.service.job(request.path_params['job_id'])
+    if job is None:
+        return _error(404, "Unknown job")
+    return _json(job_payload(job))
+
+
+async def download(request):
+    job = request.app.state.service.job(request.path_params['job_id'])
+    if job is None:
+        return _error(404, "Unknown job")
+    if job.status != DONE or not isinstance(job.result, dict) or 'bytes' not in job.result:
+        return _json({'error': "No report to download", **job_payload(job, include_result=False)}, status_code=409)
+    return _download_response(job)
+
+
+async def cancel_job(request):
+    cancelled = request.app.state.service.jobs.cancel(request.path_params['job_id'])
+    return _json({'cancelled': cancelled})
+
+
+def create_app(service=None, workers=None):
+    """Starlette app around a PipelineService (created on startup unless given)"""
+    @asynccontextmanager
+    async def lifespan(app):
+        owned = service is None
+        app.state.service = service or PipelineService(
+            workers=workers or int(os.getenv("TRENDSPOTTER_JOB_WORKERS", "4")),
+            memory_budget_bytes=int(os.getenv("TRENDSPOTTER_MEMORY_BUDGET_MB", "2048")) * 1024**2,
+        )
+        # Short steps get their own threads so they never wait behind queued AI/report jobs
+        app.state.steps = ThreadPoolExecutor(max_workers=int(os.getenv("TRENDSPOTTER_API_STEP_WORKERS", "8")),
+                                             thread_name_prefix='api-step')
+        tracing.configure_from_env()
+        try:
+            yield
+        finally:
+            app.state.steps.shutdown(wait=False)
+            if owned:
+                app.state.service.shutdown(wait=False)
+
+    routes = [
+        Route('/health', health),
+        Route('/datasets', create_dataset, methods=['POST']),
+        Route('/datasets', list_datasets, methods=['GET']),
+        Route('/datasets/{dataset_id}', get_dataset),
+        Route('/datasets/{dataset_id}/clean', clean_dataset, methods=['POST']),
+        Route('/datasets/{dataset_id}/kpis', kpis),
+        Route('/datasets/{dataset_id}/charts', charts),
+        Route('/datasets/{dataset_id}/comparison', comparison),
+        Route('/datasets/{dataset_id}/funnel', funnel),
+        Route('/datasets/{dataset_id}/budget', budget),
+        Route('/datasets/{dataset_id}/insights', insights, methods=['POST']),
+        Route('/datasets/{dataset_id}/reports/{fmt}', report, methods=['POST']),
+        Route('/jobs/{job_id}', get_job, methods=['GET']),
+        Route('/jobs/{job_id}', cancel_job, methods=['DELETE']),
+        Route('/jobs/{job_id}/download', download),
+    ]
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the TrendSpotter pipeline over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help="Job pool threads (default TRENDSPOTTER_JOB_WORKERS or 4)")
+    parser.add_argument('--log-level', default='warning')
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    # One process: the worker pool, store and caches are shared by every request
+    uvicorn.run(create_app(workers=args.workers), host=args.host, port=args.port, log_level=args.log_level)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,235 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import os
+import io
+import time
+import uuid
 from module.data_ingestion import DataIngestor
 from module.data_processing import DataProcessor
 from module.ai_insight import GeminiInsights
 from module.visualization import DataVisualizer
 from module.report_pdf import PDFReportGenerator
 from module.report_pptx import PowerPointReportGenerator
+from module import hooks, tracing
+from module.artifact_cache import ReportArtifactCache, dataset_fingerprint
+from module.jobs import JobManager
+from module.dataset_store import SharedDatasetStore
+from module.dataset import DatasetHandle
+from module.data_explorer import DataExplorer
+from module.sample_data import SAMPLES, sample_key, sample_path
+from module.session_snapshot import SessionSnapshotStore
+from module.budget import BudgetSimulator
+from module.funnel import funnel_summary
+from module.time_comparison import period_summary
+from module.tasks import PPTX_MIME, render_report, run_analysis
+
+# Copy-on-write: derived frames and dataset versions share every column they don't change
+pd.set_option("mode.copy_on_write", True)
+
+
+def streamlit_reporter(level, message):
+    """Show pipeline status messages in the Streamlit UI"""
+    # Background jobs have no script context; their messages go to the job instead
+    if get_script_run_ctx() is None:
+        return False
+    getattr(st, level)(message)
+    return True
+
+
+hooks.add_reporter(streamlit_reporter)
+
+
+@st.cache_resource
+def init_tracing():
+    """Apply TRENDSPOTTER_TRACE* settings once per process"""
+    return tracing.configure_from_env()
+
+
+@st.cache_resource
+def get_job_manager():
+    """Worker pool shared by every session; jobs outlive reruns"""
+    return JobManager(max_workers=int(os.getenv("TRENDSPOTTER_JOB_WORKERS", "4")))
+
+
+@st.cache_resource
+def get_artifact_cache():
+    """Rendered-report cache shared by every session in this process"""
+    return ReportArtifactCache()
+
+
+@st.cache_resource
+def get_dataset_store():
+    """Content-addressed datasets and derived results shared by every session"""
+    budget_mb = int(os.getenv("TRENDSPOTTER_MEMORY_BUDGET_MB", "2048"))
+    return SharedDatasetStore(memory_budget_bytes=budget_mb * 1024**2)
+
+
+@st.cache_resource
+def get_snapshot_store():
+    """On-disk session snapshots, so sessions survive restarts and reconnects"""
+    return SessionSnapshotStore()
+
+
+@st.cache_resource
+def get_ai_client():
+    """One Gemini client for the whole process"""
+    return GeminiInsights()
+
+
+def load_dataset(dataset_key, data):
+    """Point this session at a (possibly shared) dataset"""
+    if data is None:
+        return
+    store = get_dataset_store()
+    ingestor = st.session_state.ingestor
+    # Reuse the info the ingestor just built (or read from a Feather file) for this frame
+    info = store.get_or_compute(dataset_key, 'data_info', lambda: ingestor.data_info if ingestor.data is data
+                                else DataIngestor.build_data_info(data))
+    ingestor.attach(data, info)
+    # Every session object below references the same frame; nothing is copied
+    st.session_state.dataset = DatasetHandle(data)
+    st.session_state.data = data
+    st.session_state.dataset_key = dataset_key
+    st.session_state.processor = DataProcessor(data)
+    st.session_state.cleaned_data = None
+    st.session_state.snapshot_dirty = True
+
+
+def get_data_fingerprint():
+    """Fingerprint of the loaded dataset, computed once per dataset across sessions"""
+    data = st.session_state.data
+    return get_dataset_store().get_or_compute(
+        st.session_state.dataset_key, 'fingerprint', lambda: dataset_fingerprint(data)
+    )
+
+
+def get_kpi_cube():
+    """Per-column metrics and period-over-period deltas of the loaded dataset, shared across sessions"""
+    store = get_dataset_store()
+    data = st.session_state.data
+    metrics = store.get_or_compute(st.session_state.dataset_key, 'basic_metrics',
+                                   lambda: DataProcessor(data).get_basic_metrics())
+    # False marks data without a date column, so the miss is cached too
+    comparison = store.get_or_compute(st.session_state.dataset_key, 'comparison_summary',
+                                      lambda: period_summary(data) or False)
+    return metrics, comparison or None
+
+
+def get_funnel_summary():
+    """Bootstrap-scored funnel winners and losers of the loaded dataset, shared across sessions"""
+    data = st.session_state.data
+    # False marks data without funnel columns, so the miss is cached too
+    funnel = get_dataset_store().get_or_compute(st.session_state.dataset_key, 'funnel_summary',
+                                                lambda: funnel_summary(data) or False)
+    return funnel or None
+
+
+def get_budget_simulator():
+    """Fitted spend -> conversion response curves of the loaded dataset, shared across sessions"""
+    data = st.session_state.data
+    simulator = get_dataset_store().get_or_compute(st.session_state.dataset_key, 'budget_simulator',
+                                                   lambda: BudgetSimulator.from_frame(data) or False)
+    return simulator or None
+
+
+def get_budget_summary():
+    """Best reallocation at today's spend, for the reports"""
+    simulator = get_budget_simulator()
+    if simulator is None:
+        return None
+    return get_dataset_store().get_or_compute(st.session_state.dataset_key, 'budget_summary', simulator.simulate)
+
+
+# Derived results persisted with a session snapshot (names as in the dataset store)
+SNAPSHOT_RESULTS = ('data_info', 'describe', 'date_columns', 'fingerprint', 'basic_metrics', 'comparison_summary',
+                    'funnel_summary', 'budget_summary')
+
+
+def save_snapshot():
+    """Persist this session's dataset versions, derived results and insights to disk"""
+    store = get_dataset_store()
+    dataset_key = st.session_state.dataset_key
+    get_data_fingerprint()
+    get_kpi_cube()
+    results = {}
+    for name in SNAPSHOT_RESULTS:
+        value = store.peek(store.derived_key(dataset_key, name))
+        if value is not None:
+            results[name] = value
+    if st.session_state.insights_generated:
+        results['ai_summary'] = st.session_state.ai_summary
+        results['summary_charts'] = st.session_state.get('charts', {})
+        results['adtech_charts'] = st.session_state.get('adtech_charts', {})
+    get_snapshot_store().save(st.session_state.session_id, dataset_key, st.session_state.dataset, results)
+    # The session id in the URL lets a reconnecting browser find the snapshot again
+    st.query_params["session"] = st.session_state.session_id
+    st.session_state.snapshot_dirty = False
+
+
+def restore_snapshot(session_id):
+    """Bring a session back from its snapshot without re-running any stage"""
+    snapshot = get_snapshot_store().load(session_id)
+    if snapshot is None:
+        return False
+    store = get_dataset_store()
+    dataset_key = snapshot['dataset_key']
+    handle = snapshot['handle']
+    results = snapshot['results']
+    # Seed the shared store so every get_or_compute below is a hit; sizes come from the snapshot
+    data = store.put(dataset_key, handle.base.df, size=sum(handle.base.column_bytes().values()))
+    for name in SNAPSHOT_RESULTS:
+        if name in results:
+            store.put(store.derived_key(dataset_key, name), results[name], kind=name)
+    clean = next((v for v in handle.versions.values() if v.operation == 'clean'), None)
+    cleaned = clean.df if clean is not None else None
+    if cleaned is not None:
+        store.put(store.derived_key(dataset_key, 'cleaned'), cleaned, kind='cleaned',
+                  size=sum(clean.column_bytes().values()))
+
+    st.session_state.session_id = session_id
+    load_dataset(dataset_key, data)
+    st.session_state.dataset = handle
+    if cleaned is not None:
+        st.session_state.cleaned_data = cleaned
+        st.session_state.processor.processed_df = cleaned
+    if 'ai_summary' in results:
+        st.session_state.ai_summary = results['ai_summary']
+        st.session_state.charts = results.get('summary_charts', {})
+        st.session_state.adtech_charts = results.get('adtech_charts', {})
+        st.session_state.insights_generated = True
+        st.session_state.visualizations_ready = True
+    st.session_state.snapshot_dirty = False
+    return True
+
+
+def basic_pdf_bytes():
+    """Minimal PDF used when the full report cannot be generated"""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    c.drawString(100, 750, "AdTech Performance Report")
+    c.drawString(100, 730, f"Generated: {pd.Timestamp.now()}")
+    c.drawString(100, 710, f"Rows: {len(st.session_state.data)}")
+    c.drawString(100, 690, "Charts and insights included in full version")
+    c.save()
+    return buffer.getvalue()
+
+
+def basic_pptx_bytes():
+    """Minimal PowerPoint used when the full presentation cannot be generated"""
+    from pptx import Presentation
+    
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[0])
+    slide.shapes.title.text = "AdTech Report"
+    slide.placeholders[1].text = "Generated by TrendSpotter"
+    
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
 
 # Page configuration
 st.set_page_config(
@@ -15,6 +238,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Cached resources count as Streamlit commands, so this must follow set_page_config
+init_tracing()
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -42,6 +268,22 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Shared report links (?report=<key>) are served straight from the artifact cache
+shared_report = st.query_params.get("report")
+if shared_report:
+    shared_bytes = get_artifact_cache().get(shared_report)
+    if shared_bytes is not None:
+        is_pdf = shared_report.endswith(".pdf")
+        st.download_button(
+            label="⬇️ Download Shared Report",
+            data=shared_bytes,
+            file_name=f"adtech_report{'.pdf' if is_pdf else '.pptx'}",
+            mime="application/pdf" if is_pdf else "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+            key="shared_download"
+        )
+    else:
+        st.warning("This shared report has expired. Generate it again below.")
+
 # App title
 st.markdown('<h1 class="main-header">🚀 AdTech Report Automation</h1>', unsafe_allow_html=True)
 st.markdown('<p class="sub-header">Upload data → AI Insights → Download Reports (PDF/PPT)</p>', unsafe_allow_html=True)
@@ -53,12 +295,30 @@ if 'ingestor' not in st.session_state:
     st.session_state.ingestor = DataIngestor()
 if 'processor' not in st.session_state:
     st.session_state.processor = None
-if 'ai_insights' not in st.session_state:
-    st.session_state.ai_insights = GeminiInsights()
+if 'dataset' not in st.session_state:
+    st.session_state.dataset = None  # DatasetHandle with immutable versions
+if 'dataset_key' not in st.session_state:
+    st.session_state.dataset_key = None
+if 'upload_keys' not in st.session_state:
+    st.session_state.upload_keys = {}  # uploader file id -> content key
 if 'insights_generated' not in st.session_state:
     st.session_state.insights_generated = False
 if 'cleaned_data' not in st.session_state:
     st.session_state.cleaned_data = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = {}  # kind -> job id on the shared job manager
+
+# A new session whose URL names a snapshot (restarted server, reconnected browser) resumes it
+if 'snapshot_checked' not in st.session_state:
+    st.session_state.snapshot_checked = True
+    snapshot_id = st.query_params.get("session")
+    if snapshot_id and st.session_state.data is None:
+        with st.spinner("Restoring your session..."):
+            started = time.perf_counter()
+            if restore_snapshot(snapshot_id):
+                st.toast(f"Session restored in {time.perf_counter() - started:.2f}s")
 
 # Sidebar - Data Upload
 with st.sidebar:
@@ -79,14 +339,20 @@ with st.sidebar:
         )
         
         if uploaded_file is not None:
-            if data_source == "CSV File":
-                st.session_state.data = st.session_state.ingestor.ingest_csv(uploaded_file)
-            else:
-                st.session_state.data = st.session_state.ingestor.ingest_excel(uploaded_file)
+            store = get_dataset_store()
+            # Hash the upload once; identical files from any session share one parsed frame
+            file_id = getattr(uploaded_file, 'file_id', None) or uploaded_file.name
+            dataset_key = st.session_state.upload_keys.get(file_id)
+            if dataset_key is None:
+                dataset_key = store.content_key(uploaded_file.getvalue(), file_type)
+                st.session_state.upload_keys[file_id] = dataset_key
             
-            if st.session_state.data is not None:
-                st.session_state.processor = DataProcessor(st.session_state.data)
-                st.session_state.cleaned_data = None
+            if st.session_state.dataset_key != dataset_key:
+                if data_source == "CSV File":
+                    ingest = st.session_state.ingestor.ingest_csv
+                else:
+                    ingest = st.session_state.ingestor.ingest_excel
+                load_dataset(dataset_key, store.get_or_load(dataset_key, lambda: ingest(uploaded_file)))
     
     elif data_source == "SQL Database":
         with st.form("sql_connection"):
@@ -113,30 +379,84 @@ with st.sidebar:
                     else:
                         conn_string = f"sqlite:///{database}"
                     
-                    st.session_state.data = st.session_state.ingestor.ingest_sql(conn_string, query)
-                    if st.session_state.data is not None:
-                        st.session_state.processor = DataProcessor(st.session_state.data)
+                    data = st.session_state.ingestor.ingest_sql(conn_string, query)
+                    if data is not None:
+                        # Query results are not cached, but identical results share memory
+                        dataset_key = f"sql:{dataset_fingerprint(data)}"
+                        load_dataset(dataset_key, get_dataset_store().put(dataset_key, data))
     
     else:  # Sample Data
+        sample = st.selectbox("Sample dataset", list(SAMPLES), format_func=lambda name: SAMPLES[name][0])
         if st.button("📊 Load Sample Dataset", use_container_width=True):
-            # Placeholder for sample data
-            st.info("Sample data feature will be implemented in Phase 2")
-            # We'll load the Kaggle dataset here
+            with st.spinner("Loading sample data..."):
+                # Samples are memory-mapped Feather files, loaded through the same ingestor
+                path = sample_path(sample)
+                dataset_key = sample_key(sample)
+                if st.session_state.dataset_key != dataset_key:
+                    ingest = st.session_state.ingestor.ingest_feather
+                    load_dataset(dataset_key, get_dataset_store().get_or_load(dataset_key, lambda: ingest(path)))
+
+    # Shared cache status
+    with st.expander("🗄️ Shared Data Cache"):
+        cache_stats = get_dataset_store().stats()
+        st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+        st.caption(
+            f"{cache_stats['entries']} entries · {cache_stats['bytes'] / 1024**2:.1f} / "
+            f"{cache_stats['budget_bytes'] / 1024**2:.0f} MB · {cache_stats['evictions']} evictions"
+        )
 
 # Main Content Area
 if st.session_state.data is not None:
     # Data Preview Section
     st.header("📊 Data Preview")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["Raw Data", "Data Info", "Basic Stats", "Data Cleaning"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Raw Data", "Data Info", "Basic Stats", "Data Cleaning", "Budget Simulator"])
     
     with tab1:
-        st.subheader("First 10 Rows")
-        st.dataframe(st.session_state.data.head(10), use_container_width=True)
+        st.subheader("Data Explorer")
+        # Filtering, sorting and paging run server-side; only the visible page is sent
+        # Sort indexes and cached results grow after admission; the store re-measures them
+        store = get_dataset_store()
+        explorer_key = store.derived_key(st.session_state.dataset_key, 'explorer')
+        explorer = store.get_or_load(
+            explorer_key, lambda: DataExplorer(st.session_state.data, on_resize=lambda: store.resize(explorer_key)),
+            kind='explorer'
+        )
+        filter_cols = [col for col in explorer.filterable_columns if len(explorer.categories(col)) <= 50][:4]
+        filters = {}
+        if filter_cols:
+            for column, col in zip(st.columns(len(filter_cols)), filter_cols):
+                with column:
+                    filters[col] = st.multiselect(f"Filter {col}", explorer.categories(col), key=f"filter_{col}")
+        
+        col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+        with col1:
+            sort_by = st.selectbox("Sort by", ["(none)"] + list(st.session_state.data.columns))
+        with col2:
+            direction = st.radio("Order", ["Ascending", "Descending"], horizontal=True)
+        with col3:
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 500], index=1)
+        with col4:
+            page_number = st.number_input("Page", min_value=1, value=1, step=1)
+        
+        result = explorer.query(
+            filters=filters,
+            sort_by=None if sort_by == "(none)" else sort_by,
+            ascending=direction == "Ascending",
+            page=page_number - 1,
+            page_size=page_size
+        )
+        st.dataframe(result['page'], use_container_width=True)
         
         # Show total rows
         total_rows = len(st.session_state.data)
-        st.caption(f"Total rows: {total_rows:,}")
+        first_row = result['page_number'] * page_size + 1 if result['total_rows'] else 0
+        last_row = min((result['page_number'] + 1) * page_size, result['total_rows'])
+        st.caption(
+            f"Rows {first_row:,}–{last_row:,} of {result['total_rows']:,} matching "
+            f"(page {result['page_number'] + 1:,} of {result['pages']:,}) · Total rows: {total_rows:,} · "
+            f"{result['elapsed_ms']:.0f} ms"
+        )
     
     with tab2:
         info = st.session_state.ingestor.get_data_info()
@@ -151,17 +471,31 @@ if st.session_state.data is not None:
                 st.write("**Columns List:**")
                 for col in info['columns']:
                     st.code(col)
+        
+        handle = st.session_state.dataset
+        if handle is not None:
+            st.write("**Dataset Versions:**")
+            st.dataframe(pd.DataFrame(handle.memory_report()).round(3), use_container_width=True, hide_index=True)
+            st.caption(f"Session memory (shared buffers counted once): {handle.total_memory_mb():.2f} MB")
     
     with tab3:
         st.subheader("Statistical Summary")
-        st.dataframe(st.session_state.data.describe(), use_container_width=True)
+        summary = get_dataset_store().get_or_compute(
+            st.session_state.dataset_key, 'describe', st.session_state.data.describe
+        )
+        st.dataframe(summary, use_container_width=True)
     
     with tab4:
         st.subheader("Data Cleaning")
         
         if st.button("🧹 Clean Data", type="secondary"):
             with st.spinner("Cleaning data..."):
-                st.session_state.cleaned_data = st.session_state.processor.clean_data()
+                st.session_state.cleaned_data = get_dataset_store().get_or_compute(
+                    st.session_state.dataset_key, 'cleaned', st.session_state.processor.clean_data
+                )
+                st.session_state.processor.processed_df = st.session_state.cleaned_data
+                st.session_state.dataset.add('clean', st.session_state.cleaned_data)
+                st.session_state.snapshot_dirty = True
         
         if st.session_state.cleaned_data is not None:
             st.success("✅ Data cleaned successfully!")
@@ -172,11 +506,46 @@ if st.session_state.data is not None:
                 st.metric("Original Rows", len(st.session_state.data))
                 st.metric("Cleaned Rows", len(st.session_state.cleaned_data))
             with col2:
-                date_cols = st.session_state.processor.detect_date_columns()
+                date_cols = get_dataset_store().get_or_compute(
+                    st.session_state.dataset_key, 'date_columns', st.session_state.processor.detect_date_columns
+                )
                 st.write(f"📅 Date columns detected: {len(date_cols)}")
                 if date_cols:
                     st.write(date_cols)
     
+    with tab5:
+        st.subheader("Budget Reallocation")
+        simulator = get_budget_simulator()
+        if simulator is None:
+            st.info("Needs a spend column (e.g. Spent), a conversion column (e.g. Approved_Conversion) and segment columns.")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                budget_pct = st.slider("Total budget (% of current spend)", 50, 200, 100, step=5)
+            with col2:
+                max_increase = st.slider("Max increase per segment (%)", 0, 500, 200, step=25)
+            # Thousands of scenarios per slider move; fast enough to rerun on every change
+            result = simulator.simulate(budget=simulator.current.sum() * budget_pct / 100,
+                                        max_increase=max_increase / 100)
+            best = result['best']
+            if result['budget_clamped']:
+                st.warning(f"Budget limited to {result['budget']:,.0f} by the per-segment limits "
+                           f"(requested {result['requested_budget']:,.0f})")
+            col1, col2, col3 = st.columns(3)
+            col1.metric(f"Predicted {result['outcome_column']}", f"{best['conversions']:,.1f}",
+                        f"{best['gain']:+,.1f} vs current mix")
+            col2.metric("Spend Moved", f"{best['spend_moved']:,.0f}")
+            col3.metric("Chance of Gain", f"{best['p_gain_positive']:.0%}")
+            st.caption(
+                f"{result['scenarios_evaluated']:,} scenarios over {result['segments_with_spend']:,} segments "
+                f"({' x '.join(map(str, result['segments']))}), {result['posterior_draws']:,} posterior draws; "
+                f"elasticity {result['elasticity']:.2f}, 90% interval of the gain "
+                f"{best['gain_p05']:+,.1f} to {best['gain_p95']:+,.1f}"
+            )
+            moves = pd.DataFrame(result['increase'] + result['decrease'])
+            if not moves.empty:
+                st.dataframe(moves.round(2), use_container_width=True, hide_index=True)
+    
     # Divider
     st.markdown("---")
     
@@ -184,32 +553,49 @@ if st.session_state.data is not None:
     st.markdown("---")
     st.header("🤖 AI-Powered Analysis")
     
+    job_manager = get_job_manager()
+    
     col1, col2 = st.columns([3, 1])
     with col1:
         if st.button("🔍 Generate Comprehensive AI Insights", type="primary", use_container_width=True):
-            with st.spinner("🤔 Analyzing data with Gemini AI..."):
-                # Get AI insights
-                ai = GeminiInsights()
-                ai_summary = ai.analyze_adtech_data(st.session_state.data)
-                
-                # Generate visualizations
-                visualizer = DataVisualizer(st.session_state.data)
-                charts = visualizer.create_summary_charts()
-                adtech_charts = visualizer.create_adtech_specific_charts()
-                
-                # Store in session state
-                st.session_state.ai_summary = ai_summary
-                st.session_state.charts = charts
-                st.session_state.adtech_charts = adtech_charts
-                st.session_state.insights_generated = True
-                st.session_state.visualizations_ready = True
+            # Runs on the shared worker pool; the session stays responsive
+            st.session_state.jobs['analysis'] = job_manager.submit(
+                st.session_state.session_id, "AI analysis", run_analysis, st.session_state.data,
+                ai=get_ai_client(), store=get_dataset_store(), dataset_key=st.session_state.dataset_key
+            )
+            st.session_state.insights_generated = False
     
     with col2:
         if st.button("🔄 Clear Analysis", type="secondary"):
+            analysis_job = st.session_state.jobs.pop('analysis', None)
+            if analysis_job:
+                job_manager.cancel(analysis_job)
             st.session_state.insights_generated = False
             st.session_state.visualizations_ready = False
+            st.session_state.snapshot_dirty = True
             st.rerun()
     
+    # Progress and partial results of the background analysis
+    analysis_job = job_manager.get(st.session_state.jobs.get('analysis'))
+    if analysis_job is not None:
+        if not analysis_job.finished:
+            st.progress(analysis_job.progress, text=f"🤔 {analysis_job.message}")
+            if 'ai_summary' in analysis_job.partial:
+                with st.expander("📋 Preliminary Analysis", expanded=True):
+                    st.markdown(analysis_job.partial['ai_summary'])
+        elif analysis_job.status == 'done':
+            # Store in session state
+            st.session_state.ai_summary = analysis_job.result['ai_summary']
+            st.session_state.charts = analysis_job.result['charts']
+            st.session_state.adtech_charts = analysis_job.result['adtech_charts']
+            st.session_state.insights_generated = True
+            st.session_state.visualizations_ready = True
+            st.session_state.snapshot_dirty = True
+            del st.session_state.jobs['analysis']
+        else:
+            st.error(f"AI analysis {analysis_job.message}")
+            del st.session_state.jobs['analysis']
+    
     # Display AI insights if generated
     if st.session_state.insights_generated and 'ai_summary' in st.session_state:
         st.subheader("AI-Generated Insights")
@@ -220,116 +606,58 @@ if st.session_state.data is not None:
         # Report Generation Options
         st.markdown("---")
         st.header("📄 Report Generation")
+        
+        insights = st.session_state.ai_summary
+        charts = dict(st.session_state.get('charts', {}))
+        charts.update(st.session_state.get('adtech_charts', {}))
 
         col1, col2 = st.columns(2)
-
-        with col1:
-            if st.button("📥 Download PDF Report", use_container_width=True, type="primary"):
-                with st.spinner("Generating PDF report..."):
-                    try:
-                        from module.report_pdf import PDFReportGenerator
-                        
-                        # Create PDF
-                        pdf_gen = PDFReportGenerator()
-                        
-                        # Get data and insights
-                        data = st.session_state.data
-                        insights = st.session_state.ai_summary if 'ai_summary' in st.session_state else "AI insights not generated"
-                        charts = st.session_state.charts if 'charts' in st.session_state else {}
-                        
-                        # Generate PDF
-                        pdf_filename = pdf_gen.generate_simple_report(data, insights)
-                        
-                        # Read the file
-                        with open(pdf_filename, "rb") as pdf_file:
-                            pdf_bytes = pdf_file.read()
-                        
-                        # Create download button
-                        st.download_button(
-                            label="⬇️ Click to Download PDF",
-                            data=pdf_bytes,
-                            file_name=f"adtech_report_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.pdf",
-                            mime="application/pdf",
-                            key="pdf_download",
-                            use_container_width=True
-                        )
-                        st.success("✅ PDF report generated!")
-                        
-                    except Exception as e:
-                        st.error(f"PDF Error: {str(e)}")
-                        # Fallback: Create simple PDF
-                        import io
-                        from reportlab.pdfgen import canvas
-                        from reportlab.lib.pagesizes import letter
-                        
-                        buffer = io.BytesIO()
-                        c = canvas.Canvas(buffer, pagesize=letter)
-                        c.drawString(100, 750, "AdTech Performance Report")
-                        c.drawString(100, 730, f"Generated: {pd.Timestamp.now()}")
-                        c.drawString(100, 710, f"Rows: {len(st.session_state.data)}")
-                        c.drawString(100, 690, "Charts and insights included in full version")
-                        c.save()
-                        
-                        st.download_button(
-                            label="⬇️ Download Basic PDF",
-                            data=buffer.getvalue(),
-                            file_name="adtech_report_basic.pdf",
-                            mime="application/pdf",
-                            use_container_width=True
-                        )
-
-        with col2:
-            if st.button("📊 Download PowerPoint", use_container_width=True, type="primary"):
-                with st.spinner("Generating PowerPoint presentation..."):
-                    try:
-                        from module.report_pptx import PowerPointReportGenerator
-                        
-                        # Create PowerPoint
-                        pptx_gen = PowerPointReportGenerator()
-                        
-                        # Get data and insights
-                        data = st.session_state.data
-                        insights = st.session_state.ai_summary if 'ai_summary' in st.session_state else "AI insights not generated"
-                        
-                        # Generate PPTX
-                        pptx_filename = pptx_gen.generate_simple_presentation(data, insights)
-                        
-                        # Read the file
-                        with open(pptx_filename, "rb") as pptx_file:
-                            pptx_bytes = pptx_file.read()
-                        
-                        # Create download button
-                        st.download_button(
-                            label="⬇️ Click to Download PowerPoint",
-                            data=pptx_bytes,
-                            file_name=f"adtech_presentation_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.pptx",
-                            mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                            key="pptx_download",
-                            use_container_width=True
-                        )
-                        st.success("✅ PowerPoint presentation generated!")
-                        
-                    except Exception as e:
-                        st.error(f"PowerPoint Error: {str(e)}")
-                        # Create a simple PPTX as fallback
-                        from pptx import Presentation
-                        import io
-                        
-                        prs = Presentation()
-                        slide = prs.slides.add_slide(prs.slide_layouts[0])
-                        slide.shapes.title.text = "AdTech Report"
-                        slide.placeholders[1].text = "Generated by TrendSpotter"
-                        
-                        buffer = io.BytesIO()
-                        prs.save(buffer)
-                        
-                        st.download_button(
-                            label="⬇️ Download Basic PowerPoint",
-                            data=buffer.getvalue(),
-                            file_name="adtech_presentation_basic.pptx",
-                            mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                            use_container_width=True
-                        )
+        report_buttons = [
+            (col1, "pdf", "📥 Download PDF Report", "PDF report", "adtech_report"),
+            (col2, "pptx", "📊 Download PowerPoint", "PowerPoint presentation", "adtech_presentation"),
+        ]
+        
+        for column, fmt, button_label, description, file_prefix in report_buttons:
+            with column:
+                if st.button(button_label, use_container_width=True, type="primary"):
+                    metrics, comparison = get_kpi_cube()
+                    st.session_state.jobs[fmt] = job_manager.submit(
+                        st.session_state.session_id, description, render_report, fmt,
+                        st.session_state.data, insights, charts,
+                        data_fingerprint=get_data_fingerprint(), cache=get_artifact_cache(),
+                        metrics=metrics, comparison=comparison,
+                        funnel=get_funnel_summary() if fmt == 'pptx' else None,
+                        budget=get_budget_summary() if fmt == 'pptx' else None
+                    )
+                
+                report_job = job_manager.get(st.session_state.jobs.get(fmt))
+                if report_job is None:
+                    continue
+                if not report_job.finished:
+                    st.progress(report_job.progress, text=f"Generating {description}...")
+                elif report_job.status == 'done':
+                    result = report_job.result
+                    st.download_button(
+                        label=f"⬇️ Click to Download {'PDF' if fmt == 'pdf' else 'PowerPoint'}",
+                        data=result['bytes'],
+                        file_name=f"{file_prefix}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.{fmt}",
+                        mime=result['mime'],
+                        key=f"{fmt}_download",
+                        use_container_width=True
+                    )
+                    st.success(f"✅ {description[0].upper() + description[1:]} generated!")
+                    if result['key']:
+                        st.caption(f"Share link: ?report={result['key']}")
+                else:
+                    st.error(f"{'PDF' if fmt == 'pdf' else 'PowerPoint'} Error: {report_job.error}")
+                    # Fallback: a basic document that does not depend on the full generator
+                    st.download_button(
+                        label=f"⬇️ Download Basic {'PDF' if fmt == 'pdf' else 'PowerPoint'}",
+                        data=basic_pdf_bytes() if fmt == 'pdf' else basic_pptx_bytes(),
+                        file_name=f"{file_prefix}_basic.{fmt}",
+                        mime="application/pdf" if fmt == 'pdf' else PPTX_MIME,
+                        use_container_width=True
+                    )
     
 else:
     # Welcome screen when no data is loaded
@@ -372,3 +700,47 @@ with progress_cols[3]:
     st.metric("Time", "12:45", "On Track")
 
 st.caption("Made for GroundTruth AI Fellowship Hackathon | TrendSpotter v1.0 Complete")
+
+# Snapshot after any change to the dataset, cleaning or insights of this run
+if st.session_state.get('snapshot_dirty') and st.session_state.data is not None:
+    save_snapshot()
+
+# Performance panel, rendered last so it includes the stages of this run
+with st.sidebar:
+    with st.expander("⏱️ Performance"):
+        trace_on = st.toggle("Record traces", value=tracing.is_enabled(),
+                             help="Time every pipeline stage (shared by all sessions of this server)")
+        trace_memory = st.checkbox("Track peak memory (slower)", value=tracing.memory_enabled(), disabled=not trace_on)
+        if trace_on and (not tracing.is_enabled() or trace_memory != tracing.memory_enabled()):
+            tracing.enable(memory=trace_memory)
+        elif not trace_on and tracing.is_enabled():
+            tracing.disable()
+        
+        traces = tracing.recent_traces()
+        if traces:
+            stage_summary = pd.DataFrame(tracing.summary(traces))
+            st.dataframe(
+                stage_summary[['name', 'calls', 'total_ms', 'p95_ms', 'cpu_ms', 'peak_memory_mb',
+                               'rows_in', 'rows_out', 'cache_hits', 'cache_misses']],
+                hide_index=True,
+                use_container_width=True
+            )
+            slowest = stage_summary.iloc[0]
+            st.caption(f"{len(traces)} traces · most time in {slowest['name']} ({slowest['total_ms']:,.0f} ms)")
+            st.download_button("📥 Traces (JSON lines)", tracing.export_lines(traces, 'jsonl'),
+                               "trendspotter_traces.jsonl", "application/x-ndjson")
+            st.download_button("📥 Traces (OpenTelemetry)", tracing.export_lines(traces, 'otlp'),
+                               "trendspotter_traces.otlp.jsonl", "application/x-ndjson")
+            if st.button("Clear traces"):
+                tracing.clear()
+                st.rerun()
+        else:
+            st.caption("No traces recorded yet")
+
+# Poll background jobs: re-run shortly while any of this session's jobs is active
+if any(
+    job is not None and not job.finished
+    for job in map(get_job_manager().get, st.session_state.jobs.values())
+):
+    time.sleep(1)
+    st.rerun()
\ No newline at end of file
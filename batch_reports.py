@@ -0,0 +1,219 @@
+"""Headless batch report generation.
+
+Builds a PDF and a PowerPoint report for every segment of a dataset (for
+example every client or campaign) without starting the Streamlit UI:
+
+    python batch_reports.py data/KAG_conversion_data.csv --segment xyz_campaign_id --out reports
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import pandas as pd
+
+from module import hooks
+from module.budget import budget_summary
+from module.data_ingestion import DataIngestor
+from module.data_processing import DataProcessor
+from module.file_utils import write_atomic
+from module.funnel import funnel_summary
+from module.report_pdf import PDFReportGenerator
+from module.report_pptx import PowerPointReportGenerator
+
+# Copy-on-write: derived frames and dataset versions share every column they don't change
+pd.set_option("mode.copy_on_write", True)
+
+# Per-worker state, created once by _init_worker
+_worker = {}
+
+
+def _slug(value):
+    """Filesystem-safe name for a segment value"""
+    text = "_".join(str(v) for v in value) if isinstance(value, tuple) else str(value)
+    return re.sub(r'[^A-Za-z0-9._-]+', '-', text).strip('-') or 'segment'
+
+
+def _offline_insights(df, metrics):
+    """Deterministic summary used when AI insights are disabled"""
+    lines = ["## Segment Summary",
+             f"- Rows analysed: {len(df):,}",
+             f"- Columns: {len(df.columns)}"]
+    for col, m in list(metrics.items())[:6]:
+        lines.append(f"- **{col}**: mean {m['mean']:.2f}, median {m['median']:.2f}, max {m['max']:.2f}")
+    return "\n".join(lines)
+
+
+def _init_worker(options):
+    """Create the report generators (and AI client) once per worker process"""
+    logging.basicConfig(level=options['log_level'], format="%(processName)s %(levelname)s %(message)s")
+    _worker['options'] = options
+    _worker['pdf'] = PDFReportGenerator()
+    _worker['pptx'] = PowerPointReportGenerator(template_path=options['template'])
+    if options['ai']:
+        from module.ai_insight import GeminiInsights
+        _worker['ai'] = GeminiInsights()
+
+
+def _build_segment_reports(segment, df):
+    """Clean one segment, compute its KPIs and write its reports; returns a manifest entry"""
+    options = _worker['options']
+    timings = {}
+    started = time.perf_counter()
+
+    def mark(stage, since):
+        now = time.perf_counter()
+        timings[stage] = round(now - since, 4)
+        return now
+
+    t = started
+    processor = DataProcessor(df)
+    cleaned = processor.clean_data()
+    t = mark('clean', t)
+    metrics = processor.get_basic_metrics()
+    t = mark('metrics', t)
+
+    if 'ai' in _worker:
+        insights = _worker['ai'].analyze_adtech_data(cleaned)
+    else:
+        insights = _offline_insights(cleaned, metrics)
+    t = mark('insights', t)
+
+    charts = {}
+    if options['charts']:
+        from module.visualization import DataVisualizer
+        visualizer = DataVisualizer(cleaned)
+        charts = visualizer.create_summary_charts()
+        charts.update(visualizer.create_adtech_specific_charts())
+        t = mark('charts', t)
+
+    funnel = budget = None
+    if options['recommendations'] and 'pptx' in options['formats']:
+        # Computed once per segment; the deck only formats them
+        funnel = funnel_summary(cleaned)
+        budget = budget_summary(cleaned)
+        t = mark('recommendations', t)
+
+    name = _slug(segment)
+    segment_dir = os.path.join(options['out'], name)
+    files = {}
+    if 'pdf' in options['formats']:
+        pdf_bytes = _worker['pdf'].render_report(cleaned, insights, charts, metrics=metrics,
+                                                 include_appendix=options['appendix'])
+        files['pdf'] = write_atomic(pdf_bytes, os.path.join(segment_dir, f"{name}_report.pdf"))
+        t = mark('pdf', t)
+    if 'pptx' in options['formats']:
+        pptx_bytes = _worker['pptx'].render_presentation(cleaned, insights, metrics=metrics, charts=charts,
+                                                           funnel=funnel, budget=budget)
+        files['pptx'] = write_atomic(pptx_bytes, os.path.join(segment_dir, f"{name}_presentation.pptx"))
+        t = mark('pptx', t)
+
+    return {
+        'segment': segment if not isinstance(segment, tuple) else list(segment),
+        'rows': len(df),
+        'files': {fmt: os.path.relpath(path, options['out']) for fmt, path in files.items()},
+        'timings': timings,
+        'total_seconds': round(time.perf_counter() - started, 4),
+        'worker_pid': os.getpid(),
+    }
+
+
+def run_batch(dataset, segment_key, out, workers=None, formats=('pdf', 'pptx'), ai=False,
+              charts=False, appendix=False, template=None, max_in_flight=None, log_level=logging.INFO,
+              recommendations=False):
+    """Build reports for every segment in a process pool and write manifest.json"""
+    started = time.perf_counter()
+    ingestor = DataIngestor()
+    df = ingestor.ingest_path(dataset)
+    if df is None:
+        raise SystemExit(f"Could not load dataset: {dataset}")
+    keys = [k.strip() for k in segment_key.split(',')]
+    missing = [k for k in keys if k not in df.columns]
+    if missing:
+        raise SystemExit(f"Segment column(s) not found: {missing}")
+    load_seconds = time.perf_counter() - started
+
+    options = {'out': out, 'formats': tuple(formats), 'ai': ai, 'charts': charts,
+               'appendix': appendix, 'template': template, 'log_level': log_level,
+               'recommendations': recommendations}
+    workers = workers or os.cpu_count() or 1
+    # Only a bounded number of segment frames are pickled and in flight at once
+    max_in_flight = max_in_flight or workers * 2
+    groups = iter(df.groupby(keys[0] if len(keys) == 1 else keys, sort=True).indices.items())
+
+    entries, failures = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,),
+                             max_tasks_per_child=50) as pool:
+        pending = {}
+
+        def submit_next():
+            for segment, positions in groups:
+                segment = segment.item() if hasattr(segment, 'item') else segment
+                future = pool.submit(_build_segment_reports, segment, df.iloc[positions])
+                pending[future] = segment
+                return True
+            return False
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                segment = pending.pop(future)
+                try:
+                    entry = future.result()
+                    entries.append(entry)
+                    hooks.success(f"Segment {segment}: {entry['rows']} rows in {entry['total_seconds']:.2f}s")
+                except Exception as e:
+                    failures.append({'segment': str(segment), 'error': str(e)})
+                    hooks.error(f"Segment {segment} failed: {e}")
+                submit_next()
+
+    manifest = {
+        'dataset': os.path.abspath(dataset),
+        'segment_key': keys,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'workers': workers,
+        'formats': list(formats),
+        'load_seconds': round(load_seconds, 4),
+        'total_seconds': round(time.perf_counter() - started, 4),
+        'segments': sorted(entries, key=lambda e: str(e['segment'])),
+        'failures': failures,
+    }
+    write_atomic(json.dumps(manifest, indent=2, default=str).encode('utf-8'), os.path.join(out, 'manifest.json'))
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate PDF/PPTX reports per segment without the UI")
+    parser.add_argument('dataset', help="CSV or Excel file")
+    parser.add_argument('--segment', required=True, help="Column(s) to split on, e.g. xyz_campaign_id or age,gender")
+    parser.add_argument('--out', default='reports', help="Output directory")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--formats', nargs='+', choices=['pdf', 'pptx'], default=['pdf', 'pptx'])
+    parser.add_argument('--ai', action='store_true', help="Generate Gemini insights per segment")
+    parser.add_argument('--charts', action='store_true', help="Embed charts (needs kaleido)")
+    parser.add_argument('--appendix', action='store_true', help="Add the data appendix to PDFs")
+    parser.add_argument('--recommendations', action='store_true',
+                        help="Add funnel tests and budget reallocation to the PPTX recommendations")
+    parser.add_argument('--template', default=None, help="Branded .pptx template")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    log_level = logging.WARNING if args.quiet else logging.INFO
+    logging.basicConfig(level=log_level, format="%(levelname)s %(message)s")
+    manifest = run_batch(args.dataset, args.segment, args.out, workers=args.workers, formats=args.formats,
+                         ai=args.ai, charts=args.charts, appendix=args.appendix, template=args.template,
+                         log_level=log_level, recommendations=args.recommendations)
+    print(f"{len(manifest['segments'])} segments, {len(manifest['failures'])} failures, "
+          f"{manifest['total_seconds']:.1f}s -> {os.path.join(args.out, 'manifest.json')}")
+    return 1 if manifest['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,394 @@
+"""Performance benchmarks on synthetic KAG-shaped data.
+
+Times and memory-profiles every pipeline stage (ingestion, cleaning, metrics,
+charts, AI summary, reports) at several dataset sizes and compares the
+results against a saved JSON baseline:
+
+    python benchmark.py --rows 10k 100k 1M
+    python benchmark.py --rows 10k 100k --save-baseline
+    python benchmark.py --rows 10k 100k --baseline benchmarks/baseline.json
+    python benchmark.py --rows 1M 10M --workers 1 2 4 8 16 32
+
+The baseline form exits with status 1 when any stage regressed beyond the
+baseline's thresholds, so it can gate a deploy. --workers measures how the
+process-parallel stages (module.parallel) scale with the pool size.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from module.data_ingestion import DataIngestor
+from module.data_processing import DataProcessor
+from module.file_utils import write_atomic
+from module.parallel import ParallelExecutor
+from module.sample_data import write_feather
+from module.synthetic import generate_kag_like
+
+# Copy-on-write: derived frames and dataset versions share every column they don't change
+pd.set_option("mode.copy_on_write", True)
+
+STAGES = [
+    'ingest_csv', 'ingest_excel', 'ingest_sql', 'ingest_feather',
+    'clean_data', 'detect_date_columns', 'get_basic_metrics',
+    'create_summary_charts', 'create_adtech_specific_charts',
+    'get_data_summary_for_ai', 'pdf_report', 'pptx_report',
+]
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+DEFAULT_RESULTS_DIR = os.path.join('benchmarks', 'results')
+# A stage regresses when it is more than `time`/`memory` (relative) slower/larger than the
+# baseline AND by more than min_seconds/min_mb (absolute), so tiny stages don't flap on noise
+DEFAULT_THRESHOLDS = {'time': 0.25, 'memory': 0.30, 'min_seconds': 0.05, 'min_mb': 5.0, 'stages': {}}
+# Stages that spread column work over the process pool, timed per pool size by --workers
+PARALLEL_STAGES = ['clean_data', 'get_basic_metrics', 'get_data_summary_for_ai']
+EXCEL_MAX_ROWS = 1048575  # sheet limit, minus the header row
+SQL_TABLE = 'kag_conversion'
+
+# Fixed insight text so report stages don't depend on the LLM
+SAMPLE_INSIGHTS = """## Key Findings
+- **Campaign 1178** drives most impressions and approved conversions.
+- Click-through rate is stable across age groups; *30-34* converts best.
+
+## Recommendations
+- Recommend shifting budget towards the best converting interests.
+- Suggest capping spend on ads without approved conversions.
+"""
+
+
+def parse_rows(value):
+    """'10k' -> 10000, '1M' -> 1000000"""
+    value = value.strip().lower().replace('_', '')
+    multiplier = {'k': 10**3, 'm': 10**6}.get(value[-1], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def measure(fn, repeat=1, memory=True):
+    """Run `fn` `repeat` times for timing, then once under tracemalloc for peak memory"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    stats = {'seconds': round(min(times), 4), 'median_seconds': round(statistics.median(times), 4)}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        stats['peak_mb'] = round(peak / 1024**2, 2)
+    return result, stats
+
+
+def _write_fixtures(df, stages, workdir, excel_max_rows):
+    """Write the CSV / Excel / SQLite / Feather inputs for the ingestion stages (not timed)"""
+    fixtures = {}
+    if 'ingest_csv' in stages:
+        fixtures['csv'] = os.path.join(workdir, 'data.csv')
+        df.to_csv(fixtures['csv'], index=False)
+    if 'ingest_excel' in stages and len(df) <= min(excel_max_rows, EXCEL_MAX_ROWS):
+        fixtures['excel'] = os.path.join(workdir, 'data.xlsx')
+        df.to_excel(fixtures['excel'], index=False)
+    if 'ingest_sql' in stages:
+        fixtures['sql'] = os.path.join(workdir, 'data.db')
+        with sqlite3.connect(fixtures['sql']) as connection:
+            df.to_sql(SQL_TABLE, connection, index=False, chunksize=100000)
+    if 'ingest_feather' in stages:
+        fixtures['feather'] = os.path.join(workdir, 'data.feather')
+        write_feather(df, fixtures['feather'])
+    return fixtures
+
+
+def _ingest_csv(path):
+    with open(path, 'rb') as f:
+        return DataIngestor().ingest_csv(f)
+
+
+def _generate(rows, options):
+    return generate_kag_like(rows, seed=options['seed'], campaigns=options['campaigns'],
+                             fb_campaigns=options['fb_campaigns'], ages=options['ages'],
+                             interests=options['interests'], duplicate_rate=options['duplicate_rate'],
+                             missing_rate=options['missing_rate'], start_date=options['start_date'])
+
+
+def run_size(rows, stages, options):
+    """Benchmark every selected stage on one synthetic dataset of `rows` rows"""
+    df = _generate(rows, options)
+    results = {}
+
+    def run(stage, fn, rows_in=None):
+        logging.info("%s rows: %s", f"{rows:,}", stage)
+        result, stats = measure(fn, repeat=options['repeat'], memory=options['memory'])
+        if rows_in is not None:
+            stats['rows_in'] = rows_in
+        if isinstance(result, pd.DataFrame):
+            stats['rows_out'] = len(result)
+        elif isinstance(result, (bytes, str)):
+            stats['output_bytes'] = len(result)
+        results[stage] = stats
+        return result
+
+    def timed(stage, fn, rows_in=None):
+        """Measure `stage` if selected, otherwise just compute what later stages need"""
+        return run(stage, fn, rows_in) if stage in stages else fn()
+
+    with tempfile.TemporaryDirectory(prefix='trendspotter_bench_') as workdir:
+        fixtures = _write_fixtures(df, stages, workdir, options['excel_max_rows'])
+        if 'ingest_csv' in stages:
+            run('ingest_csv', lambda: _ingest_csv(fixtures['csv']), rows)
+        if 'ingest_excel' in stages:
+            if 'excel' in fixtures:
+                run('ingest_excel', lambda: DataIngestor().ingest_excel(fixtures['excel']), rows)
+            else:
+                results['ingest_excel'] = {'skipped': f"more than {min(options['excel_max_rows'], EXCEL_MAX_ROWS):,} rows"}
+        if 'ingest_sql' in stages:
+            url = f"sqlite:///{fixtures['sql']}"
+            run('ingest_sql', lambda: DataIngestor().ingest_sql(url, f"SELECT * FROM {SQL_TABLE}"), rows)
+        if 'ingest_feather' in stages:
+            run('ingest_feather', lambda: DataIngestor().ingest_feather(fixtures['feather']), rows)
+
+    cleaned = timed('clean_data', lambda: DataProcessor(df).clean_data(), rows)
+    if 'detect_date_columns' in stages:
+        run('detect_date_columns', lambda: DataProcessor(cleaned).detect_date_columns(), len(cleaned))
+    metrics = timed('get_basic_metrics', lambda: DataProcessor(cleaned).get_basic_metrics(), len(cleaned))
+
+    charts = {}
+    if 'create_summary_charts' in stages or 'create_adtech_specific_charts' in stages:
+        from module.visualization import DataVisualizer
+        if 'create_summary_charts' in stages:
+            charts.update(run('create_summary_charts', lambda: DataVisualizer(cleaned).create_summary_charts(), len(cleaned)))
+        if 'create_adtech_specific_charts' in stages:
+            charts.update(run('create_adtech_specific_charts',
+                              lambda: DataVisualizer(cleaned).create_adtech_specific_charts(), len(cleaned)))
+    if 'get_data_summary_for_ai' in stages:
+        from module.ai_insight import GeminiInsights
+        ai = GeminiInsights()
+        run('get_data_summary_for_ai', lambda: ai.get_data_summary_for_ai(cleaned), len(cleaned))
+
+    # Chart images need kaleido and dominate report time, so they are opt-in
+    report_charts = charts if options['report_charts'] else {}
+    if 'pdf_report' in stages:
+        from module.report_pdf import PDFReportGenerator
+        pdf = PDFReportGenerator()
+        run('pdf_report', lambda: pdf.render_report(cleaned, SAMPLE_INSIGHTS, report_charts, metrics=metrics),
+            len(cleaned))
+    if 'pptx_report' in stages:
+        from module.report_pptx import PowerPointReportGenerator
+        pptx = PowerPointReportGenerator()
+        run('pptx_report', lambda: pptx.render_presentation(cleaned, SAMPLE_INSIGHTS, metrics=metrics,
+                                                            charts=report_charts), len(cleaned))
+    return results
+
+
+def run_scaling(rows, workers, options):
+    """Time the process-parallel stages with each pool size; returns {workers: {stage: stats}}"""
+    from module.ai_insight import GeminiInsights
+    df = _generate(rows, options)
+    cleaned = DataProcessor(df).clean_data()
+    ai = GeminiInsights()
+    scaling = {}
+    for count in workers:
+        # A 1-worker executor is never worthwhile, so that row is the single-process baseline
+        executor = ParallelExecutor(workers=count)
+        stage_fns = {
+            'clean_data': lambda: DataProcessor(df, executor=executor).clean_data(),
+            'get_basic_metrics': lambda: DataProcessor(cleaned, executor=executor).get_basic_metrics(),
+            'get_data_summary_for_ai': lambda: ai.get_data_summary_for_ai(cleaned, executor=executor),
+        }
+        try:
+            # Start the pool outside the timings
+            if count > 1:
+                executor.pool.submit(int).result()
+            results = {}
+            for stage, fn in stage_fns.items():
+                logging.info("%s rows, %d worker(s): %s", f"{rows:,}", count, stage)
+                # tracemalloc cannot see the worker processes, so only time is measured
+                _, results[stage] = measure(fn, repeat=options['repeat'], memory=False)
+            scaling[str(count)] = results
+        finally:
+            executor.shutdown()
+    return scaling
+
+
+def print_scaling(current):
+    print(f"{'rows':>12}  {'stage':<30} {'workers':>7} {'seconds':>9} {'speedup':>8}")
+    for size, by_workers in current['scaling'].items():
+        base = by_workers[min(by_workers, key=int)]
+        for stage in PARALLEL_STAGES:
+            for count, stages in by_workers.items():
+                seconds = stages[stage]['seconds']
+                speedup = base[stage]['seconds'] / seconds if seconds else 0
+                print(f"{int(size):>12,}  {stage:<30} {count:>7} {seconds:>9.3f} {speedup:>7.2f}x")
+
+
+def compare(baseline, current, thresholds):
+    """List of human-readable regressions of `current` results against `baseline`"""
+    regressions = []
+    for size, stages in current['results'].items():
+        for stage, stats in stages.items():
+            base = baseline.get('results', {}).get(size, {}).get(stage)
+            if not base or 'skipped' in base or 'skipped' in stats:
+                continue
+            limits = {**thresholds, **thresholds.get('stages', {}).get(stage, {})}
+            slower = stats['seconds'] - base['seconds']
+            if slower > limits['min_seconds'] and stats['seconds'] > base['seconds'] * (1 + limits['time']):
+                regressions.append(f"{stage} @ {int(size):,} rows: {base['seconds']:.3f}s -> {stats['seconds']:.3f}s "
+                                   f"(+{slower / base['seconds']:.0%}, limit {limits['time']:.0%})")
+            if 'peak_mb' in stats and 'peak_mb' in base:
+                larger = stats['peak_mb'] - base['peak_mb']
+                if larger > limits['min_mb'] and stats['peak_mb'] > base['peak_mb'] * (1 + limits['memory']):
+                    regressions.append(f"{stage} @ {int(size):,} rows: peak {base['peak_mb']:.1f} MB -> "
+                                       f"{stats['peak_mb']:.1f} MB (limit +{limits['memory']:.0%})")
+    return regressions
+
+
+def print_results(current):
+    print(f"{'rows':>12}  {'stage':<30} {'seconds':>9} {'peak MB':>9} {'rows/s':>12}")
+    for size, stages in current['results'].items():
+        for stage, stats in stages.items():
+            if 'skipped' in stats:
+                print(f"{int(size):>12,}  {stage:<30} {'skipped: ' + stats['skipped']}")
+                continue
+            rate = stats.get('rows_in', 0) / stats['seconds'] if stats['seconds'] else 0
+            peak = f"{stats['peak_mb']:.1f}" if 'peak_mb' in stats else '-'
+            print(f"{int(size):>12,}  {stage:<30} {stats['seconds']:>9.3f} {peak:>9} {rate:>12,.0f}")
+
+
+def save_baseline(path, current, overrides):
+    """Merge `current` into the baseline file, keeping sizes that were not re-run and its thresholds"""
+    baseline = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            baseline = json.load(f)
+    thresholds = {**DEFAULT_THRESHOLDS, **baseline.get('thresholds', {}), **overrides}
+    results = baseline.get('results', {})
+    results.update(current['results'])
+    baseline.update({
+        'generated_at': current['generated_at'],
+        'environment': current['environment'],
+        'config': current['config'],
+        'thresholds': thresholds,
+        'results': dict(sorted(results.items(), key=lambda item: int(item[0]))),
+    })
+    write_atomic(json.dumps(baseline, indent=2).encode('utf-8'), path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the TrendSpotter pipeline on synthetic data")
+    parser.add_argument('--rows', nargs='+', default=['10k', '100k', '1M'], help="Dataset sizes, e.g. 10k 1M 10M")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=3, help="Timing runs per stage (best is kept)")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="Skip the tracemalloc pass")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--campaigns', type=int, default=3, help="Distinct xyz_campaign_id values")
+    parser.add_argument('--fb-campaigns', type=int, default=None, help="Distinct fb_campaign_id values")
+    parser.add_argument('--ages', type=int, default=4, help="Distinct age groups")
+    parser.add_argument('--interests', type=int, default=40, help="Distinct interest values")
+    parser.add_argument('--duplicate-rate', type=float, default=0.01)
+    parser.add_argument('--missing-rate', type=float, default=0.01)
+    parser.add_argument('--start-date', default='2017-08-17', help="Adds a reporting_start date column")
+    parser.add_argument('--excel-max-rows', type=int, default=200000, help="Skip Excel ingestion above this size")
+    parser.add_argument('--report-charts', action='store_true', help="Embed charts in reports (needs kaleido)")
+    parser.add_argument('--workers', nargs='+', type=int, default=None,
+                        help="Measure process-pool scaling of the parallel stages instead, e.g. 1 2 4 8")
+    parser.add_argument('--out', default=None, help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--baseline', default=None, help="Compare against this baseline; exit 1 on regressions")
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, default=None,
+                        help=f"Write the results as the new baseline (default {DEFAULT_BASELINE})")
+    parser.add_argument('--time-threshold', type=float, default=None, help="Allowed relative slowdown, e.g. 0.25")
+    parser.add_argument('--memory-threshold', type=float, default=None, help="Allowed relative peak memory growth")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(message)s")
+    # Stage success messages go through module.hooks; keep them out of the benchmark output
+    logging.getLogger('trendspotter').setLevel(logging.ERROR)
+    # detect_date_columns tries to parse every column; its format-inference warnings are expected
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    options = {
+        'seed': args.seed, 'campaigns': args.campaigns, 'fb_campaigns': args.fb_campaigns, 'ages': args.ages,
+        'interests': args.interests, 'duplicate_rate': args.duplicate_rate, 'missing_rate': args.missing_rate,
+        'start_date': args.start_date, 'excel_max_rows': args.excel_max_rows, 'report_charts': args.report_charts,
+        'repeat': args.repeat, 'memory': args.memory,
+    }
+    current = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'config': options,
+        'results': {},
+    }
+    if args.workers:
+        current['scaling'] = {}
+        for rows in sorted(parse_rows(value) for value in args.rows):
+            current['scaling'][str(rows)] = run_scaling(rows, sorted(set(args.workers)), options)
+        out = args.out or os.path.join(DEFAULT_RESULTS_DIR, f"scaling_{datetime.now():%Y%m%d_%H%M%S}.json")
+        write_atomic(json.dumps(current, indent=2).encode('utf-8'), out)
+        print_scaling(current)
+        print(f"Results -> {out}")
+        return 0
+
+    for rows in sorted(parse_rows(value) for value in args.rows):
+        current['results'][str(rows)] = run_size(rows, args.stages, options)
+
+    out = args.out or os.path.join(DEFAULT_RESULTS_DIR, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    write_atomic(json.dumps(current, indent=2).encode('utf-8'), out)
+    print_results(current)
+    print(f"Results -> {out}")
+
+    overrides = {}
+    if args.time_threshold is not None:
+        overrides['time'] = args.time_threshold
+    if args.memory_threshold is not None:
+        overrides['memory'] = args.memory_threshold
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        thresholds = {**DEFAULT_THRESHOLDS, **baseline.get('thresholds', {}), **overrides}
+        if baseline.get('environment', {}) != current['environment']:
+            print("Warning: baseline was recorded in a different environment; timings may not be comparable")
+        regressions = compare(baseline, current, thresholds)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+        status = 1 if regressions else 0
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, current, overrides)
+        print(f"Baseline -> {args.save_baseline}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""Load test for the headless API (api.py).
+
+Starts the API on a free port (or targets --url), registers a synthetic
+KAG-shaped dataset, then runs --clients concurrent keep-alive clients for
+--duration seconds over a weighted mix of endpoints:
+
+    python load_test.py --clients 16 --duration 30 --rows 100k
+    python load_test.py --url http://127.0.0.1:8000 --uncached-reports
+
+Reports overall and per-endpoint throughput and latency percentiles, plus
+per-second throughput to show whether it is sustained, and optionally
+writes them as JSON.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+from module.file_utils import write_atomic
+from module.synthetic import generate_kag_like
+
+# (name, weight, method, path template, JSON body)
+SCENARIOS = [
+    ('kpis', 35, 'GET', '/datasets/{id}/kpis', None),
+    ('describe', 20, 'GET', '/datasets/{id}', None),
+    ('charts', 10, 'GET', '/datasets/{id}/charts', None),
+    ('clean', 5, 'POST', '/datasets/{raw_id}/clean', None),
+    ('pdf_report', 15, 'POST', '/datasets/{id}/reports/pdf?wait=1', {'insights': "## Findings\n- Recommend {n}"}),
+    ('pptx_report', 10, 'POST', '/datasets/{id}/reports/pptx?wait=1', {'insights': "## Findings\n- Recommend {n}"}),
+    ('health', 5, 'GET', '/health', None),
+]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _request(connection, method, path, body=None, headers=None):
+    headers = dict(headers or {})
+    if isinstance(body, dict):
+        body = json.dumps(body).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def start_server(workers):
+    port = _free_port()
+    command = [sys.executable, 'api.py', '--port', str(port)]
+    if workers:
+        command += ['--workers', str(workers)]
+    # Every simulated client connects from 127.0.0.1; let the server tell them apart by X-Client-Id
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               env={**os.environ, 'TRENDSPOTTER_TRUST_CLIENT_ID': '1'},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            if _request(connection, 'GET', '/health')[0] == 200:
+                return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("API did not start")
+
+
+def setup(url, rows, seed):
+    """Upload a synthetic dataset and clean it; returns path parameters for the scenarios"""
+    target = urlparse(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port, timeout=600)
+    csv = generate_kag_like(rows, seed=seed, duplicate_rate=0.01, missing_rate=0.01).to_csv(index=False).encode('utf-8')
+    status, body = _request(connection, 'POST', '/datasets?filename=load_test.csv', body=csv,
+                            headers={'Content-Type': 'text/csv'})
+    if status != 201:
+        raise SystemExit(f"Upload failed: {status} {body[:200]}")
+    raw_id = json.loads(body)['id']
+    status, body = _request(connection, 'POST', f"/datasets/{raw_id}/clean")
+    return {'raw_id': raw_id, 'id': json.loads(body)['id']}
+
+
+def client(url, params, deadline, uncached, results, seed):
+    rng = random.Random(seed)
+    target = urlparse(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port, timeout=600)
+    names = [s[0] for s in SCENARIOS]
+    weights = [s[1] for s in SCENARIOS]
+    by_name = {s[0]: s for s in SCENARIOS}
+    headers = {'X-Client-Id': f"load-{seed}"}
+    while time.time() < deadline:
+        name, _, method, path, body = by_name[rng.choices(names, weights)[0]]
+        if body is not None:
+            # Identical insights hit the rendered-report cache; unique ones force a render
+            body = {k: v.format(n=rng.random() if uncached else 'shifting budget') for k, v in body.items()}
+        started = time.perf_counter()
+        try:
+            status, _ = _request(connection, method, path.format(**params), body=body, headers=headers)
+        except (OSError, http.client.HTTPException):
+            status = 0
+            connection = http.client.HTTPConnection(target.hostname, target.port, timeout=600)
+        results.append((name, status, time.perf_counter() - started, time.time()))
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def summarize(results, duration, clients):
+    endpoints = {}
+    for name, status, latency, _ in results:
+        entry = endpoints.setdefault(name, {'requests': 0, 'errors': 0, 'latencies': []})
+        entry['requests'] += 1
+        entry['errors'] += not 200 <= status < 300
+        entry['latencies'].append(latency)
+    for entry in endpoints.values():
+        latencies = entry.pop('latencies')
+        entry['rps'] = round(entry['requests'] / duration, 2)
+        entry['p50_ms'] = round(_percentile(latencies, 0.50) * 1000, 1)
+        entry['p95_ms'] = round(_percentile(latencies, 0.95) * 1000, 1)
+        entry['p99_ms'] = round(_percentile(latencies, 0.99) * 1000, 1)
+
+    # Completed requests per whole second, ignoring the ramp-up and tail seconds
+    per_second = {}
+    for _, _, _, finished in results:
+        per_second[int(finished)] = per_second.get(int(finished), 0) + 1
+    seconds = sorted(per_second)[1:-1] or sorted(per_second)
+    steady = [per_second[s] for s in seconds]
+    latencies = [latency for _, _, latency, _ in results]
+    return {
+        'clients': clients,
+        'duration_seconds': duration,
+        'requests': len(results),
+        'errors': sum(1 for _, status, _, _ in results if not 200 <= status < 300),
+        'rps': round(len(results) / duration, 2),
+        'rps_per_second_min': min(steady) if steady else 0,
+        'rps_per_second_median': sorted(steady)[len(steady) // 2] if steady else 0,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 1),
+        'endpoints': dict(sorted(endpoints.items())),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sustained-throughput load test for api.py")
+    parser.add_argument('--url', default=None, help="Running API (default: start one on a free port)")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds")
+    parser.add_argument('--rows', default='100k', help="Synthetic dataset size, e.g. 10k or 1M")
+    parser.add_argument('--workers', type=int, default=None, help="Job pool threads of the started API")
+    parser.add_argument('--uncached-reports', action='store_true', help="Unique insights so every report renders")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help="Write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    from benchmark import parse_rows
+    process, url = (None, args.url) if args.url else start_server(args.workers)
+    try:
+        params = setup(url, parse_rows(args.rows), args.seed)
+        results = []
+        deadline = time.time() + args.duration
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(url, params, deadline, args.uncached_reports,
+                                                         results, args.seed + i))
+                   for i in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        summary = summarize(results, time.perf_counter() - started, args.clients)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print(f"{summary['requests']} requests, {summary['errors']} errors, {summary['rps']} req/s "
+          f"(per second: min {summary['rps_per_second_min']}, median {summary['rps_per_second_median']}), "
+          f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms")
+    print(f"{'endpoint':<14} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, entry in summary['endpoints'].items():
+        print(f"{name:<14} {entry['requests']:>9} {entry['errors']:>7} {entry['rps']:>8} "
+              f"{entry['p50_ms']:>8} {entry['p95_ms']:>8} {entry['p99_ms']:>8}")
+    if args.out:
+        write_atomic(json.dumps(summary, indent=2).encode('utf-8'), args.out)
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,9 @@
 import google.generativeai as genai
 import pandas as pd
-import streamlit as st
+from module import hooks
+from module.tracing import traced
+from module.parallel import executor_for
+from module.time_comparison import period_summary
 from dotenv import load_dotenv
 import os
 import json
@@ -11,13 +14,14 @@ class GeminiInsights:
     def __init__(self):
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key or api_key == "your_gemini_api_key_here":
-            st.warning("⚠️ Please add your Gemini API key to .env file")
+            hooks.warning("⚠️ Please add your Gemini API key to .env file")
             api_key = "demo_key"
         
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel('models/gemini-2.5-flash')
     
-    def get_data_summary_for_ai(self, df):
+    @traced('ai.data_summary')
+    def get_data_summary_for_ai(self, df, executor=None):
         """Create comprehensive summary for AI analysis"""
         summary = {
             "dataset_info": {
@@ -35,10 +39,20 @@ class GeminiInsights:
         
         # Add basic statistics for numeric columns
         if summary["numeric_columns"]:
-            summary["statistics"] = df[summary["numeric_columns"]].describe().to_dict()
+            executor = executor_for(df, summary["numeric_columns"], executor=executor)
+            if executor is not None:
+                summary["statistics"] = executor.map_columns(df, summary["numeric_columns"], 'describe')
+            else:
+                summary["statistics"] = df[summary["numeric_columns"]].describe().to_dict()
         
-        return json.dumps(summary, indent=2)
+        # Week-over-week / month-over-month KPI deltas and top moving segments, when the data is dated
+        comparison = period_summary(df)
+        if comparison and comparison["periods"]:
+            summary["period_over_period"] = comparison
+        
+        return json.dumps(summary, indent=2, default=str)
     
+    @traced('ai.analyze')
     def analyze_adtech_data(self, df):
         """
         Comprehensive analysis for AdTech data
@@ -55,7 +69,7 @@ class GeminiInsights:
             TASKS:
             1. **Executive Summary**: Provide a 3-sentence overview of what this data represents
             2. **Key Metrics**: Identify 5 most important metrics/KPIs (with reasoning)
-            3. **Trends & Patterns**: Identify 3 key trends or patterns
+            3. **Trends & Patterns**: Identify 3 key trends or patterns (use the period_over_period deltas when present)
             4. **Anomalies**: Point out 2 potential issues or anomalies
             5. **Recommendations**: Provide 3 actionable recommendations for campaign optimization
             6. **Insights**: Share 2 surprising or non-obvious insights
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from module import tracing
+from module.file_utils import write_atomic
+
+DEFAULT_CACHE_DIR = os.path.join(os.getenv("TRENDSPOTTER_CACHE_DIR", ".cache"), "reports")
+DEFAULT_MAX_BYTES = 512 * 1024**2  # 512 MB
+
+
+def dataset_fingerprint(df):
+    """Content hash of a DataFrame: column names, dtypes and every cell value"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(list(zip(map(str, df.columns), df.dtypes.astype(str)))).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def text_hash(text):
+    """Stable hash for insight text (or any string)"""
+    return hashlib.blake2b((text or "").encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _update_digest(digest, value):
+    if isinstance(value, dict):
+        digest.update(b'{')
+        for name in sorted(value, key=str):
+            digest.update(repr(str(name)).encode('utf-8'))
+            _update_digest(digest, value[name])
+        digest.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[')
+        for item in value:
+            _update_digest(digest, item)
+        digest.update(b']')
+    elif isinstance(value, (bytes, bytearray)):
+        digest.update(bytes(value))
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(repr(getattr(value, 'columns', value.name)).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"{value.dtype}{value.shape}".encode('utf-8'))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif hasattr(value, 'to_json'):
+        # Plotly figures: the same spec the chart image cache hashes
+        digest.update(value.to_json().encode('utf-8'))
+    else:
+        digest.update(repr(value).encode('utf-8'))
+
+
+def inputs_hash(**inputs):
+    """Stable hash of the other render inputs (charts, metrics, summaries, ...)"""
+    digest = hashlib.blake2b(digest_size=16)
+    _update_digest(digest, inputs)
+    return digest.hexdigest()
+
+
+class ReportArtifactCache:
+    """Rendered reports on disk, keyed by data/insight fingerprints, with size-based LRU eviction"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def make_key(self, data_fingerprint, insights_hash, fmt, template_version, render_hash=None):
+        """Cache key for one (dataset, insights, format, template, render inputs) combination"""
+        raw = f"{data_fingerprint}|{insights_hash}|{fmt}|{template_version}|{render_hash}"
+        return f"{hashlib.sha1(raw.encode('utf-8')).hexdigest()}.{fmt}"
+
+    def path(self, key):
+        # Keys are generated by make_key; never let one escape the cache directory
+        return os.path.join(self.directory, os.path.basename(key))
+
+    def get(self, key):
+        """Cached bytes for `key`, or None"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            tracing.record_cache(False)
+            return None
+        with self._lock:
+            self.hits += 1
+        tracing.record_cache(True)
+        return data
+
+    def put(self, key, data):
+        """Store bytes under `key` and evict least recently used artifacts over budget"""
+        write_atomic(data, self.path(key))
+        self._evict()
+        return key
+
+    def get_or_render(self, data_fingerprint, insights_hash, fmt, template_version, render, render_hash=None):
+        """Return (key, bytes), calling `render()` only on a cache miss.
+
+        `render_hash` (see `inputs_hash`) covers everything else the report is
+        drawn from, so adding charts or a comparison never serves a stale file.
+        """
+        key = self.make_key(data_fingerprint, insights_hash, fmt, template_version, render_hash)
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return key, data
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.tmp_'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'size_mb': sum(size for _, size, _ in entries) / 1024**2,
+            'max_mb': self.max_bytes / 1024**2,
+        }
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                os.remove(path)
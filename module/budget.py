@@ -0,0 +1,278 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from module.funnel import _codes
+from module.time_comparison import _clean_record, find_measures, format_value
+from module.tracing import traced
+
+# The campaign x age x gender x interest grid of the KAG data, when present
+GRID_COLUMNS = ('xyz_campaign_id', 'age', 'gender', 'interest')
+# Elasticity search range: below 1 keeps returns diminishing, so no single segment takes the whole budget
+MIN_ELASTICITY = 0.05
+MAX_ELASTICITY = 0.95
+# Gamma prior on a segment's conversion scale, worth this many conversions at the overall rate
+PRIOR_CONVERSIONS = 1.0
+DEFAULT_SCENARIOS = 2000
+DEFAULT_DRAWS = 500
+# Spend per segment may change by at most these fractions (extrapolating curves further is guesswork)
+DEFAULT_MAX_DECREASE = 1.0
+DEFAULT_MAX_INCREASE = 2.0
+
+
+def _project(weights, lower, upper, budget, iterations=40):
+    """clip(t * weights, lower, upper) per row, with t found by bisection so each row sums to `budget`"""
+    weights = np.atleast_2d(weights)
+    low = np.zeros(len(weights))
+    high = np.ones(len(weights))
+    # Grow the upper bracket until every row reaches the budget (or hits its upper bounds)
+    for _ in range(200):
+        short = np.clip(high[:, None] * weights, lower, upper).sum(axis=1) < budget
+        if not short.any():
+            break
+        high[short] *= 2
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        over = np.clip(middle[:, None] * weights, lower, upper).sum(axis=1) > budget
+        high = np.where(over, middle, high)
+        low = np.where(over, low, middle)
+    return np.clip(high[:, None] * weights, lower, upper)
+
+
+class BudgetSimulator:
+    """Spend -> approved conversion response curves per segment, and budget reallocation over them.
+
+    Each segment's conversions follow `c_s * spend ** beta`: a segment's
+    spend is assumed to scale all of its ads proportionally, and every ad
+    converts at `k_s * ad_spend ** beta`. The shared elasticity `beta` is
+    the Poisson maximum-likelihood estimate with a free scale per segment
+    (a one-dimensional concave search), and each scale is the posterior
+    mean under a Gamma prior centred on the overall rate, so segments with
+    a handful of ads are pulled towards the average instead of taking the
+    budget on one lucky conversion. Segments without spend keep none.
+
+    Scenarios are allocation matrices (scenarios x segments); predicted
+    conversions for all of them are `(allocations ** beta) @ c`, and for
+    posterior draws of the scales one matrix product more.
+    """
+
+    def __init__(self, df, segments=None, spend=None, outcome=None):
+        measures = find_measures(df)
+        self.spend = spend or measures.get('spend')
+        self.outcome = outcome or measures.get('approved_conversions') or measures.get('conversions')
+        if self.spend is None or self.outcome is None:
+            raise ValueError("Need a spend column and a conversion column")
+        if segments is None:
+            segments = [col for col in GRID_COLUMNS if col in df.columns]
+        if not segments:
+            raise ValueError("No segment columns")
+        self.segments = list(segments)
+
+        codes, self.labels = _codes(df, self.segments)
+        spent = np.nan_to_num(df[self.spend].to_numpy(dtype=np.float64))
+        converted = np.nan_to_num(df[self.outcome].to_numpy(dtype=np.float64))
+        # Only ads with spend tell anything about the response to spend
+        paid = spent > 0
+        self._codes, self._log_spend, self._converted = codes[paid], np.log(spent[paid]), converted[paid]
+        n = len(self.labels)
+        self.current = np.bincount(codes, weights=spent, minlength=n)
+        self.conversions = np.bincount(self._codes, weights=self._converted, minlength=n)
+        self.ads = np.bincount(codes, minlength=n)
+        if not self._converted.sum():
+            raise ValueError("No conversions with spend to fit response curves on")
+        self._fit()
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        """A BudgetSimulator for `df`, or None when it lacks spend, conversions or segments"""
+        try:
+            return cls(df, **kwargs)
+        except ValueError:
+            return None
+
+    def memory_bytes(self):
+        arrays = [self._codes, self._log_spend, self._converted, self.current, self.conversions, self.ads,
+                  self.coefficients, self._shape, self._rate]
+        return sum(a.nbytes for a in arrays)
+
+    def _exposure(self, beta):
+        """Sum of ad_spend ** beta per segment"""
+        return np.bincount(self._codes, weights=np.exp(beta * self._log_spend), minlength=len(self.labels))
+
+    def _profile_likelihood(self, beta):
+        exposure = self._exposure(beta)
+        has = self.conversions > 0
+        return beta * (self._converted * self._log_spend).sum() - (self.conversions[has] * np.log(exposure[has])).sum()
+
+    @traced('budget.fit')
+    def _fit(self):
+        # 1. Elasticity: golden-section search of the (concave) profile log-likelihood
+        ratio = (math.sqrt(5) - 1) / 2
+        low, high = MIN_ELASTICITY, MAX_ELASTICITY
+        a, b = high - ratio * (high - low), low + ratio * (high - low)
+        fa, fb = self._profile_likelihood(a), self._profile_likelihood(b)
+        while high - low > 1e-4:
+            if fa < fb:
+                low, a, fa = a, b, fb
+                b = low + ratio * (high - low)
+                fb = self._profile_likelihood(b)
+            else:
+                high, b, fb = b, a, fa
+                a = high - ratio * (high - low)
+                fa = self._profile_likelihood(a)
+        self.elasticity = beta = (low + high) / 2
+
+        # 2. Segment scales: Gamma(shape, rate) posterior around the overall rate
+        exposure = self._exposure(beta)
+        overall = self.conversions.sum() / exposure.sum()
+        self._shape = self.conversions + PRIOR_CONVERSIONS
+        self._rate = exposure + PRIOR_CONVERSIONS / overall
+        # Proportional scaling of a segment's ads turns per-ad curves into c_s * spend ** beta
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self._to_segment = np.where(self.current > 0, exposure / self.current ** beta, 0.0)
+        self.coefficients = self._shape / self._rate * self._to_segment
+
+    def predict(self, allocations, coefficients=None):
+        """Predicted conversions for allocations of shape (..., segments)"""
+        coefficients = self.coefficients if coefficients is None else coefficients
+        return np.power(allocations, self.elasticity) @ coefficients.T
+
+    def bounds(self, max_decrease=DEFAULT_MAX_DECREASE, max_increase=DEFAULT_MAX_INCREASE):
+        """Per-segment spend limits; segments without spend (no curve) stay at zero"""
+        if not 0 <= max_decrease <= 1:
+            raise ValueError(f"max_decrease must be between 0 and 1, got {max_decrease}")
+        if not max_increase >= 0:
+            raise ValueError(f"max_increase must be at least 0, got {max_increase}")
+        return self.current * (1 - max_decrease), self.current * (1 + max_increase)
+
+    def optimal(self, budget=None, max_decrease=DEFAULT_MAX_DECREASE, max_increase=DEFAULT_MAX_INCREASE):
+        """Allocation maximizing predicted conversions at `budget` within the bounds.
+
+        With concave power curves the optimum equalizes marginal returns:
+        spend_s = clip(t * c_s ** (1 / (1 - beta)), lower_s, upper_s), with t
+        set by the budget.
+        """
+        budget = self.current.sum() if budget is None else budget
+        lower, upper = self.bounds(max_decrease, max_increase)
+        budget = min(max(budget, lower.sum()), upper.sum())
+        weights = self.coefficients ** (1 / (1 - self.elasticity))
+        return _project(weights, lower, upper, budget)[0]
+
+    def scenarios(self, n=DEFAULT_SCENARIOS, budget=None, max_decrease=DEFAULT_MAX_DECREASE,
+                  max_increase=DEFAULT_MAX_INCREASE, seed=0):
+        """(names, allocations): current spend, the optimum, blends between them and random reallocations"""
+        budget = self.current.sum() if budget is None else budget
+        lower, upper = self.bounds(max_decrease, max_increase)
+        budget = min(max(budget, lower.sum()), upper.sum())
+        optimum = self.optimal(budget, max_decrease, max_increase)
+        blends = np.linspace(0.1, 0.9, 9)
+        rng = np.random.default_rng(seed)
+        # Random multiplicative shifts of today's mix, log-uniform up to the allowed change
+        spread = np.log1p(max_increase)
+        shifts = np.exp(rng.uniform(-spread, spread, size=(max(n - 11, 0), len(self.current))))
+        candidates = [
+            _project(self.current, lower, upper, budget),
+            optimum[None],
+            _project((1 - blends[:, None]) * self.current + blends[:, None] * optimum, lower, upper, budget),
+            _project(shifts * self.current, lower, upper, budget),
+        ]
+        names = (["current mix", "optimal"] + [f"{b:.0%} towards optimal" for b in blends]
+                 + [f"random shift {i + 1}" for i in range(len(shifts))])
+        return names, np.vstack(candidates)[:n]
+
+    @traced('budget.simulate')
+    def simulate(self, budget=None, n_scenarios=DEFAULT_SCENARIOS, draws=DEFAULT_DRAWS,
+                 max_decrease=DEFAULT_MAX_DECREASE, max_increase=DEFAULT_MAX_INCREASE, seed=0, top_n=5):
+        """Evaluate every scenario under the fitted curves and `draws` posterior draws; JSON-safe result.
+
+        The best scenario has the highest predicted conversions; its gain over
+        today's allocation (at today's spend per segment, scaled to `budget`)
+        comes with the share of posterior draws in which it wins and a 90%
+        interval. The interval covers the segment scales, not the elasticity.
+        A budget the bounds cannot reach is clamped; `budget_clamped` says so
+        and `requested_budget` keeps the original.
+        """
+        requested = float(self.current.sum() if budget is None else budget)
+        if not np.isfinite(requested):
+            raise ValueError(f"budget must be a finite number, got {budget}")
+        lower, upper = self.bounds(max_decrease, max_increase)
+        budget = float(min(max(requested, lower.sum()), upper.sum()))
+        names, allocations = self.scenarios(n_scenarios, budget, max_decrease, max_increase, seed)
+        expected = self.predict(allocations)
+        best = int(np.argmax(expected))
+
+        # Posterior draws of every segment's scale, all scenarios in one matrix product
+        rng = np.random.default_rng(seed + 1)
+        sampled = rng.gamma(self._shape, 1 / self._rate, size=(draws, len(self._shape))) * self._to_segment
+        outcomes = self.predict(allocations[[0, best]], sampled)  # (2, draws)
+        gains = outcomes[1] - outcomes[0]
+
+        allocation = self.allocation(allocations[best])
+        change = allocation['spend'] - allocation['current_spend']
+        moves = allocation.assign(change=change)
+        return {
+            'segments': self.segments,
+            'spend_column': self.spend,
+            'outcome_column': self.outcome,
+            'elasticity': self.elasticity,
+            'budget': budget,
+            'requested_budget': requested,
+            'budget_clamped': budget != requested,
+            'current_spend': float(self.current.sum()),
+            'observed_conversions': float(self.conversions.sum()),
+            'segments_total': len(self.labels),
+            'segments_with_spend': int((self.current > 0).sum()),
+            'scenarios_evaluated': len(allocations),
+            'posterior_draws': draws,
+            'baseline_conversions': float(expected[0]),
+            'best': _clean_record({
+                'scenario': names[best],
+                'conversions': expected[best],
+                'gain': expected[best] - expected[0],
+                'gain_pct': (expected[best] / expected[0] - 1) * 100 if expected[0] else None,
+                'gain_p05': np.percentile(gains, 5),
+                'gain_p95': np.percentile(gains, 95),
+                'p_gain_positive': (gains > 0).mean(),
+                'spend_moved': np.abs(allocations[best] - allocations[0]).sum() / 2,
+            }),
+            'increase': [_clean_record(r) for r in moves[moves['change'] > 0].nlargest(top_n, 'change')
+                         .to_dict(orient='records')],
+            'decrease': [_clean_record(r) for r in moves[moves['change'] < 0].nsmallest(top_n, 'change')
+                         .to_dict(orient='records')],
+        }
+
+    def allocation(self, spend):
+        """Per-segment table of today's and the given spend with predicted conversions"""
+        return pd.DataFrame({
+            'segment': np.array(self.labels, dtype=object),
+            'ads': self.ads,
+            'current_spend': self.current,
+            'spend': spend,
+            'observed_conversions': self.conversions,
+            'current_conversions': self.coefficients * np.power(self.current, self.elasticity),
+            'conversions': self.coefficients * np.power(spend, self.elasticity),
+        })
+
+
+def budget_summary(df, **kwargs):
+    """BudgetSimulator(df).simulate(), or None when `df` cannot be simulated"""
+    simulator = BudgetSimulator.from_frame(df)
+    if simulator is None:
+        return None
+    return simulator.simulate(**kwargs)
+
+
+def budget_lines(summary, max_segments=2):
+    """Reallocation recommendation for reports, when moving budget is predicted to pay off"""
+    if not summary or not summary['best']['gain'] or summary['best']['gain'] <= 0 or not summary['increase']:
+        return []
+    best = summary['best']
+    names = lambda items: ", ".join(str(item['segment']) for item in items[:max_segments])
+    # A larger budget can be spent on the winners alone, without cutting anything
+    source = f" from {names(summary['decrease'])}" if summary['decrease'] else ""
+    line = (f"Reallocate {format_value(best['spend_moved'])} of {format_value(summary['budget'])} spend"
+            f"{source} to {names(summary['increase'])}: "
+            f"{best['gain']:+.1f} {summary['outcome_column']} ({best['gain_pct']:+.1f}%, "
+            f"90% interval {best['gain_p05']:+.1f} to {best['gain_p95']:+.1f})")
+    return [line]
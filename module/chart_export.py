@@ -0,0 +1,77 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from module import tracing
+from module.tracing import traced
+
+
+class ChartImageCache:
+    """Render Plotly figures to PNG once and reuse the bytes across reports"""
+
+    def __init__(self, max_items=256):
+        self.max_items = max_items
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, fig, width, height, scale):
+        """Content hash of the figure spec plus render size"""
+        spec = fig.to_json() if hasattr(fig, 'to_json') else repr(fig)
+        digest = hashlib.sha1(spec.encode('utf-8')).hexdigest()
+        return f"{digest}:{width}x{height}@{scale}"
+
+    def get_png(self, fig, width=900, height=500, scale=1):
+        """Return PNG bytes for a chart, or None if it cannot be rendered.
+
+        Accepts a Plotly figure, raw PNG bytes or a path to an image file.
+        Plotly rendering needs the optional `kaleido` package.
+        """
+        if fig is None:
+            return None
+        if isinstance(fig, (bytes, bytearray)):
+            return bytes(fig)
+        if isinstance(fig, str):
+            if os.path.exists(fig):
+                with open(fig, 'rb') as f:
+                    return f.read()
+            return None
+
+        key = self._key(fig, width, height, scale)
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                tracing.record_cache(True)
+                return self._images[key]
+        tracing.record_cache(False)
+
+        try:
+            png = fig.to_image(format='png', width=width, height=height, scale=scale)
+        except Exception:
+            # kaleido missing or the figure cannot be exported
+            return None
+
+        with self._lock:
+            self._images[key] = png
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_items:
+                self._images.popitem(last=False)
+        return png
+
+    @traced('charts.export_png')
+    def render_all(self, charts, width=900, height=500, scale=1):
+        """Render a {name: chart} dict to {name: png_bytes}, skipping failures"""
+        images = {}
+        for name, fig in (charts or {}).items():
+            png = self.get_png(fig, width=width, height=height, scale=scale)
+            if png:
+                images[name] = png
+        return images
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+
+
+# Process-wide cache shared by the PDF and PowerPoint generators
+chart_image_cache = ChartImageCache()
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from module.tracing import traced
+
+
+class DataExplorer:
+    """Server-side filtering, sorting and pagination over one (read-only) DataFrame.
+
+    Categorical columns are factorized once into integer codes and sort orders
+    are computed once per column, so a query is a few vectorized passes over
+    NumPy arrays and only the requested page is materialized as a DataFrame.
+    The row positions for the last few (filters, sort) combinations are kept,
+    which makes paging through a result a constant-time slice.
+
+    `on_resize` is called (without arguments) whenever sort indexes or cached
+    results were added, so a cache holding the explorer can re-measure it.
+    """
+
+    def __init__(self, df, max_categories=1000, cached_queries=16, build_sort_indexes=True, on_resize=None):
+        self.df = df
+        self.max_categories = max_categories
+        self.cached_queries = cached_queries
+        self.on_resize = on_resize
+        self._codes = {}
+        self._sort_orders = {}
+        self._positions = OrderedDict()
+        self._lock = threading.Lock()
+
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_float_dtype(series):
+                continue
+            codes, categories = pd.factorize(series, sort=True)
+            if len(categories) <= max_categories:
+                self._codes[col] = (codes.astype(np.int32, copy=False), categories)
+
+        if build_sort_indexes:
+            # Sort indexes are built in the background so the first page shows immediately
+            threading.Thread(target=self.build_sort_indexes, daemon=True).start()
+
+    def build_sort_indexes(self):
+        """Precompute the sort order of every column"""
+        for col in self.df.columns:
+            self._sort_order(col)
+        self._resized()
+
+    def _resized(self):
+        # Never called with self._lock held: the callback may measure memory_bytes()
+        if self.on_resize is not None:
+            self.on_resize()
+
+    def memory_bytes(self):
+        """Bytes held by codes, sort indexes and cached results (the frame itself is shared)"""
+        with self._lock:
+            arrays = [codes for codes, _ in self._codes.values()]
+            arrays += [order for order, _ in self._sort_orders.values()] + list(self._positions.values())
+        return sum(a.nbytes for a in arrays)
+
+    @property
+    def filterable_columns(self):
+        """Columns that can be filtered by value"""
+        return list(self._codes)
+
+    def categories(self, col):
+        """Sorted distinct values of a filterable column"""
+        return list(self._codes[col][1])
+
+    def _sort_order(self, col):
+        """Stable ascending row order for `col` and its number of non-missing rows, computed once.
+
+        Missing values come after every real value in the order.
+        """
+        with self._lock:
+            cached = self._sort_orders.get(col)
+        if cached is not None:
+            return cached
+        series = self.df[col]
+        if col in self._codes:
+            codes = self._codes[col][0]
+        elif pd.api.types.is_float_dtype(series):
+            keys = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            missing = np.isnan(keys)
+            codes = None
+        else:
+            # High-cardinality labels: sorted codes also handle None/NaN in object columns
+            codes = pd.factorize(series, sort=True)[0]
+        if codes is not None:
+            missing = codes < 0
+            keys = np.where(missing, np.iinfo(codes.dtype).max, codes)
+        # NaN keys already sort last
+        cached = (np.argsort(keys, kind='stable'), len(keys) - int(missing.sum()))
+        with self._lock:
+            self._sort_orders[col] = cached
+        return cached
+
+    def _mask(self, filters, ranges):
+        mask = None
+        for col, values in (filters or {}).items():
+            if not values:
+                continue
+            codes, categories = self._codes[col]
+            selected = categories.get_indexer(list(values))
+            # Lookup table over codes; index -1 (missing / unknown value) stays False
+            lookup = np.zeros(len(categories) + 1, dtype=bool)
+            lookup[selected[selected >= 0]] = True
+            col_mask = lookup[codes]
+            mask = col_mask if mask is None else mask & col_mask
+        for col, (low, high) in (ranges or {}).items():
+            values = self.df[col].to_numpy()
+            col_mask = np.ones(len(values), dtype=bool)
+            if low is not None:
+                col_mask &= values >= low
+            if high is not None:
+                col_mask &= values <= high
+            mask = col_mask if mask is None else mask & col_mask
+        return mask
+
+    def _query_positions(self, filters, ranges, sort_by, ascending):
+        key = (
+            tuple(sorted((col, tuple(sorted(map(str, v)))) for col, v in (filters or {}).items() if v)),
+            tuple(sorted((ranges or {}).items())),
+            sort_by,
+            ascending,
+        )
+        with self._lock:
+            positions = self._positions.get(key)
+            if positions is not None:
+                self._positions.move_to_end(key)
+                return positions
+
+        mask = self._mask(filters, ranges)
+        if sort_by is not None:
+            order, valid = self._sort_order(sort_by)
+            if not ascending:
+                # Reverse the real values only; missing values stay last
+                order = np.concatenate([order[:valid][::-1], order[valid:]])
+            positions = order if mask is None else order[mask[order]]
+        else:
+            positions = np.arange(len(self.df)) if mask is None else np.flatnonzero(mask)
+
+        with self._lock:
+            self._positions[key] = positions
+            while len(self._positions) > self.cached_queries:
+                self._positions.popitem(last=False)
+        self._resized()
+        return positions
+
+    @traced('explorer.query')
+    def query(self, filters=None, ranges=None, sort_by=None, ascending=True, page=0, page_size=50):
+        """Return one page of the filtered/sorted data.
+
+        `filters` maps filterable columns to allowed values, `ranges` maps
+        numeric columns to (low, high) bounds (either may be None). Returns a
+        dict with the page DataFrame, the total number of matching rows, the
+        number of pages and the query time in milliseconds.
+        """
+        started = time.perf_counter()
+        positions = self._query_positions(filters, ranges, sort_by, ascending)
+        total = len(positions)
+        pages = max(1, -(-total // page_size))
+        page = min(max(page, 0), pages - 1)
+        page_positions = positions[page * page_size:(page + 1) * page_size]
+        return {
+            'page': self.df.iloc[page_positions],
+            'page_number': page,
+            'pages': pages,
+            'total_rows': total,
+            'elapsed_ms': (time.perf_counter() - started) * 1000,
+        }
@@ -1,14 +1,32 @@
 import pandas as pd
-import streamlit as st
+from module import hooks
+from module.sample_data import FEATHER_EXTENSIONS, read_feather
+from module.tracing import traced
 import io
 from sqlalchemy import create_engine
 import os
+import threading
+
+# One pooled engine per connection string, shared by every ingestor (and every session)
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(connection_string):
+    """Shared SQLAlchemy engine for `connection_string`, created on first use"""
+    with _engines_lock:
+        engine = _engines.get(connection_string)
+        if engine is None:
+            engine = _engines[connection_string] = create_engine(connection_string, pool_pre_ping=True)
+        return engine
+
 
 class DataIngestor:
     def __init__(self):
         self.data = None
         self.data_info = {}
         
+    @traced('ingest.csv')
     def ingest_csv(self, uploaded_file):
         """Handle CSV file upload"""
         try:
@@ -16,49 +34,94 @@ class DataIngestor:
                 # Read with pandas
                 self.data = pd.read_csv(uploaded_file)
                 self._update_data_info()
-                st.success(f"✅ CSV loaded successfully! Shape: {self.data.shape}")
+                hooks.success(f"✅ CSV loaded successfully! Shape: {self.data.shape}")
                 return self.data
         except Exception as e:
-            st.error(f"Error loading CSV: {e}")
+            hooks.error(f"Error loading CSV: {e}")
             return None
     
+    @traced('ingest.excel')
     def ingest_excel(self, uploaded_file):
         """Handle Excel file upload"""
         try:
             self.data = pd.read_excel(uploaded_file)
             self._update_data_info()
-            st.success(f"✅ Excel loaded successfully! Shape: {self.data.shape}")
+            hooks.success(f"✅ Excel loaded successfully! Shape: {self.data.shape}")
             return self.data
         except Exception as e:
-            st.error(f"Error loading Excel: {e}")
+            hooks.error(f"Error loading Excel: {e}")
             return None
     
+    @traced('ingest.sql')
     def ingest_sql(self, connection_string, query):
         """Connect to SQL database and execute query"""
         try:
-            engine = create_engine(connection_string)
+            engine = get_engine(connection_string)
             self.data = pd.read_sql_query(query, engine)
             self._update_data_info()
-            st.success(f"✅ SQL data loaded! Shape: {self.data.shape}")
+            hooks.success(f"✅ SQL data loaded! Shape: {self.data.shape}")
+            return self.data
+        except Exception as e:
+            hooks.error(f"Error connecting to SQL: {e}")
+            return None
+    
+    @traced('ingest.feather')
+    def ingest_feather(self, path):
+        """Memory-map an Arrow/Feather file (the bundled samples use this fast path)"""
+        try:
+            self.data, data_info = read_feather(path)
+            if data_info is None:
+                self._update_data_info()
+            else:
+                self.data_info = data_info
+            hooks.success(f"✅ Feather loaded successfully! Shape: {self.data.shape}")
             return self.data
         except Exception as e:
-            st.error(f"Error connecting to SQL: {e}")
+            hooks.error(f"Error loading Feather file: {e}")
             return None
     
+    @traced('ingest.path')
+    def ingest_path(self, path):
+        """Load a CSV, Excel or Feather file from a local path (used outside the UI)"""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.csv':
+            with open(path, 'rb') as f:
+                return self.ingest_csv(f)
+        if extension in ('.xlsx', '.xls'):
+            return self.ingest_excel(path)
+        if extension in FEATHER_EXTENSIONS:
+            return self.ingest_feather(path)
+        hooks.error(f"Unsupported file type: {extension}")
+        return None
+    
+    def attach(self, data, data_info=None):
+        """Use an already loaded (e.g. shared, cached) DataFrame instead of parsing again"""
+        self.data = data
+        if data_info is None:
+            self._update_data_info()
+        else:
+            self.data_info = data_info
+        return self.data
+    
+    @staticmethod
+    def build_data_info(data):
+        """Information dictionary for a DataFrame"""
+        buffer = io.StringIO()
+        data.info(buf=buffer)
+        
+        return {
+            'shape': data.shape,
+            'columns': list(data.columns),
+            'dtypes': data.dtypes.astype(str).to_dict(),
+            'info': buffer.getvalue(),
+            'missing_values': data.isnull().sum().to_dict(),
+            'memory_usage': data.memory_usage(deep=True).sum() / 1024**2  # MB
+        }
+    
     def _update_data_info(self):
         """Update data information dictionary"""
         if self.data is not None:
-            buffer = io.StringIO()
-            self.data.info(buf=buffer)
-            
-            self.data_info = {
-                'shape': self.data.shape,
-                'columns': list(self.data.columns),
-                'dtypes': self.data.dtypes.astype(str).to_dict(),
-                'info': buffer.getvalue(),
-                'missing_values': self.data.isnull().sum().to_dict(),
-                'memory_usage': self.data.memory_usage(deep=True).sum() / 1024**2  # MB
-            }
+            self.data_info = self.build_data_info(self.data)
     
     def get_data_sample(self, n_rows=5):
         """Return sample of data"""
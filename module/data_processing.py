@@ -1,40 +1,59 @@
 import pandas as pd
-import streamlit as st
+from module import hooks
+from module.parallel import column_metrics, executor_for
+from module.tracing import traced
 from datetime import datetime
 import numpy as np
 
 class DataProcessor:
-    def __init__(self, df):
+    def __init__(self, df, executor=None):
         self.df = df
-        self.processed_df = df.copy()
+        # No eager copy: cleaning never writes in place, every step returns a new frame
+        self.processed_df = df
+        # Large frames spread column work over a process pool (module.parallel); None = process default
+        self.executor = executor
         
+    @traced('process.clean_data')
     def clean_data(self):
         """Basic data cleaning operations"""
         try:
             # Remove duplicates
             initial_shape = self.processed_df.shape
-            self.processed_df = self.processed_df.drop_duplicates()
+            executor = executor_for(self.processed_df, executor=self.executor)
+            if executor is not None:
+                # Same selection as drop_duplicates(), with the columns factorized in parallel
+                self.processed_df = self.processed_df[~executor.duplicated(self.processed_df)]
+            else:
+                self.processed_df = self.processed_df.drop_duplicates()
             duplicates_removed = initial_shape[0] - self.processed_df.shape[0]
             
-            # Fill missing numeric values with median
+            # Fill missing values: numeric with median, categorical with mode
+            null_counts = self.processed_df.isnull().sum()
+            fill_values = {}
             numeric_cols = self.processed_df.select_dtypes(include=[np.number]).columns
-            for col in numeric_cols:
-                if self.processed_df[col].isnull().sum() > 0:
-                    self.processed_df[col].fillna(self.processed_df[col].median(), inplace=True)
+            missing_numeric = [col for col in numeric_cols if null_counts[col] > 0]
+            if executor is not None and len(missing_numeric) > 1:
+                fill_values.update(executor.map_columns(self.processed_df, missing_numeric, 'median'))
+            else:
+                for col in missing_numeric:
+                    fill_values[col] = self.processed_df[col].median()
             
-            # Fill missing categorical values with mode
             cat_cols = self.processed_df.select_dtypes(include=['object']).columns
             for col in cat_cols:
-                if self.processed_df[col].isnull().sum() > 0:
-                    self.processed_df[col].fillna(self.processed_df[col].mode()[0], inplace=True)
+                if null_counts[col] > 0:
+                    fill_values[col] = self.processed_df[col].mode()[0]
+            
+            if fill_values:
+                self.processed_df = self.processed_df.fillna(fill_values)
             
-            st.success(f"✅ Data cleaned! Removed {duplicates_removed} duplicates")
+            hooks.success(f"✅ Data cleaned! Removed {duplicates_removed} duplicates")
             return self.processed_df
             
         except Exception as e:
-            st.error(f"Error cleaning data: {e}")
+            hooks.error(f"Error cleaning data: {e}")
             return self.df
     
+    @traced('process.detect_date_columns')
     def detect_date_columns(self):
         """Detect columns that might be dates"""
         date_columns = []
@@ -47,20 +66,18 @@ class DataProcessor:
                 pass
         return date_columns
     
+    @traced('process.basic_metrics')
     def get_basic_metrics(self):
         """Calculate basic metrics for numerical columns"""
         if self.processed_df is not None:
-            numeric_cols = self.processed_df.select_dtypes(include=[np.number]).columns
+            numeric_cols = list(self.processed_df.select_dtypes(include=[np.number]).columns)
+            
+            executor = executor_for(self.processed_df, numeric_cols, executor=self.executor)
+            if executor is not None:
+                return executor.map_columns(self.processed_df, numeric_cols, 'metrics')
             
             metrics = {}
             for col in numeric_cols:
-                metrics[col] = {
-                    'mean': float(self.processed_df[col].mean()),
-                    'median': float(self.processed_df[col].median()),
-                    'std': float(self.processed_df[col].std()),
-                    'min': float(self.processed_df[col].min()),
-                    'max': float(self.processed_df[col].max()),
-                    'null_count': int(self.processed_df[col].isnull().sum())
-                }
+                metrics[col] = column_metrics(self.processed_df[col])
             return metrics
         return {}
\ No newline at end of file
@@ -0,0 +1,132 @@
+import itertools
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class DatasetVersion:
+    """Immutable snapshot of a dataset produced by one operation.
+
+    Versions are never modified in place; with pandas copy-on-write enabled
+    (the app and CLI entry points turn it on) a derived version shares every column buffer it
+    did not change with its parent.
+    """
+
+    def __init__(self, version_id, df, operation, parent=None):
+        self.id = version_id
+        self.df = df
+        self.operation = operation
+        self.parent = parent
+        self.created_at = time.time()
+        self._column_bytes = None
+
+    def column_bytes(self):
+        """Deep memory usage per column, computed once"""
+        if self._column_bytes is None:
+            self._column_bytes = self.df.memory_usage(deep=True, index=False).to_dict()
+        return self._column_bytes
+
+
+def _column_buffer(df, col):
+    """Underlying ndarray of a column without copying (None for extension arrays)"""
+    values = df[col].array
+    return getattr(values, '_ndarray', None) if not isinstance(values, np.ndarray) else values
+
+
+class DatasetHandle:
+    """One session's dataset: a base frame plus immutable derived versions.
+
+    Everything in the session (ingestor, processor, visualizer, charts) reads
+    `handle.current.df` or a `view()` of it instead of holding its own copy,
+    so peak memory stays close to one copy of the data.
+    """
+
+    def __init__(self, df, operation='load'):
+        self._ids = itertools.count(1)
+        self.versions = OrderedDict()
+        self.current = self._add(df, operation, parent=None)
+
+    @classmethod
+    def restore(cls, versions, current_id):
+        """Rebuild a handle from version dicts (id, operation, parent, df, column_bytes) in creation order"""
+        handle = cls.__new__(cls)
+        handle.versions = OrderedDict()
+        for entry in versions:
+            parent = handle.versions.get(entry['parent']) if entry['parent'] is not None else None
+            version = DatasetVersion(entry['id'], entry['df'], entry['operation'], parent)
+            version._column_bytes = entry.get('column_bytes')
+            handle.versions[version.id] = version
+        handle._ids = itertools.count(max(handle.versions) + 1)
+        handle.current = handle.versions[current_id]
+        return handle
+
+    @property
+    def base(self):
+        return next(iter(self.versions.values()))
+
+    @property
+    def df(self):
+        return self.current.df
+
+    def _add(self, df, operation, parent):
+        version = DatasetVersion(next(self._ids), df, operation, parent)
+        self.versions[version.id] = version
+        return version
+
+    def derive(self, operation, fn, *args, **kwargs):
+        """Create a new current version from `fn(current_df, ...)`"""
+        return self.add(operation, fn(self.current.df, *args, **kwargs))
+
+    def add(self, operation, df):
+        """Register an externally computed frame as the new current version"""
+        if df is self.current.df:
+            return self.current
+        self.current = self._add(df, operation, self.current)
+        return self.current
+
+    def checkout(self, version_id):
+        """Make an earlier version current again (no copying)"""
+        self.current = self.versions[version_id]
+        return self.current
+
+    def view(self, columns=None, rows=None):
+        """Lazy copy-on-write view of the current version"""
+        df = self.current.df
+        if columns is not None:
+            df = df[list(columns)]
+        if rows is not None:
+            df = df.iloc[rows]
+        return df
+
+    def memory_report(self):
+        """Per-version memory: logical size, bytes owned, and bytes shared with earlier versions"""
+        report = []
+        seen = []  # buffers of earlier versions
+        for version in self.versions.values():
+            own = shared = 0
+            buffers = []
+            for col, nbytes in version.column_bytes().items():
+                buffer = _column_buffer(version.df, col)
+                if buffer is not None and any(np.may_share_memory(buffer, other) for other in seen):
+                    shared += nbytes
+                else:
+                    own += nbytes
+                if buffer is not None:
+                    buffers.append(buffer)
+            seen.extend(buffers)
+            report.append({
+                'version': version.id,
+                'operation': version.operation,
+                'rows': len(version.df),
+                'columns': len(version.df.columns),
+                'logical_mb': (own + shared) / 1024**2,
+                'own_mb': own / 1024**2,
+                'shared_mb': shared / 1024**2,
+            })
+        return report
+
+    def total_memory_mb(self):
+        """Actual memory held by all versions together (shared buffers counted once)"""
+        return sum(row['own_mb'] for row in self.memory_report())
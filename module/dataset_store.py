@@ -0,0 +1,200 @@
+import hashlib
+import json
+import pickle
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+
+from module import tracing
+
+
+def _estimate_size(value):
+    """Approximate resident size of a cached value in bytes"""
+    if hasattr(value, 'memory_bytes'):
+        return int(value.memory_bytes())
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'kind')
+
+    def __init__(self, value, size, kind):
+        self.value = value
+        self.size = size
+        self.kind = kind
+
+
+class SharedDatasetStore:
+    """Process-wide, content-addressed cache for datasets and results derived from them.
+
+    Datasets are keyed by a hash of their raw bytes, so every session that
+    uploads the same file shares one parsed DataFrame. Derived results
+    (profiles, cleaned frames, AI summaries, charts) are keyed by the dataset
+    key plus a name and parameters. Entries are evicted least-recently-used
+    once the global memory budget is exceeded; a DataFrame still referenced by
+    a session is revived from a weak reference instead of being parsed again.
+    """
+
+    def __init__(self, memory_budget_bytes=2 * 1024**3):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._entries = OrderedDict()
+        self._alive = weakref.WeakValueDictionary()
+        self._loading = {}
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'revived': 0, 'evictions': 0}
+
+    @staticmethod
+    def content_key(data, kind=''):
+        """Content address for raw uploaded bytes"""
+        digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+        return f"{kind}:{digest}" if kind else digest
+
+    @staticmethod
+    def derived_key(dataset_key, name, **params):
+        """Key for a result derived from `dataset_key` with the given parameters"""
+        if not params:
+            return f"{dataset_key}/{name}"
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        return f"{dataset_key}/{name}/{hashlib.blake2b(encoded.encode('utf-8'), digest_size=8).hexdigest()}"
+
+    def get(self, key):
+        """Cached value for `key`, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                tracing.record_cache(True)
+                return entry.value
+            value = self._alive.get(key)
+            if value is not None:
+                # Evicted but still held by a session: re-admit without reloading
+                self._stats['revived'] += 1
+                self._admit(key, value, key.split('/')[1] if '/' in key else 'dataset')
+                tracing.record_cache(True)
+                return value
+            self._stats['misses'] += 1
+            tracing.record_cache(False)
+            return None
+
+    def peek(self, key):
+        """Cached value for `key` without touching LRU order or hit statistics"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.value if entry is not None else self._alive.get(key)
+
+    def put(self, key, value, kind='dataset', size=None):
+        """Store `value`; if an equal key is already cached the existing value wins.
+
+        `size` skips estimating the value's size when it is already known.
+        """
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing.value
+            self._admit(key, value, kind, size)
+            return value
+
+    def get_or_load(self, key, loader, kind='dataset'):
+        """Return the cached value or call `loader()` once, even under concurrent requests"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    # Another caller loaded it while we waited
+                    self._stats['misses'] -= 1
+                    self._stats['hits'] += 1
+            if entry is not None:
+                return entry.value
+            value = loader()
+            if value is not None:
+                value = self.put(key, value, kind)
+        with self._lock:
+            self._loading.pop(key, None)
+        return value
+
+    def get_or_compute(self, dataset_key, name, compute, **params):
+        """Derived-result variant of get_or_load"""
+        return self.get_or_load(self.derived_key(dataset_key, name, **params), compute, kind=name)
+
+    def resize(self, key):
+        """Re-measure an entry whose value grew after admission, evicting others if over budget"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            size = _estimate_size(entry.value)
+            self._bytes += size - entry.size
+            entry.size = size
+            self._evict(protect=key)
+
+    def discard(self, key):
+        """Drop a single entry (e.g. a result that should not be shared)"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+            self._alive.pop(key, None)
+
+    def invalidate(self, dataset_key):
+        """Drop a dataset and everything derived from it"""
+        with self._lock:
+            for key in [k for k in self._entries if k == dataset_key or k.startswith(f"{dataset_key}/")]:
+                self._bytes -= self._entries.pop(key).size
+                self._alive.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['revived'] + self._stats['misses']
+            by_kind = {}
+            for entry in self._entries.values():
+                kind = by_kind.setdefault(entry.kind, {'entries': 0, 'bytes': 0})
+                kind['entries'] += 1
+                kind['bytes'] += entry.size
+            return {
+                **self._stats,
+                'hit_rate': (self._stats['hits'] + self._stats['revived']) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'budget_bytes': self.memory_budget_bytes,
+                'by_kind': by_kind,
+            }
+
+    def _admit(self, key, value, kind, size=None):
+        size = _estimate_size(value) if size is None else size
+        self._entries[key] = _Entry(value, size, kind)
+        self._entries.move_to_end(key)
+        self._bytes += size
+        try:
+            self._alive[key] = value
+        except TypeError:
+            pass  # plain str/bytes/dict values cannot be weakly referenced
+        self._evict(protect=key)
+
+    def _evict(self, protect=None):
+        while self._bytes > self.memory_budget_bytes and len(self._entries) > 1:
+            key, entry = next(iter(self._entries.items()))
+            if key == protect:
+                self._entries.move_to_end(key)
+                continue
+            del self._entries[key]
+            self._bytes -= entry.size
+            self._stats['evictions'] += 1
@@ -0,0 +1,29 @@
+import os
+import tempfile
+import uuid
+from datetime import datetime
+
+
+def unique_report_path(prefix, suffix, directory=None):
+    """Build a collision-free report path inside `directory`"""
+    directory = directory or os.getcwd()
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(directory, f"{prefix}_{stamp}_{uuid.uuid4().hex[:8]}{suffix}")
+
+
+def write_atomic(data, filename):
+    """Write bytes to `filename` via a temp file + rename so readers never see partial output"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_', suffix=os.path.splitext(filename)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename
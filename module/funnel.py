@@ -0,0 +1,335 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from module.time_comparison import _clean_record, default_segments, find_date_column, find_measures, format_value
+from module.tracing import traced
+
+# Funnel stages in order, as KPI roles of time_comparison.find_measures
+STAGE_ROLES = ('impressions', 'clicks', 'conversions', 'approved_conversions')
+STEP_NAMES = {
+    ('impressions', 'clicks'): ('CTR (%)', 100.0),
+    ('clicks', 'conversions'): ('Conversion Rate (%)', 100.0),
+    ('conversions', 'approved_conversions'): ('Approval Rate (%)', 100.0),
+}
+DEFAULT_BOOTSTRAP = 1000
+# Rows are pooled into random buckets before resampling: about UNIT_BUDGET buckets in all,
+# between MIN_UNITS_PER_SEGMENT and MAX_UNITS_PER_SEGMENT per segment (fewer only if it has fewer rows)
+UNIT_BUDGET = 32_768
+MIN_UNITS_PER_SEGMENT = 20
+MAX_UNITS_PER_SEGMENT = 1024
+# Segments with fewer rows are reported but not tested: a bootstrap of a handful of rows is meaningless
+MIN_ROWS = 20
+# Bootstrap replicates are kept per segment for the percentile CIs (80 MB at this many segments)
+MAX_SEGMENTS = 5000
+# Replicates x resampling units per batch (bounds the temporary arrays to a few tens of MB)
+BATCH_CELLS = 2_000_000
+
+
+def _codes(df, columns):
+    """Dense segment codes per row and the label of each code, for one or several columns"""
+    per_column, labels = [], []
+    for col in columns:
+        codes, uniques = pd.factorize(df[col], sort=True)
+        # Missing values get their own trailing group
+        codes = np.where(codes < 0, len(uniques), codes).astype(np.int64)
+        per_column.append(codes)
+        labels.append(list(uniques) + [None])
+    if len(columns) == 1:
+        used, codes = np.unique(per_column[0], return_inverse=True)
+        return codes, [labels[0][i] for i in used]
+    shape = tuple(len(l) for l in labels)
+    combined = np.ravel_multi_index(per_column, shape)
+    used, codes = np.unique(combined, return_inverse=True)
+    parts = np.unravel_index(used, shape)
+    names = [" / ".join(str(labels[c][part[i]]) for c, part in enumerate(parts)) for i in range(len(used))]
+    return codes, names
+
+
+_erfc = np.vectorize(math.erfc, otypes=[np.float64])
+# Poisson(1) CDF: counting the thresholds a uniform draw exceeds is an exact inverse-CDF sample
+# (up to P(X > 12) < 1e-10) and several times faster than Generator.poisson
+_POISSON_CDF = np.cumsum([math.exp(-1) / math.factorial(k) for k in range(12)]).astype(np.float32)
+
+
+def _poisson_weights(rng, shape):
+    uniform = rng.random(shape, dtype=np.float32)
+    weights = np.zeros(shape, dtype=np.float32)
+    for threshold in _POISSON_CDF:
+        weights += uniform > threshold
+    return weights
+
+
+def _nanquantiles(values, quantiles):
+    """np.nanquantile along axis 0 (linear interpolation) with one sort instead of a loop per column"""
+    ordered = np.sort(values, axis=0)  # NaN last
+    count = np.isfinite(ordered).sum(axis=0)
+    result = []
+    for q in quantiles:
+        position = np.maximum(count - 1, 0) * q
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, np.maximum(count - 1, 0))
+        below = np.take_along_axis(ordered, low[None], axis=0)[0]
+        above = np.take_along_axis(ordered, high[None], axis=0)[0]
+        value = below + (above - below) * (position - low)
+        result.append(np.where(count > 0, value, np.nan))
+    return result
+
+
+def _fdr(p_values):
+    """Benjamini-Hochberg adjusted p-values (NaN stays NaN)"""
+    p = np.asarray(p_values, dtype=np.float64)
+    q = np.full(p.shape, np.nan)
+    tested = np.flatnonzero(np.isfinite(p))
+    if len(tested) == 0:
+        return q
+    order = tested[np.argsort(p[tested])]
+    ranked = p[order] * len(order) / np.arange(1, len(order) + 1)
+    q[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q
+
+
+class FunnelAnalysis:
+    """Impressions -> Clicks -> Total_Conversion -> Approved_Conversion rates per segment.
+
+    Every step rate (plus the end-to-end rate) of every segment is scored
+    against the rest of the data with a Poisson bootstrap over rows: each
+    replicate draws a Poisson(1) weight per row, so all segments of a column
+    and their complements are resampled together by one weight matrix and a
+    segmented sum. Rates are ratios of totals, which stays valid when a step
+    is not nested (ads can report more conversions than clicks). Large
+    segments are pooled into random buckets of rows first (a bucket
+    bootstrap), keeping the cost independent of the row count.
+    """
+
+    def __init__(self, df, stages=None, n_boot=DEFAULT_BOOTSTRAP, seed=0):
+        measures = find_measures(df)
+        self.stages = stages or [measures[role] for role in STAGE_ROLES if role in measures]
+        if len(self.stages) < 2:
+            raise ValueError("Need at least two funnel stages (e.g. Impressions and Clicks)")
+        self.n_boot = n_boot
+        self.seed = seed
+        self._df = df
+        self._values = np.nan_to_num(df[self.stages].to_numpy(dtype=np.float64))
+
+        # Steps between consecutive stages, then first-to-last stage as the primary rate
+        # (with two stages the single step already is the end-to-end rate)
+        roles = {col: role for role, col in measures.items()}
+        self.steps = []
+        for i in range(len(self.stages) - 1):
+            name, scale = STEP_NAMES.get((roles.get(self.stages[i]), roles.get(self.stages[i + 1])),
+                                         (f"{self.stages[i + 1]} / {self.stages[i]} (%)", 100.0))
+            self.steps.append((name, i + 1, i, scale))
+        if len(self.steps) > 1:
+            self.primary = f"{self.stages[-1]} per 1M {self.stages[0]}"
+            self.steps.append((self.primary, len(self.stages) - 1, 0, 1e6))
+        else:
+            self.primary = self.steps[0][0]
+        self.step_names = [name for name, _, _, _ in self.steps]
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        """A FunnelAnalysis for `df`, or None when it lacks funnel columns"""
+        try:
+            return cls(df, **kwargs)
+        except ValueError:
+            return None
+
+    def memory_bytes(self):
+        """Bytes held by the stage matrix (the frame itself is shared)"""
+        return self._values.nbytes
+
+    def _rates(self, sums):
+        """Step rates for stage totals of shape (..., stages)"""
+        rates = np.empty(sums.shape[:-1] + (len(self.steps),), dtype=np.float64)
+        for i, (_, num, den, scale) in enumerate(self.steps):
+            denominator = sums[..., den]
+            np.divide(sums[..., num] * scale, denominator, out=rates[..., i], where=denominator != 0)
+            rates[..., i][denominator == 0] = np.nan
+        return rates
+
+    def _units(self, codes, n_segments, rng):
+        """Stage totals per resampling unit, sorted by segment, and each segment's first unit"""
+        # Shuffle before bucketing so a bucket is a random subset of its segment's rows
+        order = rng.permutation(len(codes))
+        order = order[np.argsort(codes[order], kind='stable')]
+        grouped = codes[order]
+        starts = np.searchsorted(grouped, np.arange(n_segments))
+        rank = np.arange(len(grouped)) - starts[grouped]
+        buckets = int(np.clip(UNIT_BUDGET // max(n_segments, 1), MIN_UNITS_PER_SEGMENT, MAX_UNITS_PER_SEGMENT))
+        unit_ids, inverse = np.unique(grouped * buckets + rank % buckets, return_inverse=True)
+        values = self._values[order]
+        totals = np.column_stack([np.bincount(inverse, weights=values[:, k], minlength=len(unit_ids))
+                                  for k in range(values.shape[1])])
+        return totals, np.searchsorted(unit_ids // buckets, np.arange(n_segments))
+
+    @traced('funnel.score')
+    def score(self, segment):
+        """Rate, bootstrap CI and p-value against the other rows for every value of `segment` and step.
+
+        `segment` is a column or a list of columns (their combinations are
+        the segments). Columns: segment, rows, step, rate, ci_low, ci_high,
+        baseline (rate of all other rows), lift (rate / baseline - 1),
+        p_value (two-sided; NaN for segments under MIN_ROWS rows).
+        """
+        columns = [segment] if isinstance(segment, str) or not isinstance(segment, (list, tuple)) else list(segment)
+        codes, labels = _codes(self._df, columns)
+        n_segments, n_steps = len(labels), len(self.steps)
+        if n_segments > MAX_SEGMENTS:
+            raise ValueError(f"Too many segments to score: {n_segments:,} (limit {MAX_SEGMENTS:,})")
+        rng = np.random.default_rng(self.seed)
+        units, unit_starts = self._units(codes, n_segments, rng)
+
+        # 1. Point estimates against the complement
+        segment_sums = np.add.reduceat(units, unit_starts, axis=0)
+        rest_sums = units.sum(axis=0) - segment_sums
+        rates, baseline = self._rates(segment_sums), self._rates(rest_sums)
+
+        # 2. Batched bootstrap: one Poisson weight matrix per batch resamples every segment at once
+        replicates = np.empty((self.n_boot, n_segments, n_steps), dtype=np.float32)
+        # Running moments of (segment - rest) for the standard error of the difference
+        valid = np.zeros((n_segments, n_steps))
+        total = np.zeros((n_segments, n_steps))
+        squares = np.zeros((n_segments, n_steps))
+        # float32, one contiguous row per stage: the weighted sums are memory-bound, and float32
+        # rounding (~1e-6 relative) is far below the resampling noise
+        units32 = units.astype(np.float32)
+        stage_rows = np.ascontiguousarray(units32.T)
+        batch = max(1, BATCH_CELLS // len(units))
+        for lo in range(0, self.n_boot, batch):
+            weights = _poisson_weights(rng, (min(batch, self.n_boot - lo), len(units)))
+            boot_segment = np.stack([np.add.reduceat(weights * row, unit_starts, axis=1) for row in stage_rows],
+                                    axis=-1).astype(np.float64)
+            boot_rest = (weights @ units32).astype(np.float64)[:, None, :] - boot_segment
+            boot_rates = self._rates(boot_segment)
+            diff = boot_rates - self._rates(boot_rest)
+            replicates[lo:lo + len(weights)] = boot_rates
+            finite = np.isfinite(diff)
+            diff = np.where(finite, diff, 0.0)
+            valid += finite.sum(axis=0)
+            total += diff.sum(axis=0)
+            squares += (diff * diff).sum(axis=0)
+
+        # 3. Percentile CIs; p-values from the bootstrap standard error, which (unlike counting
+        #    replicates) resolves the small p-values that an FDR over many segments needs
+        ci_low, ci_high = _nanquantiles(replicates, (0.025, 0.975))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = (squares - total * total / valid) / (valid - 1)
+            z = (rates - baseline) / np.sqrt(variance)
+            lift = rates / baseline - 1
+        p_values = _erfc(np.abs(z) / np.sqrt(2))
+        rows = np.bincount(codes, minlength=n_segments)
+        p_values[(rows < MIN_ROWS)[:, None] | ~(variance > 0)] = np.nan
+
+        return pd.DataFrame({
+            'segment': np.repeat(np.array(labels, dtype=object), n_steps),
+            'rows': np.repeat(rows, n_steps),
+            'step': np.tile(self.step_names, n_segments),
+            'rate': rates.ravel(),
+            'ci_low': ci_low.ravel().astype(np.float64),
+            'ci_high': ci_high.ravel().astype(np.float64),
+            'baseline': baseline.ravel(),
+            'lift': lift.ravel(),
+            'p_value': p_values.ravel(),
+        })
+
+    @traced('funnel.summary')
+    def summary(self, segments=None, alpha=0.05, top_n=3):
+        """JSON-safe funnel summary with the significant winners and losers on the end-to-end rate.
+
+        `segments` defaults to every low-cardinality column plus their full
+        combination. p-values are adjusted for the number of segments tested
+        (Benjamini-Hochberg), and a segment wins or loses when its adjusted
+        value is at most `alpha`; each one carries the step that differs most.
+        """
+        if segments is None:
+            # Every measure column is excluded, not only the stages chosen for this funnel
+            measures = {**find_measures(self._df), **{stage: stage for stage in self.stages}}
+            segments = default_segments(self._df, find_date_column(self._df), measures)
+            if len(segments) > 1:
+                segments = segments + [tuple(segments)]
+        overall = self._rates(self._values.sum(axis=0))
+        scored = []
+        for spec in segments:
+            scores = self.score(spec)
+            scores.insert(0, 'column', " x ".join(map(str, spec)) if isinstance(spec, (list, tuple)) else str(spec))
+            scored.append(scores)
+        result = {
+            'stages': list(self.stages),
+            'primary': self.primary,
+            'overall': {name: _clean_record({'v': value})['v'] for name, value in zip(self.step_names, overall)},
+            'n_boot': self.n_boot,
+            'alpha': alpha,
+            'segments_scored': 0,
+            'tests': 0,
+            'winners': [],
+            'losers': [],
+        }
+        if not scored:
+            return result
+        scores = pd.concat(scored, ignore_index=True)
+        primary = scores[scores['step'] == self.primary].copy()
+        primary['q_value'] = _fdr(primary['p_value'].to_numpy())
+        result['segments_scored'] = len(primary)
+        result['tests'] = int(primary['p_value'].notna().sum())
+
+        significant = primary[primary['q_value'] <= alpha]
+        steps = scores[scores['step'] != self.primary].set_index(['column', 'segment']).sort_index()
+        for key, chosen, ascending in (('winners', significant[significant['lift'] > 0], False),
+                                       ('losers', significant[significant['lift'] < 0], True)):
+            ranked = chosen.sort_values('lift', ascending=ascending)
+            # The strongest segment of each column first, so one column does not take every slot
+            first = ranked.drop_duplicates('column')
+            ranked = pd.concat([first, ranked.drop(first.index)])
+            for record in ranked.head(top_n).to_dict(orient='records'):
+                entry = _clean_record(record)
+                # A list key keeps a DataFrame even when the segment has a single step row
+                step_lifts = steps.loc[[(record['column'], record['segment'])]] if len(steps) else steps
+                step_lifts = step_lifts[step_lifts['lift'].notna()]
+                if len(step_lifts):
+                    lifts = step_lifts['lift'].to_numpy()
+                    i = int(np.argmax(lifts) if key == 'winners' else np.argmin(lifts))
+                    entry['driver'] = _clean_record({'step': step_lifts['step'].iloc[i], 'lift': lifts[i]})
+                result[key].append(entry)
+        return result
+
+
+def funnel_summary(df, **kwargs):
+    """FunnelAnalysis(df).summary(), or None when `df` has no funnel columns"""
+    analysis = FunnelAnalysis.from_frame(df)
+    if analysis is None:
+        return None
+    return analysis.summary(**kwargs)
+
+
+def recommendation_lines(summary, max_lines=5):
+    """Recommendation sentences for the significant winners and losers of a funnel summary"""
+    lines = []
+    if not summary:
+        return lines
+    primary = summary['primary']
+    for entry in summary['winners']:
+        lines.append(f"Scale {entry['column']} = {entry['segment']}: {primary} {format_value(entry['rate'])} vs "
+                     f"{format_value(entry['baseline'])} elsewhere ({entry['lift']:+.0%}, {_q(entry['q_value'])})"
+                     + _driver(entry, "strongest"))
+    for entry in summary['losers']:
+        lines.append(f"Cut or rework {entry['column']} = {entry['segment']}: {primary} {format_value(entry['rate'])} vs "
+                     f"{format_value(entry['baseline'])} elsewhere ({entry['lift']:+.0%}, {_q(entry['q_value'])})"
+                     + _driver(entry, "weakest"))
+    # Alternate winners and losers so both show up when lines are capped
+    winners, losers = lines[:len(summary['winners'])], lines[len(summary['winners']):]
+    mixed = [line for pair in zip(winners, losers) for line in pair]
+    mixed += winners[len(losers):] + losers[len(winners):]
+    return mixed[:max_lines]
+
+
+def _q(value):
+    return "q<0.001" if value < 0.001 else f"q={value:.3f}"
+
+
+def _driver(entry, label):
+    driver = entry.get('driver')
+    if not driver or driver.get('lift') is None:
+        return ""
+    return f"; {label} step: {driver['step']} ({driver['lift']:+.0%})"
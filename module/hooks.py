@@ -0,0 +1,63 @@
+import logging
+
+logger = logging.getLogger("trendspotter")
+
+_LOG_LEVELS = {
+    'success': logging.INFO,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+# Callables taking (level, message), keyed by name; the UI or CLI registers its own
+_reporters = {}
+
+
+def _reporter_name(reporter):
+    return f"{reporter.__module__}.{reporter.__qualname__}"
+
+
+def add_reporter(reporter, name=None):
+    """Register a callable(level, message) for user-facing status messages.
+    
+    A reporter returns True when it handled the message; messages no
+    reporter handled are logged. Registering again under the same name replaces the previous reporter, so
+    scripts that re-run (like Streamlit apps) do not stack duplicates.
+    """
+    _reporters[name or _reporter_name(reporter)] = reporter
+
+
+def remove_reporter(reporter, name=None):
+    _reporters.pop(name or _reporter_name(reporter), None)
+
+
+def set_reporter(reporter):
+    """Replace all registered reporters with `reporter` (None restores logging)"""
+    _reporters.clear()
+    if reporter is not None:
+        add_reporter(reporter)
+
+
+def report(level, message):
+    """Send a status message to the registered reporters, or to logging if none handled it"""
+    handled = False
+    for reporter in list(_reporters.values()):
+        handled = bool(reporter(level, message)) or handled
+    if not handled:
+        logger.log(_LOG_LEVELS.get(level, logging.INFO), message)
+
+
+def success(message):
+    report('success', message)
+
+
+def info(message):
+    report('info', message)
+
+
+def warning(message):
+    report('warning', message)
+
+
+def error(message):
+    report('error', message)
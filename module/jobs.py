@@ -0,0 +1,278 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from module import hooks
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# The job whose task is running on the current worker thread
+_current = threading.local()
+
+
+class JobCancelled(Exception):
+    """Raised inside a task when its job has been cancelled"""
+
+
+class Job:
+    """One unit of background work plus its progress, partial results and outcome"""
+
+    def __init__(self, owner, name, fn, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.name = name
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Queued"
+        self.partial = {}
+        self.messages = []
+        self.result = None
+        self.error = None
+        self.exception = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+        self._cancel = threading.Event()
+        self._manager = None
+        self._callbacks = []
+        self._callback_lock = threading.Lock()
+
+    def update(self, progress=None, message=None, **partial):
+        """Called by the task to report progress and publish partial results"""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, float(progress)))
+        if message is not None:
+            self.message = message
+        if partial:
+            self.partial.update(partial)
+
+    def run_in_process(self, fn, *args, **kwargs):
+        """Run a CPU-bound, picklable callable on the shared process pool and wait for it"""
+        return self._manager.process_pool.submit(fn, *args, **kwargs).result()
+
+    def add_done_callback(self, fn):
+        """Call `fn(job)` once the job has finished (right away if it already has)"""
+        with self._callback_lock:
+            if not self.finished:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def snapshot(self):
+        """Plain-dict view of the job, safe to hand to the UI or serialize"""
+        return {
+            'id': self.id,
+            'owner': self.owner,
+            'name': self.name,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'messages': list(self.messages),
+            'partial_keys': sorted(self.partial),
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+def _job_reporter(level, message):
+    """Route hook messages raised inside a task to that task's job"""
+    job = getattr(_current, 'job', None)
+    if job is None:
+        return False
+    job.messages.append((level, message))
+    return True
+
+
+class JobManager:
+    """Shared worker pool that runs jobs from many owners with round-robin fairness.
+
+    Each owner (a browser session, an API client) has its own FIFO queue; when
+    a worker frees up the next job is taken from the next owner in turn, so one
+    user queueing many reports cannot starve everyone else. Jobs live in the
+    manager, not in the caller, so they survive Streamlit reruns. Finished
+    jobs (and their results) are kept for `keep_finished_seconds`, at most
+    `max_finished` of them, and pruned every `prune_interval` seconds.
+    """
+
+    def __init__(self, max_workers=4, process_workers=None, keep_finished_seconds=3600, max_finished=500,
+                 prune_interval=60):
+        self.max_workers = max_workers
+        self.process_workers = process_workers
+        self.keep_finished_seconds = keep_finished_seconds
+        self.max_finished = max_finished
+        self.prune_interval = prune_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._process_pool = None
+        self._jobs = OrderedDict()
+        self._queues = OrderedDict()
+        self._last_owner = None
+        self._running = 0
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        hooks.add_reporter(_job_reporter)
+        threading.Thread(target=self._prune_loop, name='job-prune', daemon=True).start()
+
+    @property
+    def process_pool(self):
+        """Lazily created process pool for CPU-bound steps inside jobs"""
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+            return self._process_pool
+
+    def submit(self, owner, name, fn, *args, **kwargs):
+        """Queue `fn(job, *args, **kwargs)` for `owner`; returns the job id"""
+        job = Job(owner, name, fn, args, kwargs)
+        job._manager = self
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._queues.setdefault(owner, deque()).append(job)
+            self._dispatch()
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, owner):
+        with self._lock:
+            return [job for job in self._jobs.values() if job.owner == owner]
+
+    def forget(self, job_id):
+        """Drop a finished job and its result now instead of waiting for pruning"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.finished:
+                del self._jobs[job_id]
+                return True
+            return False
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or ask a running one to stop at its next update()"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job._cancel.set()
+            if job.status == QUEUED:
+                self._queues[job.owner].remove(job)
+                self._finish(job, CANCELLED)
+            return True
+
+    def stats(self):
+        with self._lock:
+            by_status = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {
+                'workers': self.max_workers,
+                'running': self._running,
+                'queued': sum(len(q) for q in self._queues.values()),
+                'owners_waiting': sum(1 for q in self._queues.values() if q),
+                'jobs': by_status,
+            }
+
+    def shutdown(self, wait=True):
+        self._stopped.set()
+        hooks.remove_reporter(_job_reporter)
+        self._executor.shutdown(wait=wait)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait)
+
+    def _next_job(self):
+        """Pop the next job, visiting owners round-robin"""
+        owners = list(self._queues)
+        start = owners.index(self._last_owner) + 1 if self._last_owner in owners else 0
+        for owner in owners[start:] + owners[:start]:
+            queue = self._queues[owner]
+            if queue:
+                self._last_owner = owner
+                return queue.popleft()
+        return None
+
+    def _dispatch(self):
+        with self._lock:
+            while self._running < self.max_workers:
+                job = self._next_job()
+                if job is None:
+                    break
+                self._running += 1
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.message = "Running"
+                self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        _current.job = job
+        try:
+            job.result = job._fn(job, *job._args, **job._kwargs)
+            status = DONE
+            job.progress = 1.0
+            job.message = "Done"
+        except JobCancelled:
+            status = CANCELLED
+            job.message = "Cancelled"
+        except Exception as e:
+            status = FAILED
+            job.exception = e
+            job.error = f"{e}"
+            job.message = f"Failed: {e}"
+            job.messages.append(('error', traceback.format_exc(limit=5)))
+        finally:
+            _current.job = None
+        with self._lock:
+            self._running -= 1
+            self._finish(job, status)
+            self._dispatch()
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        job._fn = job._args = job._kwargs = None
+        with job._callback_lock:
+            callbacks, job._callbacks = job._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(job)
+            except Exception:
+                pass  # a failing listener must not break the worker
+
+    def _prune_loop(self):
+        while not self._stopped.wait(self.prune_interval):
+            with self._lock:
+                self._prune()
+
+    def _prune(self):
+        """Forget finished jobs older than keep_finished_seconds or beyond max_finished, and empty owner queues"""
+        cutoff = time.time() - self.keep_finished_seconds
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+        excess = len(finished) - self.max_finished
+        for i, job in enumerate(finished):
+            if i < excess or job.finished_at < cutoff:
+                del self._jobs[job.id]
+        for owner in [o for o, q in self._queues.items() if not q and o != self._last_owner]:
+            del self._queues[owner]
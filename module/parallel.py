@@ -0,0 +1,234 @@
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from module.tracing import span
+
+ALIGNMENT = 64
+# Below this many numeric cells the pool's overhead outweighs the work
+DEFAULT_MIN_CELLS = 2_000_000
+# tmpfs backing multiprocessing.shared_memory on Linux (often only 64 MB in containers)
+SHM_DIR = '/dev/shm'
+
+
+def _shareable(values):
+    """Plain numpy numeric/bool arrays can live in shared memory; everything else stays local"""
+    return isinstance(values, np.ndarray) and values.dtype.kind in 'biuf'
+
+
+def _shm_free():
+    """Free bytes for shared memory blocks, or None where there is no tmpfs to check"""
+    try:
+        return shutil.disk_usage(SHM_DIR).free
+    except OSError:
+        return None
+
+
+class SharedFrame:
+    """Numeric columns of a DataFrame copied once into a shared-memory block.
+
+    The copy doubles the memory of those columns while the block exists.
+
+    Workers attach to the block by name and read the columns as numpy views,
+    so a task only ships a small spec instead of pickling the data. An
+    optional int64 output area lets workers write per-row results (e.g.
+    factorized codes) back without pickling them either.
+    """
+
+    def __init__(self, df, columns, output_columns=0):
+        rows = len(df)
+        layout = []
+        offset = 0
+        for col in columns:
+            values = df[col].to_numpy()
+            layout.append((col, values.dtype.str, offset))
+            offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+        self.output_offset = offset
+        size = offset + output_columns * rows * 8
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (col, dtype, start) in layout:
+            np.ndarray(rows, dtype=dtype, buffer=self._shm.buf, offset=start)[:] = df[col].to_numpy()
+        self.spec = {'name': self._shm.name, 'rows': rows, 'columns': layout,
+                     'output_offset': self.output_offset}
+
+    def output(self, index):
+        """Owner-side view of output column `index` (copy it before closing)"""
+        rows = self.spec['rows']
+        return np.ndarray(rows, dtype=np.int64, buffer=self._shm.buf, offset=self.output_offset + index * rows * 8)
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(spec):
+    # Spawned workers share the owner's resource tracker, so attaching registers
+    # nothing new and only the owner's unlink releases the block
+    return shared_memory.SharedMemory(name=spec['name'])
+
+
+def _column(shm, spec, column):
+    for col, dtype, start in spec['columns']:
+        if col == column:
+            return np.ndarray(spec['rows'], dtype=dtype, buffer=shm.buf, offset=start)
+    raise KeyError(column)
+
+
+def column_metrics(series):
+    """get_basic_metrics entry for one column"""
+    return {
+        'mean': float(series.mean()),
+        'median': float(series.median()),
+        'std': float(series.std()),
+        'min': float(series.min()),
+        'max': float(series.max()),
+        'null_count': int(series.isnull().sum()),
+    }
+
+
+def column_op(series, op):
+    """One per-column operation, shared by the workers and the single-process path"""
+    if op == 'metrics':
+        return column_metrics(series)
+    if op == 'describe':
+        return series.describe().to_dict()
+    if op == 'median':
+        return series.median()
+    raise ValueError(f"Unknown column operation: {op}")
+
+
+def _column_task(spec, column, op, output_index=None):
+    """Run one per-column operation in a worker, reading the column from shared memory"""
+    shm = _attach(spec)
+    values = None
+    try:
+        values = _column(shm, spec, column)
+        if op == 'factorize':
+            codes, uniques = pd.factorize(values)
+            out = np.ndarray(spec['rows'], dtype=np.int64, buffer=shm.buf,
+                             offset=spec['output_offset'] + output_index * spec['rows'] * 8)
+            out[:] = codes
+            del out
+            return len(uniques)
+        return column_op(pd.Series(values, copy=False), op)
+    finally:
+        del values
+        shm.close()
+
+
+class ParallelExecutor:
+    """Process pool for column-parallel work on DataFrames.
+
+    Numeric columns go into shared memory once per call; object columns,
+    which cannot, are handled in this process while the workers run.
+    Every operation calls the same pandas routine as the single-process
+    code on the same values, so results are identical.
+    """
+
+    def __init__(self, workers=None, min_cells=DEFAULT_MIN_CELLS):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_cells = min_cells
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process with live threads (Streamlit, the job pool) is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def worthwhile(self, df, columns=None):
+        """Whether `df` is big enough to be worth spreading over the pool, and its copy fits in shared memory"""
+        if self.workers < 2:
+            return False
+        shareable = [df[c].to_numpy() for c in (df.columns if columns is None else columns)]
+        shareable = [values for values in shareable if _shareable(values)]
+        count = len(columns) if columns is not None else len(shareable)
+        if count < 2 or len(df) * count < self.min_cells:
+            return False
+        # Worst case is duplicated(): the columns plus one int64 output column each
+        needed = sum(values.nbytes for values in shareable) + len(shareable) * len(df) * 8
+        free = _shm_free()
+        return free is None or needed <= free
+
+    def map_columns(self, df, columns, op):
+        """{column: column_op(df[column], op)} for 'metrics', 'describe' or 'median'"""
+        with span('parallel.columns', op=op, columns=len(columns), workers=self.workers):
+            shareable = [col for col in columns if _shareable(df[col].to_numpy())]
+            with SharedFrame(df, shareable) as shared:
+                futures = {col: self.pool.submit(_column_task, shared.spec, col, op) for col in shareable}
+                # Extension-typed columns (nullable ints, ...) run here meanwhile
+                local = {col: column_op(df[col], op) for col in columns if col not in futures}
+                remote = {col: future.result() for col, future in futures.items()}
+            return {col: local[col] if col in local else remote[col] for col in columns}
+
+    def duplicated(self, df):
+        """Same as df.duplicated(): columns are factorized in parallel, then combined as pandas does"""
+        if df.empty:
+            return pd.Series(dtype=bool)
+        with span('parallel.duplicated', columns=len(df.columns), workers=self.workers):
+            shareable = [col for col in df.columns if _shareable(df[col].to_numpy())]
+            labels, shape = {}, {}
+            with SharedFrame(df, shareable, output_columns=len(shareable)) as shared:
+                futures = {col: self.pool.submit(_column_task, shared.spec, col, 'factorize', i)
+                           for i, col in enumerate(shareable)}
+                # Object columns are factorized here while the workers run
+                for col in df.columns:
+                    if col not in futures:
+                        codes, uniques = pd.factorize(df[col])
+                        labels[col], shape[col] = codes.astype('i8', copy=False), len(uniques)
+                for i, col in enumerate(shareable):
+                    shape[col] = futures[col].result()
+                    labels[col] = shared.output(i).copy()
+            # Same codes drop_duplicates() builds; -1 (missing) is one more value, as in pandas
+            keys = pd.MultiIndex(levels=[pd.RangeIndex(shape[col]) for col in df.columns],
+                                 codes=[labels[col] for col in df.columns], verify_integrity=False)
+            return pd.Series(keys.duplicated(keep='first'), index=df.index)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+
+
+def executor_for(df, columns=None, executor=None):
+    """`executor` (default: the process-wide one) if `df` is worth parallelizing, else None"""
+    executor = executor or get_executor()
+    return executor if executor is not None and executor.worthwhile(df, columns) else None
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide executor, or None when parallelism is off.
+
+    Off by default: set TRENDSPOTTER_PROCESS_WORKERS to 2 or more to opt in.
+    """
+    global _default
+    workers = int(os.getenv("TRENDSPOTTER_PROCESS_WORKERS", "0"))
+    if workers < 2:
+        return None
+    with _default_lock:
+        if _default is None or _default.workers != workers:
+            if _default is not None:
+                _default.shutdown(wait=False)
+            _default = ParallelExecutor(workers=workers)
+        return _default
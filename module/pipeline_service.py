@@ -0,0 +1,394 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from module.artifact_cache import ReportArtifactCache, dataset_fingerprint
+from module.data_ingestion import DataIngestor
+from module.data_processing import DataProcessor
+from module.budget import BudgetSimulator
+from module.dataset_store import SharedDatasetStore
+from module.funnel import FunnelAnalysis
+from module.file_utils import write_atomic
+from module.jobs import JobManager
+from module.sample_data import SAMPLES, sample_key, sample_path
+from module.tasks import render_report, run_analysis
+from module.time_comparison import TimeComparison
+
+UPLOAD_EXTENSIONS = ('.csv', '.xlsx', '.xls', '.feather', '.arrow')
+
+
+class DatasetNotFound(KeyError):
+    """Unknown dataset id"""
+
+
+class InsightsNotReady(Exception):
+    """A report was requested before any AI insights exist for the dataset"""
+
+
+class PipelineService:
+    """The TrendSpotter pipeline behind an API: datasets, cleaning, KPIs, charts, insights, reports.
+
+    One instance holds the pooled resources every request shares: the job
+    worker pool, the content-addressed dataset store, the rendered-report
+    cache and a single Gemini client (SQL engines are pooled by
+    module.data_ingestion). Datasets are registered once and addressed by a
+    short id; their frames live in the store, which may evict them, so each
+    dataset keeps a loader (a spilled upload, a path, a query or its parent)
+    to bring it back.
+
+    Server-side sources are opt-in: `register_path` only reads files under
+    `data_dir` (TRENDSPOTTER_DATA_DIR, default ./data) and `register_sql`
+    only connects to the URLs in `sql_urls` (whitespace-separated
+    TRENDSPOTTER_SQL_URLS, default none).
+    """
+
+    def __init__(self, workers=4, memory_budget_bytes=2 * 1024**3, cache_dir=None, ai=None, data_dir=None,
+                 sql_urls=None):
+        cache_dir = cache_dir or os.getenv("TRENDSPOTTER_CACHE_DIR", ".cache")
+        self.data_dir = os.path.realpath(data_dir or os.getenv("TRENDSPOTTER_DATA_DIR", "data"))
+        self.sql_urls = set(os.getenv("TRENDSPOTTER_SQL_URLS", "").split() if sql_urls is None else sql_urls)
+        self.jobs = JobManager(max_workers=workers)
+        self.store = SharedDatasetStore(memory_budget_bytes=memory_budget_bytes)
+        self.artifacts = ReportArtifactCache(directory=os.path.join(cache_dir, 'reports'))
+        self.cache_dir = cache_dir
+        self.upload_dir = os.path.join(cache_dir, 'uploads')
+        self._ai = ai
+        self._datasets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ai(self):
+        """Gemini client, created on first use and shared by every request"""
+        with self._lock:
+            if self._ai is None:
+                from module.ai_insight import GeminiInsights
+                self._ai = GeminiInsights()
+            return self._ai
+
+    # Datasets
+
+    def _register(self, dataset_id, key, name, loader, parent=None, operation='load'):
+        with self._lock:
+            meta = self._datasets.get(dataset_id)
+            if meta is None:
+                meta = self._datasets[dataset_id] = {
+                    'id': dataset_id, 'key': key, 'name': name, 'parent': parent,
+                    'operation': operation, 'created_at': time.time(), 'loader': loader,
+                }
+        self.frame(dataset_id)
+        return self.describe(dataset_id)
+
+    def register_upload(self, data, filename='upload.csv'):
+        """Register raw CSV/Excel/Feather bytes; identical uploads map to the same dataset"""
+        extension = os.path.splitext(filename)[1].lower() or '.csv'
+        if extension not in UPLOAD_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {extension}")
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        # Spill the upload so the frame can be re-parsed after eviction
+        path = os.path.join(self.upload_dir, f"{digest}{extension}")
+        if not os.path.exists(path):
+            write_atomic(data, path)
+        key = self.store.content_key(data, extension.lstrip('.'))
+        return self._register(digest, key, filename, lambda: self._ingest_path(path))
+
+    def register_path(self, path):
+        """Register a CSV/Excel file under the data directory (relative paths start there)"""
+        path = os.path.realpath(os.path.join(self.data_dir, path))
+        if os.path.commonpath([path, self.data_dir]) != self.data_dir:
+            raise PermissionError(f"Only files under the data directory can be registered: {self.data_dir}")
+        if not os.path.isfile(path):
+            raise ValueError(f"File not found: {path}")
+        stat = os.stat(path)
+        digest = hashlib.blake2b(f"{path}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'),
+                                 digest_size=16).hexdigest()
+        return self._register(digest, f"path:{digest}", os.path.basename(path), lambda: self._ingest_path(path))
+
+    def register_sample(self, name):
+        """Register a bundled sample dataset (memory-mapped from Feather)"""
+        path = sample_path(name, self.cache_dir)
+        key = sample_key(name, self.cache_dir)
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return self._register(digest, key, SAMPLES[name][0], lambda: self._ingest_path(path))
+
+    def register_sql(self, connection_string, query):
+        """Register the result of a SQL query on an allow-listed database (run through the shared engine pool)"""
+        if connection_string not in self.sql_urls:
+            raise PermissionError("SQL source not allowed: add its URL to TRENDSPOTTER_SQL_URLS")
+
+        def load():
+            data = DataIngestor().ingest_sql(connection_string, query)
+            if data is None:
+                raise ValueError("SQL query failed")
+            return data
+        digest = hashlib.blake2b(f"{connection_string}|{query}".encode('utf-8'), digest_size=16).hexdigest()
+        return self._register(digest, f"sql:{digest}", query, load)
+
+    def _ingest_path(self, path):
+        data = DataIngestor().ingest_path(path)
+        if data is None:
+            raise ValueError(f"Could not parse {os.path.basename(path)}")
+        return data
+
+    def _meta(self, dataset_id):
+        with self._lock:
+            meta = self._datasets.get(dataset_id)
+        if meta is None:
+            raise DatasetNotFound(dataset_id)
+        return meta
+
+    def frame(self, dataset_id):
+        """DataFrame of a registered dataset, reloaded through its loader if it was evicted"""
+        meta = self._meta(dataset_id)
+        return self.store.get_or_load(meta['key'], meta['loader'])
+
+    def describe(self, dataset_id):
+        meta = self._meta(dataset_id)
+        df = self.frame(dataset_id)
+        info = self.store.get_or_compute(meta['key'], 'data_info', lambda: DataIngestor.build_data_info(df))
+        return {
+            'id': dataset_id,
+            'name': meta['name'],
+            'parent': meta['parent'],
+            'operation': meta['operation'],
+            'rows': int(info['shape'][0]),
+            'columns': info['columns'],
+            'dtypes': info['dtypes'],
+            'missing_values': {col: int(n) for col, n in info['missing_values'].items()},
+            'memory_mb': round(info['memory_usage'], 3),
+        }
+
+    def list_datasets(self):
+        with self._lock:
+            ids = list(self._datasets)
+        return [self.describe(dataset_id) for dataset_id in ids]
+
+    def clean(self, dataset_id):
+        """Register the cleaned version of a dataset as a new dataset"""
+        meta = self._meta(dataset_id)
+        cleaned_id = hashlib.blake2b(f"{dataset_id}/cleaned".encode('utf-8'), digest_size=16).hexdigest()
+        key = self.store.derived_key(meta['key'], 'cleaned')
+        result = self._register(cleaned_id, key, f"{meta['name']} (cleaned)",
+                                lambda: DataProcessor(self.frame(dataset_id)).clean_data(),
+                                parent=dataset_id, operation='clean')
+        result['rows_removed'] = self.describe(dataset_id)['rows'] - result['rows']
+        return result
+
+    # Derived results
+
+    def kpis(self, dataset_id):
+        """Headline totals and rates plus per-column metrics"""
+        meta = self._meta(dataset_id)
+        df = self.frame(dataset_id)
+
+        def compute():
+            totals = {col: float(df[col].sum()) for col in
+                      ('Impressions', 'Clicks', 'Spent', 'Total_Conversion', 'Approved_Conversion')
+                      if col in df.columns}
+            rates = {}
+            if totals.get('Impressions'):
+                rates['ctr'] = totals.get('Clicks', 0.0) / totals['Impressions']
+            if totals.get('Clicks'):
+                rates['cpc'] = totals.get('Spent', 0.0) / totals['Clicks']
+                rates['conversion_rate'] = totals.get('Total_Conversion', 0.0) / totals['Clicks']
+            if totals.get('Approved_Conversion'):
+                rates['cost_per_approved_conversion'] = totals.get('Spent', 0.0) / totals['Approved_Conversion']
+            return {
+                'rows': len(df),
+                'totals': totals,
+                'rates': rates,
+                'metrics': DataProcessor(df).get_basic_metrics(),
+            }
+        return {'id': dataset_id, **self.store.get_or_compute(meta['key'], 'kpis', compute)}
+
+    def _time_comparison(self, dataset_id):
+        meta = self._meta(dataset_id)
+        df = self.frame(dataset_id)
+        # Segment indexes are built on demand; re-measure the entry as they are added
+        key = self.store.derived_key(meta['key'], 'time_comparison')
+        resize = lambda: self.store.resize(key)
+        comparison = self.store.get_or_load(key, lambda: TimeComparison.from_frame(df, on_resize=resize) or False,
+                                            kind='time_comparison')
+        if comparison is False:
+            raise ValueError("Dataset has no date column")
+        return comparison
+
+    def comparison(self, dataset_id, period='wow', segment=None, days=None, start=None, end=None):
+        """Period-over-period KPI deltas: 'wow', 'mom', the last `days` ('custom') or [start, end)"""
+        comparison = self._time_comparison(dataset_id)
+        if segment is not None and segment not in self.frame(dataset_id).columns:
+            raise ValueError(f"Unknown segment column: {segment}")
+        if start is not None and end is not None:
+            current = (pd.Timestamp(start), pd.Timestamp(end))
+            previous = (current[0] - (current[1] - current[0]), current[0])
+        else:
+            current, previous = comparison.period_windows(period, days=days)
+        deltas = comparison.compare(current, previous, segment=segment)
+        return {
+            'id': dataset_id,
+            'date_column': comparison.date_column,
+            'current': [current[0].isoformat(), current[1].isoformat()],
+            'previous': [previous[0].isoformat(), previous[1].isoformat()],
+            'segment': segment,
+            'deltas': deltas.astype(object).where(deltas.notna(), None).to_dict(orient='records'),
+        }
+
+    def comparison_summary(self, dataset_id):
+        """TimeComparison summary for the reports, or None for undated data"""
+        try:
+            comparison = self._time_comparison(dataset_id)
+        except ValueError:
+            return None
+        meta = self._meta(dataset_id)
+        return self.store.get_or_compute(meta['key'], 'comparison_summary', comparison.summary)
+
+    def _funnel(self, dataset_id):
+        meta = self._meta(dataset_id)
+        df = self.frame(dataset_id)
+        funnel = self.store.get_or_compute(meta['key'], 'funnel_analysis',
+                                           lambda: FunnelAnalysis.from_frame(df) or False)
+        if funnel is False:
+            raise ValueError("Dataset has no funnel columns (Impressions, Clicks, ...)")
+        return funnel
+
+    def funnel(self, dataset_id, segment=None):
+        """Funnel summary with significant winners and losers, or every segment of `segment` scored"""
+        funnel = self._funnel(dataset_id)
+        if segment is None:
+            return {'id': dataset_id, **self.funnel_summary(dataset_id)}
+        columns = segment.split(',')
+        missing = [col for col in columns if col not in self.frame(dataset_id).columns]
+        if missing:
+            raise ValueError(f"Unknown segment column: {', '.join(missing)}")
+        scores = funnel.score(columns)
+        return {
+            'id': dataset_id,
+            'segment': columns,
+            'scores': scores.astype(object).where(scores.notna(), None).to_dict(orient='records'),
+        }
+
+    def funnel_summary(self, dataset_id):
+        """FunnelAnalysis summary for the reports, or None without funnel columns"""
+        try:
+            funnel = self._funnel(dataset_id)
+        except ValueError:
+            return None
+        meta = self._meta(dataset_id)
+        return self.store.get_or_compute(meta['key'], 'funnel_summary', funnel.summary)
+
+    def _budget_simulator(self, dataset_id):
+        meta = self._meta(dataset_id)
+        df = self.frame(dataset_id)
+        simulator = self.store.get_or_compute(meta['key'], 'budget_simulator',
+                                              lambda: BudgetSimulator.from_frame(df) or False)
+        if simulator is False:
+            raise ValueError("Dataset needs spend, conversion and segment columns for budget simulation")
+        return simulator
+
+    def budget(self, dataset_id, budget=None, max_decrease=None, max_increase=None):
+        """Best reallocation of `budget` (default: today's spend) over the fitted response curves"""
+        options = {name: value for name, value in (('budget', budget), ('max_decrease', max_decrease),
+                                                   ('max_increase', max_increase)) if value is not None}
+        if not options:
+            return {'id': dataset_id, **self.budget_summary(dataset_id)}
+        return {'id': dataset_id, **self._budget_simulator(dataset_id).simulate(**options)}
+
+    def budget_summary(self, dataset_id):
+        """Reallocation at today's spend for the reports, or None when it cannot be simulated"""
+        try:
+            simulator = self._budget_simulator(dataset_id)
+        except ValueError:
+            return None
+        meta = self._meta(dataset_id)
+        return self.store.get_or_compute(meta['key'], 'budget_summary', simulator.simulate)
+
+    def charts_json(self, dataset_id):
+        """Summary and AdTech charts as one JSON object of Plotly figures, encoded once per dataset"""
+        meta = self._meta(dataset_id)
+        summary, adtech = self._chart_figures(dataset_id)
+
+        def compute():
+            figures = {**summary, **adtech}
+            body = ", ".join(f"{json.dumps(name)}: {fig.to_json()}" for name, fig in figures.items())
+            return ("{" + body + "}").encode('utf-8')
+        return self.store.get_or_compute(meta['key'], 'charts_json', compute)
+
+    def _chart_figures(self, dataset_id):
+        from module.visualization import DataVisualizer
+        meta = self._meta(dataset_id)
+        df = self.frame(dataset_id)
+        visualizer = DataVisualizer(df)
+        summary = self.store.get_or_compute(meta['key'], 'summary_charts', visualizer.create_summary_charts)
+        adtech = self.store.get_or_compute(meta['key'], 'adtech_charts', visualizer.create_adtech_specific_charts)
+        return summary, adtech
+
+    def cached_insights(self, dataset_id):
+        """AI summary already generated for a dataset, or None"""
+        return self.store.get(self.store.derived_key(self._meta(dataset_id)['key'], 'ai_summary'))
+
+    # Jobs
+
+    def submit_insights(self, owner, dataset_id):
+        """Queue AI analysis (shared with every other request for the same data)"""
+        meta = self._meta(dataset_id)
+        return self.jobs.submit(owner, "AI analysis", run_analysis, self.frame(dataset_id),
+                                ai=self.ai, store=self.store, dataset_key=meta['key'])
+
+    def submit_report(self, owner, dataset_id, fmt, insights=None, with_charts=False):
+        """Queue a PDF/PPTX render; insights default to the dataset's cached AI summary"""
+        if fmt not in ('pdf', 'pptx'):
+            raise ValueError(f"Unknown report format: {fmt}")
+        self._meta(dataset_id)
+        insights = insights or self.cached_insights(dataset_id)
+        if not insights:
+            raise InsightsNotReady("No insights for this dataset yet: request insights first or pass 'insights'")
+        return self.jobs.submit(owner, f"{fmt.upper()} report", self._render_report, dataset_id, fmt, insights,
+                                with_charts)
+
+    def _render_report(self, job, dataset_id, fmt, insights, with_charts):
+        """Report job: charts and summaries are computed (once per dataset) on the worker, then rendered"""
+        meta = self._meta(dataset_id)
+        df = self.frame(dataset_id)
+        job.update(0.02, "Preparing charts and summaries...")
+        charts = {}
+        if with_charts:
+            summary, adtech = self._chart_figures(dataset_id)
+            charts = {**summary, **adtech}
+        fingerprint = self.store.get_or_compute(meta['key'], 'fingerprint', lambda: dataset_fingerprint(df))
+        return render_report(job, fmt, df, insights, charts, data_fingerprint=fingerprint, cache=self.artifacts,
+                             comparison=self.comparison_summary(dataset_id),
+                             funnel=self.funnel_summary(dataset_id) if fmt == 'pptx' else None,
+                             budget=self.budget_summary(dataset_id) if fmt == 'pptx' else None)
+
+    def job(self, job_id):
+        return self.jobs.get(job_id)
+
+    def stats(self):
+        store = self.store.stats()
+        store.pop('by_kind', None)
+        with self._lock:
+            datasets = len(self._datasets)
+        return {'datasets': datasets, 'jobs': self.jobs.stats(), 'store': store, 'artifacts': self.artifacts.stats()}
+
+    def shutdown(self, wait=True):
+        self.jobs.shutdown(wait=wait)
+
+
+def job_payload(job, include_result=True):
+    """JSON-safe view of a job; report bytes are left out (download them separately)"""
+    payload = job.snapshot()
+    if include_result and job.status == 'done' and isinstance(job.result, dict):
+        result = {}
+        for key, value in job.result.items():
+            if key == 'bytes':
+                result['size_bytes'] = len(value)
+            elif isinstance(value, dict):
+                result[key] = sorted(value)  # chart names; fetch the figures from /charts
+            elif isinstance(value, (str, int, float, bool)) or value is None:
+                result[key] = value
+        payload['result'] = result
+    return payload
+
@@ -1,7 +1,9 @@
 import io
+import re
+from xml.sax.saxutils import escape
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, LongTable, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
@@ -11,8 +13,58 @@ import tempfile
 import os
 import base64
 from datetime import datetime
+from module.file_utils import unique_report_path, write_atomic
+from module.chart_export import chart_image_cache
+from module.tracing import traced
+from module.time_comparison import format_value, period_summary
+
+
+class _LazyStory:
+    """List-like Platypus story whose tail is produced on demand.
+    
+    `SimpleDocTemplate.build` only ever looks at the front of the story, so
+    appendix tables are created right before they are laid out and dropped
+    once drawn instead of all being held in memory up front.
+    """
+    
+    def __init__(self, head, tail, tail_count):
+        self._items = list(head)
+        self._tail = iter(tail)
+        self._pending = tail_count
+    
+    def _fill(self, n):
+        while len(self._items) < n and self._pending:
+            self._items.append(next(self._tail))
+            self._pending -= 1
+    
+    def _bound(self, key):
+        if isinstance(key, slice):
+            return len(self) if key.stop is None else key.stop
+        return key + 1
+    
+    def __len__(self):
+        return len(self._items) + self._pending
+    
+    def __getitem__(self, key):
+        self._fill(self._bound(key))
+        return self._items[key]
+    
+    def __setitem__(self, key, value):
+        self._fill(self._bound(key))
+        self._items[key] = value
+    
+    def __delitem__(self, key):
+        self._fill(self._bound(key))
+        del self._items[key]
+    
+    def insert(self, index, value):
+        self._items.insert(index, value)
+
 
 class PDFReportGenerator:
+    # Bump whenever the report layout changes so cached artifacts are not reused
+    TEMPLATE_VERSION = "pdf-2"
+    
     def __init__(self):
         self.styles = getSampleStyleSheet()
         self.custom_style = ParagraphStyle(
@@ -43,12 +95,66 @@ class PDFReportGenerator:
             textColor=colors.HexColor('#6B7280'),
             spaceAfter=8
         )
+        self.bullet_style = ParagraphStyle(
+            'Bullet',
+            parent=self.custom_style,
+            leftIndent=18,
+            bulletIndent=6
+        )
+        self.kpi_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1E3A8A')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F3F4F6')]),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#D1D5DB')),
+            ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+        ])
+        self.appendix_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#374151')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 6),
+            ('LEADING', (0, 0), (-1, -1), 7),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]),
+            ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.HexColor('#374151')),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+        ])
+        self.appendix_chunk_rows = 500
+        self.appendix_row_height = 9
     
-    def generate_report(self, df, ai_insights, charts, filename="adtech_report.pdf"):
-        """Generate comprehensive PDF report"""
+    @property
+    def template_version(self):
+        return self.TEMPLATE_VERSION
+    
+    def _finish(self, buffer, output):
+        """Return the rendered PDF bytes, or the caller's stream it was written into"""
+        if output is None:
+            return buffer.getvalue()
+        return output
+
+    def _save(self, pdf_bytes, filename, directory, prefix):
+        """Atomically write rendered bytes to `filename` (or a unique path)"""
+        if filename is None:
+            filename = unique_report_path(prefix, '.pdf', directory)
+        return write_atomic(pdf_bytes, filename)
+
+    @traced('report.pdf')
+    def render_report(self, df, ai_insights, charts, output=None, metrics=None,
+                      include_appendix=False, appendix_max_rows=None, comparison=None):
+        """Render the comprehensive PDF report in memory.
+        
+        The report holds a cover page, headline KPIs, the AI insights, a
+        per-column KPI table, the embedded charts and, optionally, a data
+        appendix. `metrics` takes the output of `DataProcessor.get_basic_metrics`
+        so the frame is not rescanned, `comparison` a precomputed
+        `TimeComparison.summary()` (computed here for dated data when omitted).
+        Returns the PDF bytes, or writes them into `output` and returns it.
+        """
         
-        # Create buffer for PDF
-        buffer = io.BytesIO()
+        # Render straight into the caller's stream when one is given
+        buffer = output if output is not None else io.BytesIO()
         
         # Create document
         doc = SimpleDocTemplate(
@@ -57,7 +163,8 @@ class PDFReportGenerator:
             rightMargin=72,
             leftMargin=72,
             topMargin=72,
-            bottomMargin=72
+            bottomMargin=72,
+            title="AdTech Performance Report"
         )
         
         # Story will hold all elements
@@ -74,24 +181,220 @@ class PDFReportGenerator:
                               ParagraphStyle('Confidential', parent=self.styles['Normal'], 
                                             alignment=TA_CENTER, fontSize=10, 
                                             textColor=colors.gray)))
+        story.append(PageBreak())
         
-        story.append(Spacer(1, 2*inch))
-        doc.build(story)
+        # 2. Dataset overview and headline KPIs
+        story.append(Paragraph("Performance Overview", self.header_style))
+        story.append(self._styled_table(self._overview_rows(df), col_widths=[doc.width * 0.5] * 2))
+        headline = self._headline_kpi_rows(df)
+        if len(headline) > 1:
+            story.append(Spacer(1, 0.2*inch))
+            story.append(Paragraph("Headline KPIs", self.subheader_style))
+            story.append(self._styled_table(headline, col_widths=[doc.width * 0.5] * 2))
+        
+        # Period-over-period deltas for dated data
+        if comparison is None:
+            comparison = period_summary(df)
+        story.extend(self._comparison_flowables(comparison, doc.width))
+        
+        # 3. AI insights, wrapped by Platypus instead of cut at a fixed width
+        story.append(Spacer(1, 0.3*inch))
+        story.append(Paragraph("AI-Generated Insights", self.header_style))
+        story.extend(self._insight_flowables(ai_insights))
         
-        # Save to file
-        buffer.seek(0)
+        # 4. Per-column KPI table
+        kpi_rows = self._metric_rows(df, metrics)
+        if len(kpi_rows) > 1:
+            story.append(PageBreak())
+            story.append(Paragraph("Key Metrics", self.header_style))
+            story.append(self._styled_table(kpi_rows, col_widths=[doc.width * 0.25] + [doc.width * 0.15] * 5))
         
-        # For now, save a basic PDF
-        with open(filename, 'wb') as f:
-            f.write(buffer.getvalue())
+        # 5. Charts
+        images = chart_image_cache.render_all(charts)
+        if images:
+            story.append(PageBreak())
+            story.append(Paragraph("Charts", self.header_style))
+            for name, png in images.items():
+                story.append(Paragraph(name.replace('_', ' ').title(), self.subheader_style))
+                story.append(Image(io.BytesIO(png), width=doc.width, height=doc.width * 5 / 9))
+                story.append(Spacer(1, 0.2*inch))
         
-        return filename
+        # 6. Optional data appendix, laid out chunk by chunk
+        appendix_chunks = 0
+        if include_appendix and len(df.columns) > 0:
+            appendix_df = df if appendix_max_rows is None else df.head(appendix_max_rows)
+            story.append(PageBreak())
+            story.append(Paragraph("Appendix: Data", self.header_style))
+            story.append(Paragraph(f"Showing {len(appendix_df):,} of {len(df):,} rows", self.custom_style))
+            appendix_chunks = -(-len(appendix_df) // self.appendix_chunk_rows)
+            story = _LazyStory(story, self._appendix_tables(appendix_df, doc.width), appendix_chunks)
+        
+        doc.build(story, onLaterPages=self._draw_footer)
+        
+        return self._finish(buffer, output)
+    
+    def _draw_footer(self, canvas, doc):
+        """Footer with page number on every page after the cover"""
+        canvas.saveState()
+        canvas.setFont("Helvetica-Oblique", 8)
+        canvas.drawString(doc.leftMargin, 40, "Generated by TrendSpotter - Automated AdTech Insights Engine")
+        canvas.drawRightString(doc.leftMargin + doc.width, 40, f"Page {doc.page}")
+        canvas.restoreState()
+    
+    def _styled_table(self, rows, col_widths=None):
+        """Small KPI table with a header row"""
+        table = Table(rows, colWidths=col_widths, repeatRows=1, hAlign='LEFT')
+        table.setStyle(self.kpi_table_style)
+        return table
+    
+    def _overview_rows(self, df):
+        numeric_cols = df.select_dtypes(include=['number']).columns
+        cat_cols = df.select_dtypes(include=['object']).columns
+        return [
+            ["Dataset", "Value"],
+            ["Rows", f"{len(df):,}"],
+            ["Columns", f"{len(df.columns)}"],
+            ["Numeric columns", f"{len(numeric_cols)}"],
+            ["Categorical columns", f"{len(cat_cols)}"],
+            ["Missing values", f"{int(df.isnull().sum().sum()):,}"],
+        ]
+    
+    def _find_column(self, df, *keywords):
+        """First numeric column whose name contains one of the keywords"""
+        for keyword in keywords:
+            for col in df.select_dtypes(include=['number']).columns:
+                if keyword in str(col).lower():
+                    return col
+        return None
+    
+    def _headline_kpi_rows(self, df):
+        """Campaign totals and ratios for the usual AdTech columns, when present"""
+        impressions = self._find_column(df, 'impression')
+        clicks = self._find_column(df, 'click')
+        spend = self._find_column(df, 'spent', 'spend', 'cost')
+        conversions = self._find_column(df, 'total_conv', 'conv')
+        approved = self._find_column(df, 'approved')
+        
+        totals = df[[c for c in {impressions, clicks, spend, conversions, approved} if c]].sum()
+        rows = [["KPI", "Value"]]
+        for label, col in [("Impressions", impressions), ("Clicks", clicks), ("Spend", spend),
+                           ("Conversions", conversions), ("Approved Conversions", approved)]:
+            if col:
+                rows.append([label, f"{totals[col]:,.2f}" if col == spend else f"{totals[col]:,.0f}"])
+        
+        def ratio(num, den, fmt):
+            if num and den and totals[den]:
+                return fmt.format(totals[num] / totals[den])
+            return None
+        
+        for label, value in [("CTR", ratio(clicks, impressions, "{:.3%}")),
+                             ("CPC", ratio(spend, clicks, "{:,.2f}")),
+                             ("Conversion Rate", ratio(conversions, clicks, "{:.2%}")),
+                             ("Cost per Approved Conversion", ratio(spend, approved, "{:,.2f}"))]:
+            if value is not None:
+                rows.append([label, value])
+        return rows
+    
+    def _comparison_flowables(self, comparison, width):
+        """Week-over-week / month-over-month KPI tables and top moving segments"""
+        flowables = []
+        for period, data in (comparison or {}).get('periods', {}).items():
+            if not flowables:
+                flowables.append(Spacer(1, 0.3*inch))
+                flowables.append(Paragraph("Period-over-Period", self.header_style))
+            flowables.append(Paragraph(
+                f"{period.replace('_', ' ').title()}: {data['current'][0][:10]} to {data['current'][1][:10]} "
+                f"vs {data['previous'][0][:10]} to {data['previous'][1][:10]}", self.subheader_style))
+            rows = [['KPI', 'Current', 'Previous', 'Change']]
+            for row in data['kpis']:
+                change = f"{row['pct_change']:+.1f}%" if row['pct_change'] is not None else format_value(row['change'])
+                rows.append([row['kpi'], format_value(row['current']), format_value(row['previous']), change])
+            flowables.append(self._styled_table(rows, col_widths=[width * 0.4] + [width * 0.2] * 3))
+            for col, movers in data['top_movers'].items():
+                for label, items in (('Gaining', movers['gainers']), ('Declining', movers['decliners'])):
+                    if items:
+                        names = ", ".join(escape(f"{m[col]} ({m['change']:+,.0f})") for m in items)
+                        flowables.append(Paragraph(
+                            f"<b>{label} {escape(str(comparison['primary_kpi']))} by {escape(str(col))}:</b> {names}",
+                            self.bullet_style, bulletText='•'))
+            flowables.append(Spacer(1, 0.2*inch))
+        return flowables
+    
+    def _metric_rows(self, df, metrics=None):
+        """Per-column summary statistics, reusing precomputed metrics when given"""
+        if metrics is None:
+            numeric = df.select_dtypes(include=['number'])
+            if numeric.columns.empty:
+                return [[]]
+            metrics = numeric.agg(['mean', 'median', 'std', 'min', 'max']).to_dict()
+        rows = [["Column", "Mean", "Median", "Std Dev", "Min", "Max"]]
+        for col, m in metrics.items():
+            rows.append([str(col)[:24]] + [f"{m[k]:,.2f}" for k in ('mean', 'median', 'std', 'min', 'max')])
+        return rows
+    
+    def _inline_markup(self, text):
+        """Escape text for Paragraph and map **bold** / *italic* markdown"""
+        text = escape(text)
+        text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', text)
+        text = re.sub(r'(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?![*\w])', r'<i>\1</i>', text)
+        return text
+    
+    def _insight_flowables(self, ai_insights):
+        """Turn the markdown-ish AI text into wrapped paragraphs, headings and bullets"""
+        flowables = []
+        for raw_line in (ai_insights or "").split('\n'):
+            line = raw_line.strip()
+            if not line or set(line) <= set('-*_'):
+                continue
+            heading = re.match(r'^#{1,6}\s*(.+)$', line)
+            bullet = re.match(r'^(?:[-*\u2022]|(\d+)[.)])\s+(.+)$', line)
+            if heading:
+                flowables.append(Paragraph(self._inline_markup(heading.group(1)), self.subheader_style))
+            elif bullet:
+                marker = f"{bullet.group(1)}." if bullet.group(1) else '\u2022'
+                flowables.append(Paragraph(self._inline_markup(bullet.group(2)), self.bullet_style,
+                                           bulletText=marker))
+            else:
+                flowables.append(Paragraph(self._inline_markup(line), self.custom_style))
+        return flowables
     
-    def generate_simple_report(self, df, ai_insights, filename="adtech_simple_report.pdf"):
-        """Generate a simple PDF with AI insights"""
+    def _appendix_tables(self, df, available_width):
+        """Yield one LongTable per chunk of rows so memory stays bounded"""
+        col_width = available_width / len(df.columns)
+        max_chars = max(4, int(col_width / 3.4))
+        header = [str(col)[:max_chars] for col in df.columns]
+        style = self.appendix_table_style
+        
+        for start in range(0, len(df), self.appendix_chunk_rows):
+            chunk = df.iloc[start:start + self.appendix_chunk_rows]
+            cells = {}
+            for col in chunk.columns:
+                values = chunk[col]
+                if pd.api.types.is_float_dtype(values):
+                    values = values.map('{:.4g}'.format)
+                cells[col] = values.astype(str).str.slice(0, max_chars)
+            rows = [header] + pd.DataFrame(cells).values.tolist()
+            # Fixed widths and heights let Platypus skip measuring every cell
+            yield LongTable(rows, colWidths=[col_width] * len(header),
+                            rowHeights=[self.appendix_row_height] * len(rows),
+                            repeatRows=1, style=style)
+    
+    def generate_report(self, df, ai_insights, charts, filename=None, directory=None, **options):
+        """Generate comprehensive PDF report and save it to disk"""
+        pdf_bytes = self.render_report(df, ai_insights, charts, **options)
+        return self._save(pdf_bytes, filename, directory, 'adtech_report')
+    
+    @traced('report.pdf_simple')
+    def render_simple_report(self, df, ai_insights, output=None):
+        """Render a simple PDF with AI insights in memory.
+        
+        Returns the PDF bytes, or writes them into `output` (any object with a
+        `write` method) and returns it. No state is shared between calls, so
+        this is safe to run concurrently from many sessions.
+        """
         from reportlab.pdfgen import canvas
         
-        buffer = io.BytesIO()
+        buffer = output if output is not None else io.BytesIO()
         c = canvas.Canvas(buffer, pagesize=letter)
         width, height = letter
         
@@ -155,10 +458,14 @@ class PDFReportGenerator:
         c.drawString(100, 40, f"Page {c.getPageNumber()}")
         
         c.save()
-        buffer.seek(0)
         
-        # Save to file
-        with open(filename, 'wb') as f:
-            f.write(buffer.getvalue())
+        return self._finish(buffer, output)
+    
+    def generate_simple_report(self, df, ai_insights, filename=None, directory=None):
+        """Generate a simple PDF with AI insights and save it to disk.
         
-        return filename
\ No newline at end of file
+        Without `filename` a unique path is used so concurrent users never
+        overwrite each other's report. Returns the written path.
+        """
+        pdf_bytes = self.render_simple_report(df, ai_insights)
+        return self._save(pdf_bytes, filename, directory, 'adtech_simple_report')
\ No newline at end of file
@@ -5,10 +5,62 @@ from pptx.dml.color import RGBColor
 import pandas as pd
 from datetime import datetime
 import io
+import os
+import threading
+from module.file_utils import unique_report_path, write_atomic
+from module.chart_export import chart_image_cache
+from module.tracing import traced
+from module.budget import budget_lines
+from module.funnel import recommendation_lines
+from module.time_comparison import period_summary, summary_lines
+
+# Serialized template decks: path -> (mtime, bytes), one entry per path; None is the built-in default
+_template_cache = {}
+_template_lock = threading.Lock()
+
+
+def _template_bytes(template_path=None):
+    """Return the serialized template deck, reading the template file only once"""
+    mtime = os.path.getmtime(template_path) if template_path else None
+    with _template_lock:
+        cached = _template_cache.get(template_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    
+    buffer = io.BytesIO()
+    Presentation(template_path).save(buffer)
+    data = buffer.getvalue()
+    with _template_lock:
+        # An edited template replaces its previous version instead of accumulating
+        _template_cache[template_path] = (mtime, data)
+    return data
+
 
 class PowerPointReportGenerator:
-    def __init__(self):
+    # Bump whenever the slide layout changes so cached artifacts are not reused
+    TEMPLATE_VERSION = "pptx-3"
+    
+    def __init__(self, template_path=None):
         self.prs = None
+        self.template_path = template_path
+    
+    @property
+    def template_version(self):
+        """Layout version plus the identity of the branded template, if any"""
+        if not self.template_path:
+            return self.TEMPLATE_VERSION
+        return f"{self.TEMPLATE_VERSION}:{os.path.abspath(self.template_path)}:{os.path.getmtime(self.template_path)}"
+    
+    def _new_presentation(self):
+        """Parse a fresh, independent deck from the cached template bytes"""
+        return Presentation(io.BytesIO(_template_bytes(self.template_path)))
+    
+    def _summary_metrics(self, df):
+        """mean/min/max/std for numeric columns in a single aggregation pass"""
+        numeric = df.select_dtypes(include=['number'])
+        if numeric.columns.empty:
+            return {}
+        return numeric.agg(['mean', 'min', 'max', 'std']).to_dict()
         
     def _truncate_text_for_pptx(self, text, max_lines=10, max_chars_per_line=80):
     # """Truncate text to fit PowerPoint slides without overflow"""
@@ -66,11 +118,28 @@ class PowerPointReportGenerator:
             else:
                 p.font.size = Pt(12)
                 
-    def generate_simple_presentation(self, df, ai_insights, filename="adtech_presentation.pptx"):
-        """Generate a simple PowerPoint presentation"""
+    @traced('report.pptx')
+    def render_presentation(self, df, ai_insights, metrics=None, chart_images=None, charts=None, output=None,
+                            comparison=None, funnel=None, budget=None):
+        """Render the presentation in memory.
+        
+        `metrics` takes the output of `DataProcessor.get_basic_metrics` so the
+        frame is not rescanned; `chart_images` maps names to PNG bytes and
+        `charts` to Plotly figures, rendered through the shared image cache.
+        `comparison` takes a precomputed `TimeComparison.summary()` (computed
+        here for dated data when omitted), `funnel` a precomputed
+        `FunnelAnalysis.summary()` and `budget` a precomputed
+        `BudgetSimulator.simulate()` for the recommendations; either section
+        is left out when not passed. Returns the .pptx bytes, or writes them
+        into `output` and returns it.
+        """
         
-        # Create presentation
-        prs = Presentation()
+        # Clone the cached template
+        prs = self._new_presentation()
+        if metrics is None:
+            metrics = self._summary_metrics(df)
+        images = dict(chart_images or {})
+        images.update(chart_image_cache.render_all(charts))
         
         # Slide 1: Title Slide
         slide_layout = prs.slide_layouts[0]
@@ -136,15 +205,24 @@ class PowerPointReportGenerator:
         title.text = "Key Metrics"
         
         metrics_text = "Summary Statistics:\n\n"
-        if len(numeric_cols) > 0:
-            for col in numeric_cols[:6]:  # First 6 numeric columns
-                metrics_text += f"• {col}:\n"
-                metrics_text += f"  Mean: {df[col].mean():.2f}\n"
-                metrics_text += f"  Min: {df[col].min():.2f} | Max: {df[col].max():.2f}\n"
-                metrics_text += f"  Std Dev: {df[col].std():.2f}\n\n"
+        for col, m in list(metrics.items())[:6]:  # First 6 numeric columns
+            metrics_text += f"• {col}:\n"
+            metrics_text += f"  Mean: {m['mean']:.2f}\n"
+            metrics_text += f"  Min: {m['min']:.2f} | Max: {m['max']:.2f}\n"
+            metrics_text += f"  Std Dev: {m['std']:.2f}\n\n"
         
         content.text = self._truncate_text_for_pptx(metrics_text, max_lines=15)
         
+        # Period-over-Period slide for dated data
+        if comparison is None:
+            comparison = period_summary(df)
+        if comparison and comparison['periods']:
+            slide = prs.slides.add_slide(prs.slide_layouts[1])
+            slide.shapes.title.text = "Period-over-Period"
+            # Headline sums only (first 5 KPIs), then the top moving segments
+            lines = summary_lines(comparison, max_kpis=5)
+            slide.placeholders[1].text = self._truncate_text_for_pptx("\n".join(lines), max_lines=15, max_chars_per_line=90)
+        
         # Slide 5: Recommendations
         slide_layout = prs.slide_layouts[1]
         slide = prs.slides.add_slide(slide_layout)
@@ -153,31 +231,43 @@ class PowerPointReportGenerator:
         
         title.text = "Actionable Recommendations"
         
-        # Extract recommendations from AI insights
-        rec_text = "Based on AI Analysis:\n\n"
+        # Statistically significant funnel winners and losers and the simulated budget
+        # reallocation first, then the AI's own recommendations
+        rec_lines = recommendation_lines(funnel, max_lines=3)
+        if rec_lines:
+            rec_text = f"Funnel analysis ({funnel['n_boot']:,} bootstrap resamples, FDR {funnel['alpha']:.0%}):\n\n"
+        elif funnel:
+            rec_text = (f"No segment differs significantly from the rest on {funnel['primary']} "
+                        f"({funnel['tests']:,} segments tested).\n\n")
+        else:
+            rec_text = ""
+        rec_lines += budget_lines(budget)
         
         # Look for recommendations in AI text
         lines = ai_insights.split('\n')
-        rec_lines = [line for line in lines if 'recommend' in line.lower() or 'suggest' in line.lower()]
+        ai_lines = [line.strip().lstrip('-*• ') for line in lines
+                    if 'recommend' in line.lower() or 'suggest' in line.lower()]
+        rec_lines += ai_lines[:max(5 - len(rec_lines), 1)]
         
         if rec_lines:
             for i, line in enumerate(rec_lines[:5], 1):  # First 5 recommendations
-                rec_text += f"{i}. {line.strip()}\n\n"
+                rec_text += f"{i}. {line}\n"
         else:
-            rec_text += "1. Optimize campaign targeting based on performance metrics\n"
-            rec_text += "2. Consider A/B testing for underperforming ad creatives\n"
-            rec_text += "3. Reallocate budget to high-conversion channels\n"
-            rec_text += "4. Implement real-time monitoring for anomaly detection\n"
-            rec_text += "5. Schedule regular performance reviews\n"
+            rec_text += "No recommendations were found in the AI analysis."
+        
+        self._add_text_to_shape(content, rec_text)
         
-        content.text = self._truncate_text_for_pptx(rec_text, max_lines=8)
+        # Chart slides from cached images
+        for name, png in images.items():
+            slide = prs.slides.add_slide(prs.slide_layouts[5])  # Title only
+            slide.shapes.title.text = name.replace('_', ' ').title()
+            slide.shapes.add_picture(io.BytesIO(png), Inches(0.75), Inches(1.6), width=Inches(8.5))
         
         # Slide 6: Thank You
         slide_layout = prs.slide_layouts[5]  # Blank layout
         slide = prs.slides.add_slide(slide_layout)
         
         # Add text box
-        from pptx.util import Inches
         left = Inches(2)
         top = Inches(3)
         width = Inches(6)
@@ -197,7 +287,20 @@ class PowerPointReportGenerator:
         p.font.size = Pt(18)
         p.alignment = PP_ALIGN.CENTER
         
-        # Save presentation
-        prs.save(filename)
-        
-        return filename
\ No newline at end of file
+        # Save presentation in memory (or into the caller's stream)
+        if output is not None:
+            prs.save(output)
+            return output
+        buffer = io.BytesIO()
+        prs.save(buffer)
+        return buffer.getvalue()
+    
+    def generate_simple_presentation(self, df, ai_insights, filename=None, directory=None, **options):
+        """Generate a simple PowerPoint presentation and save it to disk.
+        
+        Without `filename` a unique path is used. Returns the written path.
+        """
+        pptx_bytes = self.render_presentation(df, ai_insights, **options)
+        if filename is None:
+            filename = unique_report_path('adtech_presentation', '.pptx', directory)
+        return write_atomic(pptx_bytes, filename)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from module.file_utils import write_atomic
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+KAG_CSV = os.path.join(SAMPLE_DIR, 'KAG_conversion_data.csv')
+FEATHER_EXTENSIONS = ('.feather', '.arrow')
+
+# name -> (label, synthetic rows or None for the original KAG data)
+SAMPLES = {
+    'kag': ("KAG ad campaigns (1,143 rows)", None),
+    'kag_100k': ("Synthetic KAG, 100k rows with dates", 100_000),
+    'kag_1m': ("Synthetic KAG, 1M rows with dates", 1_000_000),
+}
+SYNTHETIC_START = '2017-06-01'
+SYNTHETIC_DAYS = 90
+DATA_INFO_KEY = b'trendspotter.data_info'
+
+
+def write_feather(df, path, data_info=None, compression='uncompressed'):
+    """Write `df` as Arrow IPC (Feather v2); uncompressed files can be memory-mapped back.
+
+    `data_info` (DataIngestor.build_data_info of `df`) is stored in the
+    schema metadata so loading does not have to rescan every column.
+    """
+    table = pa.Table.from_pandas(df)
+    if data_info is not None:
+        info = {
+            **data_info,
+            'shape': list(data_info['shape']),
+            'missing_values': {col: int(n) for col, n in data_info['missing_values'].items()},
+            'memory_usage': float(data_info['memory_usage']),
+        }
+        table = table.replace_schema_metadata({**table.schema.metadata, DATA_INFO_KEY: json.dumps(info)})
+    sink = pa.BufferOutputStream()
+    feather.write_feather(table, sink, compression=compression)
+    return write_atomic(sink.getvalue().to_pybytes(), path)
+
+
+def read_feather(path):
+    """Memory-map a Feather file; returns (DataFrame, stored data_info or None).
+
+    Numeric columns without nulls stay views of the mapped file (pandas
+    copy-on-write copies them only if they are modified); only strings are
+    materialized as Python objects.
+    """
+    table = feather.read_table(path, memory_map=True)
+    data = table.to_pandas(split_blocks=True)
+    if not isinstance(data.index, pd.RangeIndex):
+        # A restored object index comes back read-only, which breaks memory_usage(deep=True)
+        data.index = data.index.copy(deep=True)
+    stored = (table.schema.metadata or {}).get(DATA_INFO_KEY)
+    if stored is None:
+        return data, None
+    info = json.loads(stored)
+    if tuple(info['shape']) != data.shape or info['columns'] != list(data.columns):
+        return data, None
+    info['shape'] = tuple(info['shape'])
+    return data, info
+
+
+def _write_sample(df, path):
+    from module.data_ingestion import DataIngestor
+    write_feather(df, path, data_info=DataIngestor.build_data_info(df))
+
+
+def sample_path(name, cache_dir=None):
+    """Feather file of a sample, built on first use.
+
+    The KAG sample ships next to its CSV. Synthetic variants are generated
+    deterministically (seed 0) into `cache_dir` rather than checked in.
+    """
+    if name not in SAMPLES:
+        raise ValueError(f"Unknown sample: {name}")
+    _, rows = SAMPLES[name]
+    if rows is None:
+        path = os.path.join(SAMPLE_DIR, 'KAG_conversion_data.feather')
+        if not os.path.exists(path):
+            _write_sample(pd.read_csv(KAG_CSV), path)
+        return path
+
+    cache_dir = cache_dir or os.getenv("TRENDSPOTTER_CACHE_DIR", ".cache")
+    path = os.path.join(cache_dir, 'samples', f"{name}.feather")
+    if not os.path.exists(path):
+        from module.synthetic import generate_kag_like
+        _write_sample(generate_kag_like(rows, seed=0, start_date=SYNTHETIC_START, days=SYNTHETIC_DAYS), path)
+    return path
+
+
+def sample_key(name, cache_dir=None):
+    """Dataset-store key of a sample; changes when its file is rebuilt"""
+    stat = os.stat(sample_path(name, cache_dir))
+    return f"sample:{name}:{stat.st_size}:{stat.st_mtime_ns}"
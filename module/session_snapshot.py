@@ -0,0 +1,292 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from module.dataset import DatasetHandle, _column_buffer
+from module.file_utils import write_atomic
+from module.sample_data import read_feather, write_feather
+from module.tracing import traced
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.getenv("TRENDSPOTTER_CACHE_DIR", ".cache"), "sessions")
+DEFAULT_MAX_BYTES = 1024**3  # 1 GB
+SNAPSHOT_FORMAT = 1
+MANIFEST = 'manifest.json.gz'
+COMPRESSION = 'lz4'  # decompresses several times faster than zstd, for sub-second restores
+ARRAY_MIN_SIZE = 64  # smaller figure arrays stay inline in the JSON spec
+_SESSION_ID = re.compile(r'^[0-9a-f]{16,64}$')
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return str(value)
+    raise TypeError(f"Cannot snapshot {type(value).__name__}")
+
+
+def _is_figures(value):
+    return isinstance(value, dict) and bool(value) and all(hasattr(fig, 'to_plotly_json') for fig in value.values())
+
+
+def _shared_columns(version):
+    """Columns of a version that are the very same buffers as in its parent (copy-on-write)"""
+    parent = version.parent
+    if parent is None or not version.df.index.equals(parent.df.index):
+        return []
+    shared = []
+    for col in version.df.columns:
+        if col not in parent.df.columns:
+            continue
+        mine, theirs = _column_buffer(version.df, col), _column_buffer(parent.df, col)
+        if (mine is not None and theirs is not None and mine.dtype == theirs.dtype and mine.shape == theirs.shape
+                and mine.__array_interface__ == theirs.__array_interface__):
+            shared.append(col)
+    return shared
+
+
+def _extract_arrays(value, arrays):
+    """Move large numeric arrays out of a Plotly JSON tree, leaving {'__array__': i} references"""
+    if isinstance(value, dict):
+        return {k: _extract_arrays(v, arrays) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_extract_arrays(v, arrays) for v in value]
+    if (isinstance(value, np.ndarray) and value.ndim == 1 and value.size >= ARRAY_MIN_SIZE
+            and value.dtype.kind in 'biuf'):
+        arrays.append(value)
+        return {'__array__': len(arrays) - 1}
+    return value
+
+
+def _insert_arrays(value, arrays):
+    if isinstance(value, dict):
+        if '__array__' in value and len(value) == 1:
+            return arrays[value['__array__']]
+        return {k: _insert_arrays(v, arrays) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_insert_arrays(v, arrays) for v in value]
+    return value
+
+
+def _write_arrays(arrays, path):
+    """Variable-length arrays as one-row list columns of a compressed Arrow file"""
+    columns = [pa.LargeListArray.from_arrays(pa.array([0, len(a)], pa.int64()), pa.array(a)) for a in arrays]
+    table = pa.Table.from_arrays(columns, names=[f"a{i}" for i in range(len(arrays))])
+    sink = pa.BufferOutputStream()
+    feather.write_feather(table, sink, compression=COMPRESSION)
+    write_atomic(sink.getvalue().to_pybytes(), path)
+
+
+def _read_arrays(path):
+    table = feather.read_table(path, memory_map=True)
+    return [column.chunk(0).values.to_numpy(zero_copy_only=False) for column in table.columns]
+
+
+class SessionSnapshotStore:
+    """One session's dataset and derived results on disk, restorable without recomputing anything.
+
+    A snapshot is a directory per session holding each dataset version as a
+    compressed Feather file (written once - versions are immutable - and
+    only with the columns it does not share with its parent), the numeric
+    arrays of its Plotly charts in the same columnar form, and a gzipped
+    JSON manifest with the version lineage, per-column memory, profiles,
+    metrics, insights text and chart specs. Whole snapshots are evicted
+    least-recently-used once over `max_bytes`.
+    """
+
+    def __init__(self, directory=DEFAULT_SNAPSHOT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, session_id):
+        # Session ids come from the URL; only accept the hex ids the app generates
+        if not _SESSION_ID.match(session_id or ''):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        return os.path.join(self.directory, session_id)
+
+    def exists(self, session_id):
+        try:
+            return os.path.exists(os.path.join(self.path(session_id), MANIFEST))
+        except ValueError:
+            return False
+
+    @traced('snapshot.save')
+    def save(self, session_id, dataset_key, handle, results=None, name=None):
+        """Write (or update) the snapshot of a session.
+
+        `results` maps derived-result names to JSON-serializable values,
+        DataFrames or dicts of Plotly figures. Returns the snapshot size in bytes.
+        """
+        directory = self.path(session_id)
+        os.makedirs(directory, exist_ok=True)
+        referenced = set()
+
+        # 1. Dataset versions, named by dataset and version so unchanged ones are never rewritten
+        versions = []
+        for version in handle.versions.values():
+            shared = _shared_columns(version)
+            own = [col for col in version.df.columns if col not in shared]
+            filename = None
+            if own:
+                raw = f"{dataset_key}|{version.id}|{version.operation}"
+                filename = f"version_{hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest()}.arrow"
+                referenced.add(filename)
+                if not os.path.exists(os.path.join(directory, filename)):
+                    write_feather(version.df[own], os.path.join(directory, filename), compression=COMPRESSION)
+            versions.append({
+                'id': version.id,
+                'operation': version.operation,
+                'parent': version.parent.id if version.parent is not None else None,
+                'columns': [str(col) for col in version.df.columns],
+                'shared': [str(col) for col in shared],
+                'file': filename,
+                'column_bytes': {str(col): int(n) for col, n in version.column_bytes().items()},
+            })
+
+        # 2. Derived results: frames and chart arrays as Feather, everything else in the manifest
+        encoded = {}
+        for result_name, value in (results or {}).items():
+            if isinstance(value, pd.DataFrame):
+                filename = f"result_{result_name}.arrow"
+                write_feather(value, os.path.join(directory, filename), compression=COMPRESSION)
+                encoded[result_name] = {'type': 'frame', 'file': filename}
+            elif _is_figures(value):
+                from plotly.io.json import to_json_plotly
+                arrays = []
+                specs = {k: to_json_plotly(_extract_arrays(fig.to_plotly_json(), arrays)) for k, fig in value.items()}
+                filename = None
+                if arrays:
+                    filename = f"figures_{result_name}.arrow"
+                    _write_arrays(arrays, os.path.join(directory, filename))
+                encoded[result_name] = {'type': 'figures', 'value': specs, 'file': filename}
+            else:
+                encoded[result_name] = {'type': 'json', 'value': value}
+            if encoded[result_name].get('file'):
+                referenced.add(encoded[result_name]['file'])
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'session_id': session_id,
+            'dataset_key': dataset_key,
+            'name': name,
+            'saved_at': time.time(),
+            'versions': versions,
+            'current': handle.current.id,
+            'results': encoded,
+        }
+        payload = json.dumps(manifest, default=_json_default).encode('utf-8')
+        write_atomic(gzip.compress(payload, compresslevel=6), os.path.join(directory, MANIFEST))
+
+        # 3. Drop files of earlier datasets or results no longer in the manifest
+        size = 0
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith('.arrow') and entry.name not in referenced:
+                    os.remove(entry.path)
+                elif entry.is_file():
+                    size += entry.stat().st_size
+        self._evict(protect=session_id)
+        return size
+
+    @traced('snapshot.load')
+    def load(self, session_id):
+        """Restored snapshot as a dict (dataset_key, name, saved_at, handle, results), or None"""
+        if not self.exists(session_id):
+            return None
+        directory = self.path(session_id)
+        try:
+            with open(os.path.join(directory, MANIFEST), 'rb') as f:
+                manifest = json.loads(gzip.decompress(f.read()))
+            if manifest.get('format') != SNAPSHOT_FORMAT:
+                return None
+            frames = {}
+            versions = []
+            for entry in manifest['versions']:
+                own = read_feather(os.path.join(directory, entry['file']))[0] if entry['file'] else None
+                parent = frames.get(entry['parent'])
+                shared = set(entry['shared'])
+                if not shared:
+                    df = own
+                else:
+                    # Shared columns reference the parent's buffers again, as before the restart
+                    df = parent[[col for col in entry['columns'] if col in shared]]
+                    if own is not None:
+                        df = pd.concat([df, own.set_axis(parent.index)], axis=1)
+                    df = df[entry['columns']]
+                frames[entry['id']] = df
+                versions.append({'id': entry['id'], 'operation': entry['operation'], 'parent': entry['parent'],
+                                 'df': df, 'column_bytes': entry['column_bytes']})
+
+            results = {}
+            for result_name, entry in manifest['results'].items():
+                if entry['type'] == 'frame':
+                    results[result_name] = read_feather(os.path.join(directory, entry['file']))[0]
+                elif entry['type'] == 'figures':
+                    import plotly.graph_objects as go
+                    arrays = _read_arrays(os.path.join(directory, entry['file'])) if entry['file'] else []
+                    # Specs were produced by valid figures, so Plotly's per-property validation is skipped
+                    results[result_name] = {k: go.Figure(_insert_arrays(json.loads(spec), arrays), _validate=False)
+                                            for k, spec in entry['value'].items()}
+                else:
+                    results[result_name] = entry['value']
+        except (OSError, ValueError, KeyError):
+            # A snapshot from an interrupted save or an older layout is just ignored
+            return None
+        os.utime(os.path.join(directory, MANIFEST))  # mark as recently used
+        return {
+            'dataset_key': manifest['dataset_key'],
+            'name': manifest['name'],
+            'saved_at': manifest['saved_at'],
+            'handle': DatasetHandle.restore(versions, manifest['current']),
+            'results': results,
+        }
+
+    def delete(self, session_id):
+        shutil.rmtree(self.path(session_id), ignore_errors=True)
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_dir():
+                    continue
+                size = 0
+                with os.scandir(entry.path) as files:
+                    for file in files:
+                        if file.is_file():
+                            size += file.stat().st_size
+                manifest = os.path.join(entry.path, MANIFEST)
+                mtime = os.path.getmtime(manifest) if os.path.exists(manifest) else 0
+                entries.append((mtime, size, entry.name))
+        return entries
+
+    def _evict(self, protect=None):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, session_id in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if session_id == protect:
+                    continue
+                shutil.rmtree(os.path.join(self.directory, session_id), ignore_errors=True)
+                total -= size
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            'sessions': len(entries),
+            'size_mb': sum(size for _, size, _ in entries) / 1024**2,
+            'max_mb': self.max_bytes / 1024**2,
+        }
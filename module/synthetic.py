@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+# Distributions below are fitted to data/KAG_conversion_data.csv
+KAG_CAMPAIGNS = (916, 936, 1178)
+KAG_CAMPAIGN_WEIGHTS = (0.05, 0.41, 0.54)
+KAG_AGES = ('30-34', '35-39', '40-44', '45-49')
+KAG_AGE_WEIGHTS = (0.37, 0.22, 0.18, 0.23)
+KAG_GENDERS = ('M', 'F')
+KAG_COLUMNS = ['ad_id', 'xyz_campaign_id', 'fb_campaign_id', 'age', 'gender', 'interest',
+               'Impressions', 'Clicks', 'Spent', 'Total_Conversion', 'Approved_Conversion']
+
+
+def _weights(n, base):
+    """`base` weights when the cardinality matches, otherwise a Zipf-like skew"""
+    if len(base) == n:
+        return np.asarray(base, dtype=float)
+    weights = 1.0 / np.arange(1, n + 1)
+    return weights / weights.sum()
+
+
+def generate_kag_like(rows, seed=0, campaigns=3, fb_campaigns=None, ages=4, interests=40,
+                      duplicate_rate=0.0, missing_rate=0.0, start_date=None, days=None):
+    """Synthetic ad-performance data with the same columns, dtypes and shape as the KAG dataset.
+
+    Cardinalities are configurable so larger runs can stress grouping and
+    filtering: `campaigns` (xyz_campaign_id), `fb_campaigns` (default about
+    0.6 per row, as in the original), `ages` and `interests`. A share of
+    exact duplicate rows and of missing values can be mixed in to give
+    clean_data real work. With `start_date`, a `reporting_start` date column
+    spread over `days` days (default 30) is added.
+    """
+    rng = np.random.default_rng(seed)
+    fb_campaigns = fb_campaigns or max(1, int(rows * 0.6))
+
+    campaign_ids = np.array(KAG_CAMPAIGNS[:campaigns] if campaigns <= len(KAG_CAMPAIGNS)
+                            else KAG_CAMPAIGNS + tuple(1200 + 20 * i for i in range(campaigns - len(KAG_CAMPAIGNS))))
+    age_labels = np.array(KAG_AGES[:ages] if ages <= len(KAG_AGES)
+                          else [f"{30 + 5 * i}-{34 + 5 * i}" for i in range(ages)], dtype=object)
+    interest_ids = np.sort(rng.choice(np.arange(2, max(115, interests + 2)), size=interests, replace=False))
+
+    campaign = campaign_ids[rng.choice(len(campaign_ids), size=rows, p=_weights(len(campaign_ids), KAG_CAMPAIGN_WEIGHTS))]
+    # fb campaigns are nested in xyz campaigns and ids increase with the ad id, as in the source
+    fb_campaign = 103916 + np.sort(rng.integers(0, fb_campaigns, size=rows))
+    age = age_labels[rng.choice(len(age_labels), size=rows, p=_weights(len(age_labels), KAG_AGE_WEIGHTS))]
+    gender = np.array(KAG_GENDERS, dtype=object)[rng.integers(0, 2, size=rows)]
+    interest = interest_ids[rng.choice(interests, size=rows, p=_weights(interests, ()))]
+
+    # Impressions are log-normal; clicks, spend and conversions follow from them
+    impressions = np.clip(rng.lognormal(10.5, 2.2, size=rows), 87, 3052003).astype(np.int64)
+    ctr = np.clip(rng.normal(0.000164, 0.000115, size=rows), 0, 0.00106)
+    clicks = rng.binomial(impressions, ctr)
+    cpc = np.clip(rng.normal(1.5, 0.23, size=rows), 0.18, 2.21)
+    spent = np.round(clicks * cpc, 2)
+    conversion_rate = 2.9 * np.exp(0.3 * (np.log(impressions) - 10.5))
+    total_conversion = rng.poisson(conversion_rate)
+    approved_conversion = rng.binomial(total_conversion, 0.34)
+
+    df = pd.DataFrame({
+        'ad_id': np.arange(708746, 708746 + rows, dtype=np.int64),
+        'xyz_campaign_id': campaign.astype(np.int64),
+        'fb_campaign_id': fb_campaign.astype(np.int64),
+        'age': age,
+        'gender': gender,
+        'interest': interest.astype(np.int64),
+        'Impressions': impressions,
+        'Clicks': clicks.astype(np.int64),
+        'Spent': spent,
+        'Total_Conversion': total_conversion.astype(np.int64),
+        'Approved_Conversion': approved_conversion.astype(np.int64),
+    })
+
+    if start_date is not None:
+        offsets = rng.integers(0, days or 30, size=rows)
+        df['reporting_start'] = (pd.Timestamp(start_date) + pd.to_timedelta(offsets, unit='D')).strftime('%Y-%m-%d')
+
+    if missing_rate > 0:
+        # Missing values go into a measure and a categorical column, which become float / keep object
+        for col in ('Spent', 'gender'):
+            missing = rng.random(rows) < missing_rate
+            df.loc[missing, col] = np.nan
+
+    if duplicate_rate > 0:
+        duplicates = int(rows * duplicate_rate)
+        if duplicates:
+            # The last rows are replaced by exact copies of earlier ones
+            order = np.arange(rows)
+            order[rows - duplicates:] = rng.integers(0, rows - duplicates, size=duplicates)
+            df = df.iloc[order].reset_index(drop=True)
+
+    return df
@@ -0,0 +1,65 @@
+from module.ai_insight import GeminiInsights
+from module.artifact_cache import inputs_hash, text_hash
+from module.report_pdf import PDFReportGenerator
+from module.report_pptx import PowerPointReportGenerator
+from module.tracing import traced
+from module.visualization import DataVisualizer
+
+PPTX_MIME = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+
+@traced('job.analysis')
+def run_analysis(job, df, ai=None, store=None, dataset_key=None):
+    """AI insights plus charts, publishing each piece as soon as it is ready.
+
+    With a SharedDatasetStore and dataset key, sessions analysing the same
+    dataset share one LLM call and one set of charts.
+    """
+    def shared(name, compute):
+        if store is None or dataset_key is None:
+            return compute()
+        return store.get_or_compute(dataset_key, name, compute)
+
+    ai = ai or GeminiInsights()
+    visualizer = DataVisualizer(df)
+
+    job.update(0.05, "Analyzing data with Gemini AI...")
+    ai_summary = shared('ai_summary', lambda: ai.analyze_adtech_data(df))
+    if store is not None and dataset_key is not None and "AI Analysis Unavailable" in ai_summary:
+        # Let the next request retry instead of sharing the failure
+        store.discard(store.derived_key(dataset_key, 'ai_summary'))
+    job.update(0.6, "Building summary charts...", ai_summary=ai_summary)
+
+    charts = shared('summary_charts', visualizer.create_summary_charts)
+    job.update(0.8, "Building AdTech charts...", charts=charts)
+
+    adtech_charts = shared('adtech_charts', visualizer.create_adtech_specific_charts)
+    job.update(0.95, "Finishing up...", adtech_charts=adtech_charts)
+    return {'ai_summary': ai_summary, 'charts': charts, 'adtech_charts': adtech_charts}
+
+
+@traced('job.render_report')
+def render_report(job, fmt, df, insights, charts, data_fingerprint=None, cache=None, comparison=None,
+                  metrics=None, funnel=None, budget=None):
+    """Render a PDF or PPTX report, going through the artifact cache when given"""
+    if fmt == 'pdf':
+        generator = PDFReportGenerator()
+        render = lambda: generator.render_report(df, insights, charts, metrics=metrics, comparison=comparison)
+        mime = "application/pdf"
+    elif fmt == 'pptx':
+        generator = PowerPointReportGenerator()
+        render = lambda: generator.render_presentation(df, insights, metrics=metrics, charts=charts,
+                                                       comparison=comparison, funnel=funnel, budget=budget)
+        mime = PPTX_MIME
+    else:
+        raise ValueError(f"Unknown report format: {fmt}")
+
+    job.update(0.1, f"Rendering {fmt.upper()} report...")
+    if cache is not None and data_fingerprint is not None:
+        render_hash = inputs_hash(charts=charts, metrics=metrics, comparison=comparison,
+                                  funnel=funnel, budget=budget)
+        key, data = cache.get_or_render(data_fingerprint, text_hash(insights), fmt,
+                                        generator.template_version, render, render_hash=render_hash)
+    else:
+        key, data = None, render()
+    return {'format': fmt, 'key': key, 'bytes': data, 'mime': mime}
@@ -0,0 +1,346 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from module.tracing import traced
+
+NAT = np.iinfo(np.int64).min
+DATE_NAME_HINTS = ('date', 'time', 'day', 'start', 'end', 'period', 'week', 'month')
+
+# KPI sums, matched by column name (first match wins, each column used once)
+MEASURE_HINTS = [
+    ('impressions', ('impression',)),
+    ('clicks', ('click',)),
+    ('spend', ('spent', 'spend', 'cost')),
+    ('approved_conversions', ('approved',)),
+    ('conversions', ('conv',)),
+]
+# Derived KPIs: (name, numerator, denominator, scale)
+RATIOS = [
+    ('CTR (%)', 'clicks', 'impressions', 100.0),
+    ('CPC', 'spend', 'clicks', 1.0),
+    ('Conversion Rate (%)', 'conversions', 'clicks', 100.0),
+    ('Approval Rate (%)', 'approved_conversions', 'conversions', 100.0),
+    ('Cost per Approved Conversion', 'spend', 'approved_conversions', 1.0),
+]
+
+
+def _parse_dates(series):
+    """int64 nanoseconds per row (NAT for unparseable), parsing each distinct value once"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = pd.DatetimeIndex(series)
+        if values.tz is not None:
+            values = values.tz_convert(None)
+        return values.asi8.copy()
+    codes, uniques = pd.factorize(series)
+    parsed = pd.DatetimeIndex(_to_datetime(pd.Series(uniques)))
+    if parsed.tz is not None:
+        parsed = parsed.tz_convert(None)
+    lookup = np.append(parsed.asi8, NAT)  # code -1 (missing) maps to the last slot
+    return lookup[codes]
+
+
+def _to_datetime(values):
+    with warnings.catch_warnings():
+        # Format inference falls back to per-value parsing with a warning; that is fine here
+        warnings.simplefilter('ignore', UserWarning)
+        return pd.to_datetime(values, errors='coerce')
+
+
+def find_date_column(df):
+    """First datetime column, or text column whose name and values look like dates"""
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col
+    for col in df.columns:
+        if df[col].dtype != object or not any(hint in str(col).lower() for hint in DATE_NAME_HINTS):
+            continue
+        sample = pd.Series(df[col].dropna().unique()[:200])
+        if len(sample) and _to_datetime(sample).notna().mean() >= 0.9:
+            return col
+    return None
+
+
+def find_measures(df):
+    """Map KPI roles (clicks, spend, ...) to columns; falls back to every numeric non-id column"""
+    measures = {}
+    used = set()
+    numeric = [col for col in df.select_dtypes(include=['number']).columns]
+    for role, hints in MEASURE_HINTS:
+        for col in numeric:
+            if col not in used and any(hint in str(col).lower() for hint in hints):
+                measures[role] = col
+                used.add(col)
+                break
+    if not measures:
+        measures = {col: col for col in numeric if not str(col).lower().endswith('id')}
+    return measures
+
+
+def default_segments(df, date_column=None, measures=None, max_values=50):
+    """Low-cardinality columns (other than the date and the measures) worth comparing segment by segment"""
+    skip = {date_column, *(measures or {}).values()}
+    segments = []
+    for col in df.columns:
+        if col in skip or pd.api.types.is_float_dtype(df[col]):
+            continue
+        if df[col].nunique() <= max_values:
+            segments.append(col)
+    return segments
+
+
+class TimeComparison:
+    """Period-over-period KPI deltas for a dataset and its segments.
+
+    Rows are sorted by date once and prefix sums of every KPI measure are
+    kept in that order, so the totals of any window are two binary searches
+    and one subtraction. For a segment column the rows are additionally
+    grouped by segment (keeping date order inside each group), which answers
+    a window for all segments at once with one vectorized searchsorted.
+    Windows are half-open: [start, end).
+    """
+
+    def __init__(self, df, date_column=None, measures=None, on_resize=None):
+        self.date_column = date_column or find_date_column(df)
+        if self.date_column is None:
+            raise ValueError("No date column found")
+        self.measures = measures or find_measures(df)
+        if not self.measures:
+            raise ValueError("No numeric measures found")
+        self._df = df
+
+        times = _parse_dates(df[self.date_column])
+        order = np.argsort(times, kind='stable')
+        self._order = order[times[order] != NAT]
+        self._times = times[self._order]
+
+        values = df[list(self.measures.values())].to_numpy(dtype=np.float64)[self._order]
+        self._values = np.nan_to_num(values)
+        self._cumsum = self._prefix_sums(self._values)
+        self._segments = {}
+        # Called after a segment index is built, so a cache can re-measure memory_bytes()
+        self.on_resize = on_resize
+
+        self.kpi_names = list(self.measures.values())
+        self._ratios = [(name, list(self.measures).index(num), list(self.measures).index(den), scale)
+                        for name, num, den, scale in RATIOS if num in self.measures and den in self.measures]
+        self.kpi_names += [name for name, _, _, _ in self._ratios]
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        """A TimeComparison for `df`, or None when it has no usable date column"""
+        try:
+            return cls(df, **kwargs)
+        except ValueError:
+            return None
+
+    def memory_bytes(self):
+        """Bytes held by the index and prefix sums (the frame itself is shared)"""
+        arrays = [self._order, self._times, self._values, self._cumsum]
+        for _, keys, cumsum, _ in list(self._segments.values()):
+            arrays += [keys, cumsum]
+        return sum(a.nbytes for a in arrays)
+
+    @staticmethod
+    def _prefix_sums(values):
+        cumsum = np.zeros((len(values) + 1, values.shape[1]))
+        np.cumsum(values, axis=0, out=cumsum[1:])
+        return cumsum
+
+    @property
+    def start(self):
+        return pd.Timestamp(self._times[0]) if len(self._times) else None
+
+    @property
+    def end(self):
+        """Exclusive end of the data: midnight after the last date"""
+        return pd.Timestamp(self._times[-1]).normalize() + pd.Timedelta(days=1) if len(self._times) else None
+
+    def _bounds(self, windows):
+        """Row ranks in date order for flat [start, end, start, end, ...] timestamps"""
+        stamps = np.array([pd.Timestamp(w).value for w in windows], dtype=np.int64)
+        return np.searchsorted(self._times, stamps, side='left')
+
+    def _kpis(self, sums):
+        """KPI values for sums of shape (..., measures): the sums plus the derived ratios"""
+        columns = [sums]
+        for _, num, den, scale in self._ratios:
+            denominator = sums[..., den]
+            ratio = np.divide(sums[..., num] * scale, denominator, out=np.full(denominator.shape, np.nan),
+                              where=denominator != 0)
+            columns.append(ratio[..., None])
+        return np.concatenate(columns, axis=-1)
+
+    def _segment_index(self, col):
+        """Labels, composite sort keys and prefix sums for rows grouped by `col` in date order"""
+        index = self._segments.get(col)
+        if index is None:
+            codes, labels = pd.factorize(self._df[col].to_numpy()[self._order], sort=True)
+            n = len(self._order)
+            # Missing segment values get their own trailing group
+            codes = np.where(codes < 0, len(labels), codes).astype(np.int64)
+            labels = list(labels) + ([None] if (codes == len(labels)).any() else [])
+            composite = codes * (n + 1) + np.arange(n, dtype=np.int64)
+            grouped = np.argsort(composite, kind='stable')
+            index = (labels, composite[grouped], self._prefix_sums(self._values[grouped]), n + 1)
+            self._segments[col] = index
+            if self.on_resize is not None:
+                self.on_resize()
+        return index
+
+    def window_sums(self, windows, segment=None):
+        """Measure totals per window: shape (windows, measures), or (segments, windows, measures)"""
+        ranks = self._bounds([t for window in windows for t in window]).reshape(-1, 2)
+        if segment is None:
+            return self._cumsum[ranks[:, 1]] - self._cumsum[ranks[:, 0]]
+        labels, keys, cumsum, stride = self._segment_index(segment)
+        offsets = np.arange(len(labels), dtype=np.int64)[:, None, None] * stride
+        positions = np.searchsorted(keys, offsets + ranks[None, :, :])
+        return cumsum[positions[..., 1]] - cumsum[positions[..., 0]]
+
+    def window_rows(self, windows):
+        """Number of dated rows in each window"""
+        ranks = self._bounds([t for window in windows for t in window]).reshape(-1, 2)
+        return ranks[:, 1] - ranks[:, 0]
+
+    @traced('compare.periods')
+    def compare(self, current, previous, segment=None):
+        """KPI deltas between two (start, end) windows, overall or for every value of `segment`"""
+        sums = self.window_sums([current, previous], segment)
+        kpis = self._kpis(sums)
+        current_kpis, previous_kpis = kpis[..., 0, :], kpis[..., 1, :]
+        change = current_kpis - previous_kpis
+        pct_change = np.divide(change * 100.0, np.abs(previous_kpis), out=np.full(change.shape, np.nan),
+                               where=previous_kpis != 0)
+        result = pd.DataFrame({
+            'kpi': np.tile(self.kpi_names, 1 if segment is None else len(kpis)),
+            'current': current_kpis.ravel(),
+            'previous': previous_kpis.ravel(),
+            'change': change.ravel(),
+            'pct_change': pct_change.ravel(),
+        })
+        if segment is not None:
+            labels = self._segment_index(segment)[0]
+            result.insert(0, segment, np.repeat(np.array(labels, dtype=object), len(self.kpi_names)))
+        return result
+
+    def period_windows(self, kind, anchor=None, days=None):
+        """(current, previous) windows ending at `anchor` (default: end of the data).
+
+        `kind` is 'wow' (7 days), 'mom' (calendar month) or 'custom' (`days`).
+        """
+        end = pd.Timestamp(anchor) if anchor is not None else self.end
+        if kind == 'wow':
+            length = pd.Timedelta(days=7)
+        elif kind == 'mom':
+            length = pd.DateOffset(months=1)
+        elif kind == 'custom' and days:
+            length = pd.Timedelta(days=days)
+        else:
+            raise ValueError(f"Unknown period: {kind}")
+        middle = end - length
+        return (middle, end), (middle - length, middle)
+
+    def week_over_week(self, segment=None, anchor=None):
+        return self.compare(*self.period_windows('wow', anchor), segment=segment)
+
+    def month_over_month(self, segment=None, anchor=None):
+        return self.compare(*self.period_windows('mom', anchor), segment=segment)
+
+    def custom(self, current, previous=None, segment=None):
+        """Deltas for any window against `previous` (default: the equally long window before it)"""
+        if previous is None:
+            start, end = pd.Timestamp(current[0]), pd.Timestamp(current[1])
+            previous = (start - (end - start), start)
+        return self.compare(current, previous, segment=segment)
+
+    @traced('compare.summary')
+    def summary(self, segments=None, periods=('wow', 'mom'), top_n=3):
+        """JSON-safe period-over-period summary for reports and the AI prompt.
+
+        For each period with data on both sides: every KPI's current and
+        previous value and change, plus the `top_n` segments per segment
+        column that gained and lost the most of the primary KPI (approved
+        conversions when present).
+        """
+        if segments is None:
+            segments = default_segments(self._df, self.date_column, self.measures)
+        primary = self.measures.get('approved_conversions') or self.measures.get('conversions') or self.kpi_names[0]
+        result = {
+            'date_column': self.date_column,
+            'data_start': self.start.isoformat() if self.start is not None else None,
+            'data_end': self.end.isoformat() if self.end is not None else None,
+            'primary_kpi': primary,
+            'periods': {},
+        }
+        names = {'wow': 'week_over_week', 'mom': 'month_over_month'}
+        for kind in periods:
+            current, previous = self.period_windows(kind)
+            rows = self.window_rows([current, previous])
+            if rows[0] == 0 or rows[1] == 0:
+                continue  # not enough history for this period
+            overall = self.compare(current, previous)
+            period = {
+                'current': [current[0].isoformat(), current[1].isoformat()],
+                'previous': [previous[0].isoformat(), previous[1].isoformat()],
+                'current_rows': int(rows[0]),
+                'previous_rows': int(rows[1]),
+                'kpis': [_clean_record(r) for r in overall.to_dict(orient='records')],
+                'top_movers': {},
+            }
+            for col in segments:
+                deltas = self.compare(current, previous, segment=col)
+                deltas = deltas[deltas['kpi'] == primary].sort_values('change')
+                movers = [_clean_record(r) for r in deltas.to_dict(orient='records')]
+                period['top_movers'][str(col)] = {
+                    'gainers': [m for m in reversed(movers[-top_n:]) if (m['change'] or 0) > 0],
+                    'decliners': [m for m in movers[:top_n] if (m['change'] or 0) < 0],
+                }
+            result['periods'][names.get(kind, kind)] = period
+        return result
+
+
+def _clean_record(record):
+    """Plain Python values with NaN as None"""
+    clean = {}
+    for key, value in record.items():
+        if isinstance(value, (np.integer, np.floating)):
+            value = value.item()
+        if isinstance(value, float) and not np.isfinite(value):
+            value = None
+        clean[str(key)] = value
+    return clean
+
+
+def period_summary(df, **kwargs):
+    """TimeComparison(df).summary(), or None when `df` has no date column"""
+    comparison = TimeComparison.from_frame(df)
+    if comparison is None:
+        return None
+    return comparison.summary(**kwargs)
+
+
+def format_value(value):
+    if value is None:
+        return "n/a"
+    if abs(value) < 1:
+        return f"{value:.4f}"
+    return f"{value:,.2f}" if abs(value) < 1000 else f"{value:,.0f}"
+
+
+def summary_lines(summary, max_kpis=None):
+    """Human-readable lines for a period summary (used by the reports)"""
+    lines = []
+    for period, data in (summary or {}).get('periods', {}).items():
+        lines.append(f"{period.replace('_', ' ').title()}: {data['current'][0][:10]} to {data['current'][1][:10]} "
+                     f"vs {data['previous'][0][:10]} to {data['previous'][1][:10]}")
+        for row in data['kpis'][:max_kpis]:
+            pct = f" ({row['pct_change']:+.1f}%)" if row['pct_change'] is not None else ""
+            lines.append(f"  {row['kpi']}: {format_value(row['current'])} vs {format_value(row['previous'])}{pct}")
+        for col, movers in data['top_movers'].items():
+            for label, items in (('up', movers['gainers']), ('down', movers['decliners'])):
+                if items:
+                    names = ", ".join(f"{m[col]} ({m['change']:+,.0f})" for m in items)
+                    lines.append(f"  {summary['primary_kpi']} {label} by {col}: {names}")
+    return lines
@@ -0,0 +1,401 @@
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import pandas as pd
+
+from module.file_utils import write_atomic
+
+SERVICE_NAME = "trendspotter"
+
+# Module-level switch checked before any span work, so disabled tracing costs one global lookup
+_enabled = False
+_memory = False
+_current = contextvars.ContextVar('trendspotter_span', default=None)
+_lock = threading.Lock()
+_open_traces = {}
+_traces = deque(maxlen=200)
+# Callables taking a list of finished span dicts (one trace), keyed by name like module.hooks reporters
+_exporters = {}
+# Open spans measuring memory. tracemalloc's peak is process-wide, so a span only gets a
+# peak when every span open alongside it is an ancestor or descendant (same thread of work)
+_memory_spans = set()
+
+
+def enable(memory=False, max_traces=None):
+    """Start recording spans; `memory=True` also tracks peak memory via tracemalloc (slower).
+
+    Spans that overlap unrelated spans (other threads or jobs) get no peak,
+    because tracemalloc cannot attribute allocations to one of them.
+    """
+    global _enabled, _memory, _traces
+    if max_traces is not None and max_traces != _traces.maxlen:
+        _traces = deque(_traces, maxlen=max_traces)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not memory and _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = memory
+    _enabled = True
+
+
+def disable():
+    global _enabled, _memory
+    _enabled = False
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def memory_enabled():
+    return _memory
+
+
+def configure_from_env():
+    """Enable tracing from TRENDSPOTTER_TRACE* environment variables.
+
+    TRENDSPOTTER_TRACE=1 turns tracing on, TRENDSPOTTER_TRACE_MEMORY=1 adds
+    peak memory, and TRENDSPOTTER_TRACE_FILE appends every finished trace to
+    a file in TRENDSPOTTER_TRACE_FORMAT ('jsonl', the default, or 'otlp').
+    """
+    if os.getenv("TRENDSPOTTER_TRACE", "").lower() not in ("1", "true", "yes"):
+        return False
+    enable(memory=os.getenv("TRENDSPOTTER_TRACE_MEMORY", "").lower() in ("1", "true", "yes"))
+    path = os.getenv("TRENDSPOTTER_TRACE_FILE")
+    if path:
+        fmt = os.getenv("TRENDSPOTTER_TRACE_FORMAT", "jsonl").lower()
+        add_exporter(FileExporter(path, fmt), name='env-file')
+    return True
+
+
+def add_exporter(exporter, name=None):
+    """Register a callable(spans) called with every finished trace"""
+    _exporters[name or f"{exporter.__module__}.{type(exporter).__qualname__}"] = exporter
+
+
+def remove_exporter(name):
+    _exporters.pop(name, None)
+
+
+class Span:
+    """One timed operation; use through span() or @traced rather than directly"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'status', 'error',
+                 'start_ns', 'end_ns', '_wall', '_cpu', '_mem_base', '_mem_peak', '_mem_shared', '_token', '_parent',
+                 'wall_ms', 'cpu_ms', 'peak_memory_bytes')
+
+    def __init__(self, name, attributes):
+        parent = _current.get()
+        self.name = name
+        self._parent = parent
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.status = 'ok'
+        self.error = None
+        self.wall_ms = self.cpu_ms = 0.0
+        self.peak_memory_bytes = None
+        self._mem_shared = False
+
+    def set(self, **attributes):
+        """Attach attributes, e.g. span.set(rows_out=len(df))"""
+        self.attributes.update(attributes)
+
+    def add(self, key, amount=1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def cache(self, hit):
+        self.add('cache_hits' if hit else 'cache_misses')
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        if _memory and tracemalloc.is_tracing():
+            with _lock:
+                ancestors = set()
+                parent = self._parent
+                while parent is not None:
+                    ancestors.add(parent)
+                    parent = parent._parent
+                current, peak = tracemalloc.get_traced_memory()
+                if _memory_spans - ancestors:
+                    # Concurrent, unrelated work: nobody's peak can be attributed; don't reset it
+                    self._mem_shared = True
+                    for other in _memory_spans:
+                        other._mem_shared = True
+                else:
+                    if self._parent is not None and self._parent._mem_peak is not None:
+                        # reset_peak() below would hide the parent's peak so far; keep it on the parent
+                        self._parent._mem_peak = max(self._parent._mem_peak, peak)
+                    tracemalloc.reset_peak()
+                _memory_spans.add(self)
+            self._mem_base = self._mem_peak = current
+        else:
+            self._mem_base = self._mem_peak = None
+        self.start_ns = time.time_ns()
+        self._cpu = time.thread_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_ms = (time.perf_counter() - self._wall) * 1000
+        self.cpu_ms = (time.thread_time() - self._cpu) * 1000
+        self.end_ns = time.time_ns()
+        if self._mem_base is not None:
+            with _lock:
+                _memory_spans.discard(self)
+                if not self._mem_shared and tracemalloc.is_tracing():
+                    _, peak = tracemalloc.get_traced_memory()
+                    self._mem_peak = max(self._mem_peak, peak)
+                    self.peak_memory_bytes = self._mem_peak - self._mem_base
+                    if self._parent is not None and self._parent._mem_peak is not None:
+                        self._parent._mem_peak = max(self._parent._mem_peak, self._mem_peak)
+        if exc_type is not None:
+            self.status = 'error'
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        _finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'wall_ms': round(self.wall_ms, 3),
+            'cpu_ms': round(self.cpu_ms, 3),
+            'peak_memory_bytes': self.peak_memory_bytes,
+            'status': self.status,
+            'error': self.error,
+            'thread': threading.current_thread().name,
+            'attributes': self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned by span() while tracing is disabled"""
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+    def cache(self, hit):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, **attributes):
+    """Context manager timing a block: `with tracing.span('stage', rows_in=n) as s: ...`"""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attributes)
+
+
+def current_span():
+    """The innermost open span (a no-op span when tracing is off or none is open)"""
+    if not _enabled:
+        return _NOOP
+    return _current.get() or _NOOP
+
+
+def record_cache(hit):
+    """Count a cache hit or miss on the innermost open span"""
+    if _enabled:
+        active = _current.get()
+        if active is not None:
+            active.cache(hit)
+
+
+def _rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+def traced(name=None):
+    """Decorator wrapping a function or method in a span.
+
+    rows_in is taken from the first DataFrame argument (or the instance's
+    `df`), rows_out from a DataFrame result. When tracing is disabled the
+    wrapper only checks a module flag before calling through.
+    """
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            rows_in = None
+            for value in list(args) + list(kwargs.values()):
+                rows_in = _rows(value)
+                if rows_in is not None:
+                    break
+            if rows_in is None and args:
+                rows_in = _rows(getattr(args[0], 'df', None))
+            with Span(span_name, {} if rows_in is None else {'rows_in': rows_in}) as active:
+                result = fn(*args, **kwargs)
+                rows_out = _rows(result)
+                if rows_out is not None:
+                    active.attributes['rows_out'] = rows_out
+                return result
+        return wrapper
+    return decorate
+
+
+def _finish(finished):
+    record = finished.to_dict()
+    with _lock:
+        spans = _open_traces.setdefault(finished.trace_id, [])
+        spans.append(record)
+        if finished.parent_id is not None:
+            return
+        # Root span closed: the trace is complete
+        del _open_traces[finished.trace_id]
+        _traces.append(spans)
+        exporters = list(_exporters.values())
+    for exporter in exporters:
+        try:
+            exporter(spans)
+        except Exception:
+            pass  # tracing must never break the traced code
+
+
+def recent_traces():
+    """Finished traces (lists of span dicts, root last), oldest first"""
+    with _lock:
+        return list(_traces)
+
+
+def clear():
+    with _lock:
+        _traces.clear()
+
+
+def summary(traces=None):
+    """Per-span-name totals over `traces` (default: recent traces), slowest first"""
+    stats = {}
+    for spans in recent_traces() if traces is None else traces:
+        for s in spans:
+            entry = stats.setdefault(s['name'], {'name': s['name'], 'calls': 0, 'errors': 0, 'wall': [],
+                                                 'cpu_ms': 0.0, 'peak_memory_mb': None, 'rows_in': 0,
+                                                 'rows_out': 0, 'cache_hits': 0, 'cache_misses': 0})
+            entry['calls'] += 1
+            entry['errors'] += s['status'] != 'ok'
+            entry['wall'].append(s['wall_ms'])
+            entry['cpu_ms'] += s['cpu_ms']
+            if s['peak_memory_bytes'] is not None:
+                peak = s['peak_memory_bytes'] / 1024**2
+                entry['peak_memory_mb'] = max(entry['peak_memory_mb'] or 0.0, peak)
+            for key in ('rows_in', 'rows_out', 'cache_hits', 'cache_misses'):
+                entry[key] += s['attributes'].get(key, 0) or 0
+
+    rows = []
+    for entry in stats.values():
+        wall = sorted(entry.pop('wall'))
+        entry['total_ms'] = round(sum(wall), 2)
+        entry['mean_ms'] = round(entry['total_ms'] / len(wall), 2)
+        entry['p95_ms'] = round(wall[min(len(wall) - 1, int(len(wall) * 0.95))], 2)
+        entry['max_ms'] = round(wall[-1], 2)
+        entry['cpu_ms'] = round(entry['cpu_ms'], 2)
+        rows.append(entry)
+    return sorted(rows, key=lambda e: e['total_ms'], reverse=True)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans):
+    """One trace in OTLP/JSON (ExportTraceServiceRequest), as written by the OpenTelemetry file exporter"""
+    otlp_spans = []
+    for s in spans:
+        attributes = dict(s['attributes'])
+        attributes.update({'trendspotter.wall_ms': s['wall_ms'], 'trendspotter.cpu_ms': s['cpu_ms'],
+                           'thread.name': s['thread']})
+        if s['peak_memory_bytes'] is not None:
+            attributes['trendspotter.peak_memory_bytes'] = s['peak_memory_bytes']
+        otlp_span = {
+            'traceId': s['trace_id'],
+            'spanId': s['span_id'],
+            'name': s['name'],
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(s['start_ns']),
+            'endTimeUnixNano': str(s['end_ns']),
+            'attributes': [{'key': key if '.' in key else f"trendspotter.{key}", 'value': _otlp_value(value)}
+                           for key, value in attributes.items() if value is not None],
+            'status': {'code': 2, 'message': s['error']} if s['status'] == 'error' else {'code': 1},
+        }
+        if s['parent_id']:
+            otlp_span['parentSpanId'] = s['parent_id']
+        otlp_spans.append(otlp_span)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+        'scopeSpans': [{'scope': {'name': 'module.tracing'}, 'spans': otlp_spans}],
+    }]}
+
+
+def export_lines(traces, fmt='jsonl'):
+    """Serialize traces as newline-delimited JSON: one span per line ('jsonl') or one trace per line ('otlp')"""
+    lines = []
+    for spans in traces:
+        if fmt == 'otlp':
+            lines.append(json.dumps(to_otlp(spans), default=str))
+        elif fmt == 'jsonl':
+            lines.extend(json.dumps(s, default=str) for s in spans)
+        else:
+            raise ValueError(f"Unknown trace format: {fmt}")
+    return ("\n".join(lines) + "\n").encode('utf-8') if lines else b""
+
+
+def export_file(path, traces=None, fmt='jsonl'):
+    """Write `traces` (default: recent traces) to `path` atomically"""
+    return write_atomic(export_lines(recent_traces() if traces is None else traces, fmt), path)
+
+
+class FileExporter:
+    """Appends every finished trace to a local file as JSON lines or OTLP/JSON"""
+
+    def __init__(self, path, fmt='jsonl'):
+        if fmt not in ('jsonl', 'otlp'):
+            raise ValueError(f"Unknown trace format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, spans):
+        data = export_lines([spans], self.fmt)
+        with self._lock, open(self.path, 'ab') as f:
+            f.write(data)
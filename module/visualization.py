@@ -1,13 +1,13 @@
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
-import streamlit as st
-import matplotlib.pyplot as plt
+from module.tracing import traced
 
 class DataVisualizer:
     def __init__(self, df):
         self.df = df
     
+    @traced('charts.summary')
     def create_summary_charts(self):
         """Create basic summary charts"""
         charts = {}
@@ -47,6 +47,7 @@ class DataVisualizer:
         
         return charts
     
+    @traced('charts.adtech')
     def create_adtech_specific_charts(self):
         """Create charts specific to AdTech data"""
         charts = {}
@@ -64,8 +65,9 @@ class DataVisualizer:
             try:
                 conv_col = conv_cols[0]
                 click_col = click_cols[0]
-                self.df['conversion_rate'] = self.df[conv_col] / self.df[click_col] * 100
-                fig = px.histogram(self.df, x='conversion_rate', 
+                # Derived locally; the shared dataset is never modified
+                conversion_rate = (self.df[conv_col] / self.df[click_col] * 100).rename('conversion_rate')
+                fig = px.histogram(x=conversion_rate, labels={'x': 'conversion_rate'},
                                   title='Conversion Rate Distribution')
                 charts['conversion_rate'] = fig
             except:
@@ -77,8 +79,8 @@ class DataVisualizer:
             try:
                 date_col = date_cols[0]
                 metric_col = numeric_cols[0]
-                self.df[date_col] = pd.to_datetime(self.df[date_col])
-                time_series = self.df.groupby(self.df[date_col].dt.date)[metric_col].sum().reset_index()
+                dates = pd.to_datetime(self.df[date_col])
+                time_series = self.df[metric_col].groupby(dates.dt.date.rename(date_col)).sum().reset_index()
                 fig = px.line(time_series, x=date_col, y=metric_col, 
                              title=f'{metric_col} Over Time')
                 charts['time_series'] = fig